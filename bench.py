@@ -0,0 +1,128 @@
+import argparse
+import sys
+import test.testcase
+import benchmark.parse_cache
+import benchmark.expression
+import benchmark.dispatch
+import benchmark.optimize
+import benchmark.object_cache
+import benchmark.batch
+import benchmark.native
+import benchmark.bitcode
+import benchmark.phases
+import benchmark.synthetic
+import benchmark.switch
+import benchmark.scope
+import benchmark.parallel
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="Benchmarks of TinyCCompiler.")
+    subparsers = arg_parser.add_subparsers(dest="name", required=True)
+
+    parse_parser = subparsers.add_parser("parse", help="cold vs. warm parse time")
+    parse_parser.add_argument("files", nargs="*", help="C files to parse (default: test/testcase.py)")
+    parse_parser.add_argument("--repeat", type=int, default=3)
+
+    expression_parser = subparsers.add_parser("expression", help="expression nodes, visits and codegen time")
+    expression_parser.add_argument("files", nargs="*", help="C files to compile (default: test/testcase.py)")
+    expression_parser.add_argument("--repeat", type=int, default=5)
+
+    dispatch_parser = subparsers.add_parser("dispatch", help="getText() vs. token type dispatch on nested code")
+    dispatch_parser.add_argument("--depths", type=int, nargs="+", default=[10, 20, 40, 80])
+    dispatch_parser.add_argument("--repeat", type=int, default=3)
+
+    optimize_parser = subparsers.add_parser("optimize", help="compile and run time at each optimization level")
+    optimize_parser.add_argument("files", nargs="*", help="C files to compile (default: test/testcase.py)")
+    optimize_parser.add_argument("--levels", type=int, nargs="+", default=[0, 1, 2, 3])
+    optimize_parser.add_argument("--repeat", type=int, default=3)
+
+    cache_parser = subparsers.add_parser("objcache", help="JIT compile time without, missing and hitting the object cache")
+    cache_parser.add_argument("files", nargs="*", help="C files to compile (default: test/testcase.py)")
+    cache_parser.add_argument("-O", dest="opt_level", type=int, default=2)
+    cache_parser.add_argument("--repeat", type=int, default=3)
+
+    batch_parser = subparsers.add_parser("batch", help="execute() per file vs. one Executor for the whole batch")
+    batch_parser.add_argument("files", nargs="*", help="C files to run (default: test/testcase.py)")
+    batch_parser.add_argument("--rounds", type=int, default=5)
+
+    native_parser = subparsers.add_parser("native", help="JIT on every run vs. a natively compiled executable")
+    native_parser.add_argument("files", nargs="*", help="C files to run (default: test/testcase.py)")
+    native_parser.add_argument("-O", dest="opt_level", type=int, default=2)
+    native_parser.add_argument("--repeat", type=int, default=5)
+
+    bitcode_parser = subparsers.add_parser("bitcode", help="textual IR vs. bitcode, files vs. in-memory compile_and_run")
+    bitcode_parser.add_argument("files", nargs="*", help="C files to run (default: test/testcase.py)")
+    bitcode_parser.add_argument("--repeat", type=int, default=5)
+
+    phases_parser = subparsers.add_parser("phases", help="time of every compiler phase, compared with a stored baseline")
+    phases_parser.add_argument("files", nargs="*", help="C files to run (default: test/testcase.py)")
+    phases_parser.add_argument("--repeat", type=int, default=5)
+    phases_parser.add_argument("-O", dest="opt_level", type=int, default=0)
+    phases_parser.add_argument("--json", metavar="FILE", help="write the results to FILE")
+    phases_parser.add_argument("--baseline", metavar="FILE", default=benchmark.phases.DEFAULT_BASELINE,
+                               help="baseline to compare with (default: benchmark/baseline.json)")
+    phases_parser.add_argument("--update-baseline", action="store_true", help="store the results as the baseline")
+    phases_parser.add_argument("--threshold", type=float, default=0.2,
+                               help="relative slowdown reported as a regression (default: 0.2)")
+
+    synthetic_parser = subparsers.add_parser("synthetic", help="time and peak memory vs. size of generated programs")
+    synthetic_parser.add_argument("--sizes", type=int, nargs="+", default=[10, 30, 100, 300],
+                                  help="numbers of functions")
+    synthetic_parser.add_argument("--depth", type=int, default=4, help="nesting depth of blocks")
+    synthetic_parser.add_argument("--chain", type=int, default=16, help="length of expression chains")
+    synthetic_parser.add_argument("--cases", type=int, default=8, help="cases of each switch")
+    synthetic_parser.add_argument("--initializer", type=int, default=16, help="length of array initializers")
+    synthetic_parser.add_argument("--csv", metavar="FILE", help="write the results to FILE")
+    synthetic_parser.add_argument("--plot", metavar="FILE", help="plot the results to FILE (requires matplotlib)")
+    synthetic_parser.add_argument("--dump", metavar="FILE", help="only write the program of the first size to FILE")
+
+    switch_parser = subparsers.add_parser("switch", help="codegen, JIT and run time of a big switch in a hot loop")
+    switch_parser.add_argument("--cases", type=int, nargs="+", default=[8, 64, 256])
+    switch_parser.add_argument("--iterations", type=int, default=1000000)
+    switch_parser.add_argument("-O", dest="opt_level", type=int, default=0)
+
+    scope_parser = subparsers.add_parser("scope", help="layered vs. flat symbol table in deeply nested blocks")
+    scope_parser.add_argument("--depths", type=int, nargs="+", default=[10, 50, 100])
+    scope_parser.add_argument("--lookups", type=int, default=100000)
+    scope_parser.add_argument("--repeat", type=int, default=5)
+
+    parallel_parser = subparsers.add_parser("parallel", help="serial vs. per-function parallel parse and codegen")
+    parallel_parser.add_argument("--sizes", type=int, nargs="+", default=[100, 400])
+    parallel_parser.add_argument("--jobs", type=int, nargs="+", help="worker processes (default: 1, 2, 4 ... CPUs)")
+
+    args = arg_parser.parse_args()
+    if args.name == "parse":
+        benchmark.parse_cache.run(args.files or test.testcase.cases(), repeat=args.repeat)
+    elif args.name == "expression":
+        benchmark.expression.run(args.files or test.testcase.cases(), repeat=args.repeat)
+    elif args.name == "dispatch":
+        benchmark.dispatch.run(args.depths, repeat=args.repeat)
+    elif args.name == "optimize":
+        benchmark.optimize.run(args.files or test.testcase.cases(), levels=args.levels, repeat=args.repeat)
+    elif args.name == "objcache":
+        benchmark.object_cache.run(args.files or test.testcase.cases(), opt_level=args.opt_level, repeat=args.repeat)
+    elif args.name == "batch":
+        benchmark.batch.run(args.files or test.testcase.cases(), rounds=args.rounds)
+    elif args.name == "native":
+        benchmark.native.run(args.files or test.testcase.cases(), opt_level=args.opt_level, repeat=args.repeat)
+    elif args.name == "bitcode":
+        benchmark.bitcode.run(args.files or test.testcase.cases(), repeat=args.repeat)
+    elif args.name == "phases":
+        if not benchmark.phases.run(args.files or test.testcase.cases(), repeat=args.repeat, opt_level=args.opt_level,
+                                    json_filename=args.json, baseline_filename=args.baseline,
+                                    update_baseline=args.update_baseline, threshold=args.threshold):
+            sys.exit(1)
+    elif args.name == "synthetic":
+        if args.dump:
+            with open(args.dump, "w") as f:
+                f.write(benchmark.synthetic.synthetic_program(args.sizes[0], args.depth, args.chain, args.cases,
+                                                              args.initializer))
+        else:
+            benchmark.synthetic.run(args.sizes, args.depth, args.chain, args.cases, args.initializer,
+                                    csv_filename=args.csv, plot_filename=args.plot)
+    elif args.name == "switch":
+        benchmark.switch.run(args.cases, iterations=args.iterations, opt_level=args.opt_level)
+    elif args.name == "scope":
+        benchmark.scope.run(args.depths, repeat=args.repeat, lookups=args.lookups)
+    elif args.name == "parallel":
+        benchmark.parallel.run(args.sizes, args.jobs)
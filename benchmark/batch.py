@@ -0,0 +1,42 @@
+import os
+import tempfile
+import time
+from antlr4 import FileStream
+from generator.generator import parse, TinyCGenerator
+from generator.errors import TinyCErrorListener
+from executor.executor import Executor, execute
+from benchmark.common import run_silently
+
+
+def run(filenames, rounds=5):
+    """
+    比较逐个调用execute()与使用同一个Executor批量执行的总时间
+    :param filenames: C代码文件列表
+    :param rounds: 文件列表重复的轮数
+    :return: (逐个执行的时间, 批量执行的时间)
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        ir_filenames = []
+        for filename in filenames:
+            error_listener = TinyCErrorListener()
+            generator = TinyCGenerator(error_listener)
+            generator.visit(parse(FileStream(filename), error_listener))
+            ir_filename = os.path.join(directory, os.path.basename(filename) + ".ll")
+            generator.save(ir_filename)
+            ir_filenames.append(ir_filename)
+        ir_filenames *= rounds
+
+        start = time.perf_counter()
+        for ir_filename in ir_filenames:
+            run_silently(lambda: execute(ir_filename))
+        one_by_one = time.perf_counter() - start
+
+        executor = Executor()
+        start = time.perf_counter()
+        run_silently(lambda: executor.execute_many(ir_filenames))
+        batch = time.perf_counter() - start
+
+    print("%d programs" % len(ir_filenames))
+    print("execute() one by one: %8.1f ms" % (one_by_one * 1000))
+    print("Executor.execute_many: %8.1f ms (%d engines)" % (batch * 1000, executor.engines_created))
+    return one_by_one, batch
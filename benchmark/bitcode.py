@@ -0,0 +1,41 @@
+import os
+import tempfile
+import llvmlite.binding as llvm
+from generator.generator import generate, compile_and_run
+from executor.executor import Executor, initialize, to_bitcode
+from benchmark.common import best_time, run_silently
+
+
+def run(filenames, repeat=5):
+    """
+    比较文本IR与bitcode的大小和解析时间，以及经过文件与在内存中编译运行的时间
+    :param filenames: C代码文件列表
+    :param repeat: 每项重复的次数，取最小值
+    :return: {文件名: (文本字节数, bitcode字节数, 文本解析时间, bitcode解析时间, 经过文件的时间, 内存中的时间)}
+    """
+    initialize()
+    executor = Executor()
+    results = {}
+    print("%-24s %9s %9s %11s %11s %13s %13s" %
+          ("file", "ll bytes", "bc bytes", "ll parse", "bc parse", "via file(ms)", "in memory(ms)"))
+    with tempfile.TemporaryDirectory() as directory:
+        for filename in filenames:
+            ir_filename = os.path.join(directory, os.path.basename(filename) + ".ll")
+            generate(filename, ir_filename)
+            with open(ir_filename) as f:
+                llvm_ir = f.read()
+            bitcode = to_bitcode(llvm_ir)
+            with open(filename) as f:
+                source = f.read()
+
+            text_parse = best_time(lambda: llvm.parse_assembly(llvm_ir), repeat)
+            bitcode_parse = best_time(lambda: llvm.parse_bitcode(bitcode), repeat)
+            via_file = best_time(lambda: run_silently(
+                lambda: generate(filename, ir_filename) and executor.execute(ir_filename)), repeat)
+            in_memory = best_time(lambda: run_silently(lambda: compile_and_run(source, executor=executor)), repeat)
+
+            results[filename] = (len(llvm_ir), len(bitcode), text_parse, bitcode_parse, via_file, in_memory)
+            print("%-24s %9d %9d %9.2fms %9.2fms %13.1f %13.1f" %
+                  (filename, len(llvm_ir), len(bitcode), text_parse * 1000, bitcode_parse * 1000,
+                   via_file * 1000, in_memory * 1000))
+    return results
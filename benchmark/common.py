@@ -0,0 +1,44 @@
+"""
+各个benchmark共用的计时工具和设置
+"""
+import ctypes
+import os
+import sys
+import time
+
+# 分析和遍历深层嵌套的语法树时需要的递归深度
+RECURSION_LIMIT = 100000
+
+_libc = ctypes.CDLL(None)
+
+
+def best_time(func, repeat):
+    """重复执行func，返回最短的时间（秒）"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run_silently(main_func):
+    """
+    运行编译好的main函数，把程序的标准输出丢弃
+    :return: 运行时间（秒）
+    """
+    sys.stdout.flush()
+    saved_fd = os.dup(1)
+    null_fd = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(null_fd, 1)
+    try:
+        start = time.perf_counter()
+        main_func()
+        elapsed = time.perf_counter() - start
+        _libc.fflush(None)  # printf的缓冲区要在恢复标准输出之前写出
+    finally:
+        os.dup2(saved_fd, 1)
+        os.close(saved_fd)
+        os.close(null_fd)
+    return elapsed
@@ -0,0 +1,74 @@
+import sys
+from antlr4 import InputStream, ParserRuleContext
+from parser_.CLexer import CLexer
+from generator.generator import parse, TinyCGenerator
+from generator.errors import TinyCErrorListener
+from generator.util import match_token
+from benchmark.common import best_time, RECURSION_LIMIT
+
+
+def nested_source(depth):
+    """
+    生成while和if交替嵌套depth层的C代码
+    :param depth: 嵌套层数
+    :return: C代码字符串
+    """
+    lines = ["int main()", "{", "    int i = 0;", "    int s = 0;"]
+    for level in range(depth):
+        if level % 2 == 0:
+            lines.append("while (i < %d) {" % (level + 10))
+            lines.append("i = i + 1;")
+        else:
+            lines.append("if (i > %d) {" % level)
+            lines.append("s = s + i;")
+    for level in range(depth):
+        lines.append("}")
+    lines += ["    return s;", "}"]
+    return "\n".join(lines)
+
+
+def _contexts(tree):
+    """遍历语法树中所有有孩子的非终结符"""
+    stack = [tree]
+    while stack:
+        ctx = stack.pop()
+        if not ctx.children:
+            continue
+        yield ctx
+        stack.extend(child for child in ctx.children if isinstance(child, ParserRuleContext))
+
+
+def _text_dispatch(contexts):
+    """按原来的方式用getText()判断每个节点的第一个孩子"""
+    return sum(1 for ctx in contexts if ctx.children[0].getText() == ";")
+
+
+def _token_dispatch(contexts):
+    """用token类型判断每个节点的第一个孩子"""
+    return sum(1 for ctx in contexts if match_token(ctx.children[0], CLexer.Semi))
+
+
+def run(depths, repeat=3):
+    """
+    在深层嵌套的代码上比较getText()分派与token类型分派的耗时，以及整个代码生成的耗时
+    :param depths: 嵌套层数列表
+    :param repeat: 每项重复的次数，取最小值
+    :return: {嵌套层数: (getText分派时间, token分派时间, 代码生成时间)}
+    """
+    old_limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(old_limit, RECURSION_LIMIT))
+    results = {}
+    print("%-8s %8s %14s %14s %12s" % ("depth", "ctxs", "getText(ms)", "token(ms)", "codegen(ms)"))
+    try:
+        for depth in depths:
+            tree = parse(InputStream(nested_source(depth)), TinyCErrorListener())
+            contexts = list(_contexts(tree))
+            text_time = best_time(lambda: _text_dispatch(contexts), repeat)
+            token_time = best_time(lambda: _token_dispatch(contexts), repeat)
+            codegen_time = best_time(lambda: TinyCGenerator(TinyCErrorListener()).visit(tree), repeat)
+            results[depth] = (text_time, token_time, codegen_time)
+            print("%-8d %8d %14.2f %14.2f %12.1f" %
+                  (depth, len(contexts), text_time * 1000, token_time * 1000, codegen_time * 1000))
+    finally:
+        sys.setrecursionlimit(old_limit)
+    return results
@@ -0,0 +1,103 @@
+import sys
+import time
+from antlr4 import FileStream, ParserRuleContext
+from generator.generator import parse, TinyCGenerator
+from generator.errors import TinyCErrorListener
+from generator.expression import EXPRESSION_RULES, Node, lower_expression
+
+
+class _CountingGenerator(TinyCGenerator):
+    """统计visit调用次数的代码生成器"""
+    def __init__(self, error_listener):
+        super().__init__(error_listener)
+        self.visit_count = 0
+
+    def visit(self, tree):
+        self.visit_count += 1
+        return super().visit(tree)
+
+
+def _context_size(ctx):
+    """语法树节点及其属性字典、孩子列表占用的字节数"""
+    size = sys.getsizeof(ctx) + sys.getsizeof(ctx.__dict__)
+    if ctx.children:
+        size += sys.getsizeof(ctx.children)
+    return size
+
+
+def _node_size(node):
+    """AST节点以及其中的列表占用的字节数"""
+    size = sys.getsizeof(node)
+    for attr in ('args', 'items'):
+        if hasattr(node, attr):
+            size += sys.getsizeof(getattr(node, attr))
+    return size
+
+
+def _ast_nodes(node):
+    """遍历AST中所有的节点"""
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        yield node
+        for attr in type(node).__slots__:
+            child = getattr(node, attr)
+            if isinstance(child, Node):
+                stack.append(child)
+            elif isinstance(child, list):
+                stack.extend(child)
+
+
+def _measure_tree(tree):
+    """
+    统计表达式在语法树中和降低成AST后的节点个数与占用的字节数
+    :return: (语法树节点数, 语法树字节数, AST节点数, AST字节数)
+    """
+    contexts, context_bytes, nodes, node_bytes = 0, 0, 0, 0
+    stack = [tree]
+    while stack:
+        ctx = stack.pop()
+        children = [child for child in ctx.children or [] if isinstance(child, ParserRuleContext)]
+        if ctx.getRuleIndex() not in EXPRESSION_RULES:
+            stack.extend(children)
+            continue
+        try:
+            ast = lower_expression(ctx)
+        except Exception:  # 尚不支持的表达式
+            continue
+        for node in _ast_nodes(ast):
+            nodes += 1
+            node_bytes += _node_size(node)
+        sub_stack = [ctx]
+        while sub_stack:
+            sub_ctx = sub_stack.pop()
+            contexts += 1
+            context_bytes += _context_size(sub_ctx)
+            sub_stack.extend(child for child in sub_ctx.children or [] if isinstance(child, ParserRuleContext))
+    return contexts, context_bytes, nodes, node_bytes
+
+
+def run(filenames, repeat=5):
+    """
+    统计表达式在语法树和AST中的节点数与内存，以及代码生成的visit调用次数和时间
+    :param filenames: C代码文件列表
+    :param repeat: 代码生成重复的次数，取最小值
+    :return: {文件名: (语法树节点数, 语法树字节数, AST节点数, AST字节数, visit调用次数, 代码生成时间)}
+    """
+    results = {}
+    print("%-24s %10s %10s %10s %10s %8s %12s" %
+          ("file", "expr ctxs", "ctx bytes", "ast nodes", "ast bytes", "visits", "codegen(ms)"))
+    for filename in filenames:
+        tree = parse(FileStream(filename), TinyCErrorListener())
+        contexts, context_bytes, nodes, node_bytes = _measure_tree(tree)
+        best = None
+        for _ in range(repeat):
+            generator = _CountingGenerator(TinyCErrorListener())
+            start = time.perf_counter()
+            generator.visit(tree)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[filename] = (contexts, context_bytes, nodes, node_bytes, generator.visit_count, best)
+        print("%-24s %10d %10d %10d %10d %8d %12.1f" %
+              (filename, contexts, context_bytes, nodes, node_bytes, generator.visit_count, best * 1000))
+    return results
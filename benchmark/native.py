@@ -0,0 +1,47 @@
+import os
+import subprocess
+import tempfile
+import time
+from antlr4 import FileStream
+from generator.generator import parse, TinyCGenerator
+from generator.errors import TinyCErrorListener
+from executor.executor import Executor, emit_object, link_executable
+from benchmark.common import run_silently
+
+
+def run(filenames, opt_level=2, repeat=5):
+    """
+    比较每次都JIT编译再运行与预先编译成可执行文件再运行的时间
+    :param filenames: C代码文件列表
+    :param opt_level: 优化级别
+    :param repeat: 每个文件运行的次数
+    :return: {文件名: (AOT编译时间, JIT平均每次的时间, 可执行文件平均每次的时间)}
+    """
+    results = {}
+    executor = Executor(opt_level)
+    print("%-24s %14s %14s %14s" % ("file", "aot build(ms)", "jit run(ms)", "native run(ms)"))
+    with tempfile.TemporaryDirectory() as directory:
+        for filename in filenames:
+            error_listener = TinyCErrorListener()
+            generator = TinyCGenerator(error_listener)
+            generator.visit(parse(FileStream(filename), error_listener))
+            llvm_ir = repr(generator.module)
+
+            start = time.perf_counter()
+            exe_filename = os.path.join(directory, os.path.basename(filename) + ".out")
+            link_executable(emit_object(llvm_ir, opt_level), exe_filename)
+            build = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for _ in range(repeat):
+                run_silently(lambda: executor.execute_ir(llvm_ir))
+            jit = (time.perf_counter() - start) / repeat
+
+            start = time.perf_counter()
+            for _ in range(repeat):
+                subprocess.run([exe_filename], stdout=subprocess.DEVNULL)
+            native = (time.perf_counter() - start) / repeat
+
+            results[filename] = (build, jit, native)
+            print("%-24s %14.1f %14.1f %14.1f" % (filename, build * 1000, jit * 1000, native * 1000))
+    return results
@@ -0,0 +1,42 @@
+import tempfile
+import time
+from antlr4 import FileStream
+from generator.generator import parse, TinyCGenerator
+from generator.errors import TinyCErrorListener
+from executor.executor import ObjectCache, initialize, create_execution_engine, compile_ir
+
+
+def _compile_time(llvm_ir, opt_level, object_cache):
+    """用新的执行引擎编译一次IR代码，返回所用的时间（秒）"""
+    engine = create_execution_engine(opt_level)
+    start = time.perf_counter()
+    compile_ir(engine, llvm_ir, opt_level, object_cache)
+    return time.perf_counter() - start
+
+
+def run(filenames, opt_level=2, repeat=3):
+    """
+    比较不使用缓存、缓存未命中和缓存命中时的JIT编译时间
+    :param filenames: C代码文件列表
+    :param opt_level: 优化级别
+    :param repeat: 不使用缓存和缓存命中时重复的次数，取最小值
+    :return: {文件名: (不使用缓存的时间, 未命中的时间, 命中的时间)}
+    """
+    initialize()
+    results = {}
+    print("%-24s %14s %14s %14s" % ("file", "no cache(ms)", "miss(ms)", "hit(ms)"))
+    with tempfile.TemporaryDirectory() as directory:
+        object_cache = ObjectCache(directory)
+        for filename in filenames:
+            error_listener = TinyCErrorListener()
+            generator = TinyCGenerator(error_listener)
+            generator.visit(parse(FileStream(filename), error_listener))
+            llvm_ir = repr(generator.module)
+
+            no_cache = min(_compile_time(llvm_ir, opt_level, None) for _ in range(repeat))
+            miss = _compile_time(llvm_ir, opt_level, object_cache)
+            hit = min(_compile_time(llvm_ir, opt_level, object_cache) for _ in range(repeat))
+            results[filename] = (no_cache, miss, hit)
+            print("%-24s %14.1f %14.1f %14.1f" % (filename, no_cache * 1000, miss * 1000, hit * 1000))
+        print(object_cache.summary())
+    return results
@@ -0,0 +1,46 @@
+import time
+from ctypes import CFUNCTYPE, c_int
+from antlr4 import FileStream
+from generator.generator import parse, TinyCGenerator
+from generator.errors import TinyCErrorListener
+from executor.executor import OPT_LEVELS, initialize, create_execution_engine, compile_ir
+from benchmark.common import run_silently
+
+
+def _measure(llvm_ir, opt_level):
+    """
+    在opt_level下优化并JIT编译IR代码，再运行main函数
+    :return: (编译时间, 运行时间)
+    """
+    engine = create_execution_engine(opt_level)
+    start = time.perf_counter()
+    compile_ir(engine, llvm_ir, opt_level)
+    compile_time = time.perf_counter() - start
+    main_func = CFUNCTYPE(c_int)(engine.get_function_address("main"))
+    return compile_time, run_silently(main_func)
+
+
+def run(filenames, levels=OPT_LEVELS, repeat=3):
+    """
+    比较各优化级别下的编译时间（优化+JIT）和运行时间
+    :param filenames: C代码文件列表
+    :param levels: 优化级别列表
+    :param repeat: 每个级别重复的次数，取最小值
+    :return: {文件名: {优化级别: (编译时间, 运行时间)}}
+    """
+    initialize()
+    results = {}
+    print("%-24s %6s %14s %14s" % ("file", "level", "compile(ms)", "run(ms)"))
+    for filename in filenames:
+        error_listener = TinyCErrorListener()
+        generator = TinyCGenerator(error_listener)
+        generator.visit(parse(FileStream(filename), error_listener))
+        llvm_ir = repr(generator.module)
+        results[filename] = {}
+        for level in levels:
+            measures = [_measure(llvm_ir, level) for _ in range(repeat)]
+            compile_time = min(measure[0] for measure in measures)
+            run_time = min(measure[1] for measure in measures)
+            results[filename][level] = (compile_time, run_time)
+            print("%-24s %6s %14.1f %14.3f" % (filename, "-O%d" % level, compile_time * 1000, run_time * 1000))
+    return results
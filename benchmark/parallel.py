@@ -0,0 +1,69 @@
+import os
+import sys
+import time
+from antlr4 import InputStream
+from generator.generator import tokenize, parse, TinyCGenerator
+from generator.errors import TinyCErrorListener
+from generator import parallel
+from benchmark.common import RECURSION_LIMIT
+from benchmark.synthetic import synthetic_program
+
+
+def _serial(source):
+    """串行地分析并生成代码，返回IR代码"""
+    error_listener = TinyCErrorListener()
+    tree = parse(tokenize(InputStream(source)), error_listener)
+    generator = TinyCGenerator(error_listener)
+    generator.visit(tree)
+    return repr(generator.module)
+
+
+def _parallel(source, jobs):
+    """用jobs个进程分析并生成代码，返回链接后的IR代码"""
+    llvm_ir, errors = parallel.generate_ir(source, tokenize(InputStream(source)), jobs)
+    if errors:
+        raise ValueError("\n".join(errors))
+    return llvm_ir
+
+
+def _defined_functions(llvm_ir):
+    """IR代码中按顺序定义的函数名"""
+    return [line.split("@", 1)[1].split("(", 1)[0].strip('"') for line in llvm_ir.splitlines()
+            if line.startswith("define ")]
+
+
+def run(sizes, jobs_list=None, depth=4, chain=16, cases=8):
+    """
+    在有大量函数的程序上比较串行与按函数并行的语法分析加代码生成时间
+    :param sizes: 函数个数的列表
+    :param jobs_list: 进程数的列表，默认为1, 2, 4直到CPU核数
+    :return: {(函数个数, 进程数): 时间（秒）}，进程数为0表示串行
+    """
+    if not jobs_list:
+        jobs_list, jobs = [], 1
+        while jobs <= (os.cpu_count() or 1):
+            jobs_list.append(jobs)
+            jobs *= 2
+    old_limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(old_limit, RECURSION_LIMIT))
+    results = {}
+    print("CPUs: %d" % (os.cpu_count() or 1))
+    print("%10s %10s %12s %10s" % ("functions", "jobs", "time(ms)", "speedup"))
+    try:
+        for size in sizes:
+            source = synthetic_program(size, depth, chain, cases)
+            start = time.perf_counter()
+            expected = _defined_functions(_serial(source))
+            serial = results[(size, 0)] = time.perf_counter() - start
+            print("%10d %10s %12.1f %10s" % (size, "serial", serial * 1000, "1.00x"))
+            for jobs in jobs_list:
+                start = time.perf_counter()
+                llvm_ir = _parallel(source, jobs)
+                elapsed = results[(size, jobs)] = time.perf_counter() - start
+                # 链接后函数的顺序必须和串行生成的一致
+                if _defined_functions(llvm_ir) != expected:
+                    raise AssertionError("Function order differs with %d jobs" % jobs)
+                print("%10d %10d %12.1f %9.2fx" % (size, jobs, elapsed * 1000, serial / elapsed))
+    finally:
+        sys.setrecursionlimit(old_limit)
+    return results
@@ -0,0 +1,54 @@
+import os
+import tempfile
+import time
+from antlr4 import FileStream
+from generator.generator import parse
+from generator.errors import TinyCErrorListener
+from generator import parser_cache
+
+
+def _parse_time(filename):
+    """分析一次filename，返回所用的时间（秒）"""
+    input_stream = FileStream(filename)
+    start = time.perf_counter()
+    parse(input_stream, TinyCErrorListener())
+    return time.perf_counter() - start
+
+
+def run(filenames, repeat=3):
+    """
+    比较冷启动、进程内热启动以及从磁盘快照启动时的语法分析时间
+    :param filenames: C代码文件列表
+    :param repeat: 热启动时每个文件重复分析的次数，取最小值
+    :return: {文件名: (冷启动时间, 热启动时间, 快照启动时间)}
+    """
+    results = {}
+    for filename in filenames:
+        parser_cache.reset()
+        results[filename] = [_parse_time(filename)]
+
+    parser_cache.reset()
+    parser_cache.warm_up(filenames)
+    for filename in filenames:
+        results[filename].append(min(_parse_time(filename) for _ in range(repeat)))
+
+    fd, snapshot = tempfile.mkstemp(suffix=".dfa")
+    os.close(fd)
+    try:
+        parser_cache.save_snapshot(snapshot)
+        parser_cache.reset()
+        start = time.perf_counter()
+        parser_cache.load_snapshot(snapshot)
+        load_time = time.perf_counter() - start
+    finally:
+        os.remove(snapshot)
+    for filename in filenames:
+        results[filename].append(_parse_time(filename))
+
+    print("%-24s %10s %10s %10s" % ("file", "cold(ms)", "warm(ms)", "snapshot(ms)"))
+    for filename, (cold, warm, snap) in results.items():
+        print("%-24s %10.1f %10.1f %10.1f" % (filename, cold * 1000, warm * 1000, snap * 1000))
+    total = [sum(times[i] for times in results.values()) for i in range(3)]
+    print("%-24s %10.1f %10.1f %10.1f" % ("total", total[0] * 1000, total[1] * 1000, total[2] * 1000))
+    print("snapshot load: %.1f ms, DFA states (lexer, parser): %s" % (load_time * 1000, parser_cache.dfa_size()))
+    return results
@@ -0,0 +1,176 @@
+import json
+import os
+import platform
+import statistics
+import time
+from ctypes import CFUNCTYPE, c_int
+import llvmlite.binding as llvm
+from antlr4 import FileStream
+from generator.generator import tokenize, parse, TinyCGenerator
+from generator.errors import TinyCErrorListener
+from generator import parser_cache
+from executor.executor import initialize, create_execution_engine, optimize_module
+from benchmark.common import run_silently
+
+# 编译器的各个阶段，按执行的顺序排列
+PHASES = ("lex", "parse", "codegen", "serialize", "ir_parse", "verify", "optimize", "jit", "execute")
+
+# 默认的基准结果文件
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# 基准中位数低于该值（秒）的阶段噪声太大，不参与回归判断
+_NOISE_FLOOR = 0.0005
+
+
+def _measure_once(filename, opt_level):
+    """
+    完整地编译运行一次filename，记录每个阶段的时间
+    :return: {阶段: 时间（秒）}
+    """
+    times = {}
+    clock = time.perf_counter
+
+    start = clock()
+    tokens = tokenize(FileStream(filename))
+    times["lex"] = clock() - start
+
+    error_listener = TinyCErrorListener()
+    start = clock()
+    tree = parse(tokens, error_listener)
+    times["parse"] = clock() - start
+
+    start = clock()
+    generator = TinyCGenerator(error_listener)
+    generator.visit(tree)
+    times["codegen"] = clock() - start
+
+    start = clock()
+    llvm_ir = repr(generator.module)
+    times["serialize"] = clock() - start
+
+    start = clock()
+    mod = llvm.parse_assembly(llvm_ir)
+    times["ir_parse"] = clock() - start
+
+    start = clock()
+    mod.verify()
+    times["verify"] = clock() - start
+
+    start = clock()
+    optimize_module(mod, opt_level)
+    times["optimize"] = clock() - start
+
+    engine = create_execution_engine(opt_level)
+    start = clock()
+    engine.add_module(mod)
+    engine.finalize_object()
+    times["jit"] = clock() - start
+
+    main_func = CFUNCTYPE(c_int)(engine.get_function_address("main"))
+    times["execute"] = run_silently(main_func)
+    engine.remove_module(mod)
+    return times
+
+
+def _summarize(samples):
+    """把每次的阶段时间汇总成最小值和中位数"""
+    return {phase: {"min": min(sample[phase] for sample in samples),
+                    "median": statistics.median(sample[phase] for sample in samples)}
+            for phase in PHASES}
+
+
+def measure(filenames, repeat=5, opt_level=0):
+    """
+    记录每个程序每个阶段的时间。cold在每次编译前清空语法分析器的DFA缓存，warm先预热一次再计时
+    :param filenames: C代码文件列表
+    :param repeat: 每种情况重复的次数
+    :param opt_level: 优化级别
+    :return: 可以直接写成JSON的结果
+    """
+    initialize()
+    results = {}
+    for filename in filenames:
+        cold = []
+        for _ in range(repeat):
+            parser_cache.reset()
+            cold.append(_measure_once(filename, opt_level))
+        _measure_once(filename, opt_level)
+        warm = [_measure_once(filename, opt_level) for _ in range(repeat)]
+        results[filename] = {"cold": _summarize(cold), "warm": _summarize(warm)}
+    return {
+        "meta": {
+            "repeat": repeat,
+            "opt_level": opt_level,
+            "python": platform.python_version(),
+            "llvm": ".".join(str(v) for v in llvm.llvm_version_info),
+            "machine": platform.machine(),
+        },
+        "results": results,
+    }
+
+
+def print_report(report):
+    """按文件和冷热启动打印每个阶段时间的中位数（毫秒）"""
+    print("%-24s %-5s" % ("file", "") + "".join("%10s" % phase for phase in PHASES))
+    for filename, variants in report["results"].items():
+        for variant, phases in variants.items():
+            print("%-24s %-5s" % (filename, variant) +
+                  "".join("%10.2f" % (phases[phase]["median"] * 1000) for phase in PHASES))
+
+
+def compare(report, baseline, threshold=0.2):
+    """
+    和基准结果比较每个阶段时间的中位数
+    :param report: measure()的结果
+    :param baseline: 之前保存的measure()的结果
+    :param threshold: 超过基准的比例大于threshold时视为回归
+    :return: 回归的列表[(文件名, 冷热启动, 阶段, 基准时间, 当前时间)]
+    """
+    regressions = []
+    print("%-24s %-5s" % ("vs. baseline", "") + "".join("%10s" % phase for phase in PHASES))
+    for filename, variants in report["results"].items():
+        if filename not in baseline["results"]:
+            continue
+        for variant, phases in variants.items():
+            base_phases = baseline["results"][filename][variant]
+            cells = []
+            for phase in PHASES:
+                base, current = base_phases[phase]["median"], phases[phase]["median"]
+                if base < _NOISE_FLOOR:
+                    cells.append("%10s" % "-")
+                    continue
+                ratio = current / base
+                cells.append("%9.2fx" % ratio)
+                if ratio > 1 + threshold:
+                    regressions.append((filename, variant, phase, base, current))
+            print("%-24s %-5s" % (filename, variant) + "".join(cells))
+    for filename, variant, phase, base, current in regressions:
+        print("Regression: %s %s %s %.2f ms -> %.2f ms" % (filename, variant, phase, base * 1000, current * 1000))
+    return regressions
+
+
+def run(filenames, repeat=5, opt_level=0, json_filename=None, baseline_filename=DEFAULT_BASELINE,
+        update_baseline=False, threshold=0.2):
+    """
+    记录各阶段的时间，输出JSON并和基准比较
+    :return: 是否没有回归
+    """
+    report = measure(filenames, repeat, opt_level)
+    print_report(report)
+    if json_filename:
+        with open(json_filename, "w") as f:
+            json.dump(report, f, indent=2)
+
+    regressions = []
+    if update_baseline:
+        with open(baseline_filename, "w") as f:
+            json.dump(report, f, indent=2)
+    elif os.path.exists(baseline_filename):
+        with open(baseline_filename) as f:
+            baseline = json.load(f)
+        if baseline["meta"]["opt_level"] != opt_level:
+            print("Baseline was measured at -O%d, skip comparison" % baseline["meta"]["opt_level"])
+        else:
+            print()
+            regressions = compare(report, baseline, threshold)
+    return not regressions
@@ -0,0 +1,109 @@
+import sys
+from antlr4 import InputStream
+from generator.generator import parse, TinyCGenerator
+from generator.errors import TinyCErrorListener
+from generator.symbol_table import SymbolTable, RedefinitionError
+from benchmark.common import best_time, RECURSION_LIMIT
+
+
+class _LinearSymbolTable(object):
+    """原来的符号表：每层作用域一个字典，查找时从最内层逐层向外找"""
+    def __init__(self):
+        self.tables = [{}]
+
+    def __getitem__(self, item):
+        for table in reversed(self.tables):
+            if item in table:
+                return table[item]
+        return None
+
+    def get(self, item, default=None):
+        # 原来的代码先用in判断再用[]取值，需要找两遍
+        return self[item] if item in self else default
+
+    def __setitem__(self, key, value):
+        if key in self.tables[-1]:
+            raise RedefinitionError(key)
+        self.tables[-1][key] = value
+
+    def __contains__(self, item):
+        return any(item in table for table in self.tables)
+
+    def enter_scope(self):
+        self.tables.append({})
+
+    def exit_scope(self):
+        if len(self.tables) > 1:
+            self.tables.pop()
+
+
+def nested_scope_source(depth, uses=20):
+    """
+    生成嵌套depth层语句块的C代码，每层定义一个局部变量，最内层反复使用全局变量和最外层的变量，
+    这些名字的查找在原来的符号表中都要走过所有的层
+    :param depth: 嵌套层数
+    :param uses: 最内层语句的条数
+    :return: C代码字符串
+    """
+    lines = ["int g = 1;", "int main()", "{", "int s = 0;"]
+    for level in range(depth):
+        lines.append("{")
+        lines.append("int v%d = %d;" % (level, level))
+    for use in range(uses):
+        lines.append("s = s + g * v0 + v%d;" % (use % depth))
+    lines += ["}"] * depth
+    lines += ["return s;", "}"]
+    return "\n".join(lines) + "\n"
+
+
+def _lookups(table_class, depth, names):
+    """在depth层嵌套的作用域中按names逐个查找，返回一次完整的进出作用域和查找"""
+    def run():
+        table = table_class()
+        table["g"] = 1
+        for level in range(depth):
+            table.enter_scope()
+            table["v%d" % level] = level
+        for name in names:
+            table.get(name)
+        for level in range(depth):
+            table.exit_scope()
+    return run
+
+
+def _codegen(tree, table_class):
+    """用table_class作为符号表生成一次代码"""
+    def run():
+        generator = TinyCGenerator(TinyCErrorListener())
+        generator.symbol_table = table_class()
+        generator.visit(tree)
+    return run
+
+
+def run(depths, repeat=5, lookups=100000):
+    """
+    比较按层查找的符号表和扁平的符号表在深层嵌套作用域中的查找和代码生成时间
+    :param depths: 嵌套层数列表
+    :param repeat: 每项重复的次数，取最小值
+    :param lookups: 查找的次数
+    :return: {嵌套层数: (按层查找时间, 扁平查找时间, 按层代码生成时间, 扁平代码生成时间)}
+    """
+    old_limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(old_limit, RECURSION_LIMIT))
+    results = {}
+    print("%-8s %14s %14s %16s %16s" % ("depth", "linear(ms)", "flat(ms)", "linear cg(ms)", "flat cg(ms)"))
+    try:
+        for depth in depths:
+            # 一半是全局变量，一半是最外层的局部变量，都在最远的几层
+            names = ["g" if index % 2 else "v0" for index in range(lookups)]
+            linear = best_time(_lookups(_LinearSymbolTable, depth, names), repeat)
+            flat = best_time(_lookups(SymbolTable, depth, names), repeat)
+            tree = parse(InputStream(nested_scope_source(depth)), TinyCErrorListener())
+            linear_codegen = best_time(_codegen(tree, _LinearSymbolTable), repeat)
+            flat_codegen = best_time(_codegen(tree, SymbolTable), repeat)
+            results[depth] = (linear, flat, linear_codegen, flat_codegen)
+            print("%-8d %14.2f %14.2f %16.2f %16.2f" %
+                  (depth, linear * 1000, flat * 1000, linear_codegen * 1000, flat_codegen * 1000))
+    finally:
+        sys.setrecursionlimit(old_limit)
+    return results
@@ -0,0 +1,72 @@
+import sys
+import time
+from ctypes import CFUNCTYPE, c_int
+from antlr4 import InputStream
+from generator.generator import parse, TinyCGenerator
+from generator.errors import TinyCErrorListener
+from executor.executor import initialize, create_execution_engine, compile_ir
+from benchmark.common import run_silently, RECURSION_LIMIT
+
+
+def switch_source(cases, iterations):
+    """
+    生成一个解释器式的C程序：热循环中反复执行有cases个分支的switch
+    :param cases: case的个数
+    :param iterations: 循环次数
+    :return: C代码字符串
+    """
+    lines = ["int printf(const char *format,...);", "int step(int op, int value)", "{",
+             "int acc = value;", "switch (op) {"]
+    for case in range(cases):
+        lines.append("case %d:" % case)
+        lines.append("acc = (acc * %d + %d) %% 1000003;" % (case % 7 + 2, case))
+        lines.append("break;")
+    lines += ["default:", "acc = acc + 1;", "}", "return acc;", "}",
+              "int main()", "{", "int acc = 0;",
+              "for (int i = 0; i < %d; i++) {" % iterations,
+              "acc = step((i * 7) %% %d, acc);" % cases, "}",
+              'printf("%d\\n", acc);', "return 0;", "}"]
+    return "\n".join(lines) + "\n"
+
+
+def _measure(cases, iterations, opt_level):
+    """
+    编译运行一次有cases个分支的程序
+    :return: (基本块个数, 代码生成时间, JIT时间, 运行时间)
+    """
+    error_listener = TinyCErrorListener()
+    tree = parse(InputStream(switch_source(cases, iterations)), error_listener)
+    start = time.perf_counter()
+    generator = TinyCGenerator(error_listener)
+    generator.visit(tree)
+    codegen = time.perf_counter() - start
+    blocks = sum(len(function.blocks) for function in generator.module.functions)
+
+    engine = create_execution_engine(opt_level)
+    start = time.perf_counter()
+    compile_ir(engine, repr(generator.module), opt_level)
+    jit = time.perf_counter() - start
+    main_func = CFUNCTYPE(c_int)(engine.get_function_address("main"))
+    return blocks, codegen, jit, run_silently(main_func)
+
+
+def run(case_counts, iterations=1000000, opt_level=0):
+    """
+    记录不同case个数时switch的代码生成、JIT和运行时间
+    :param case_counts: case个数的列表
+    :param iterations: 热循环的次数
+    :param opt_level: 优化级别
+    :return: {case个数: (基本块个数, 代码生成时间, JIT时间, 运行时间)}
+    """
+    initialize()
+    old_limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(old_limit, RECURSION_LIMIT))
+    results = {}
+    print("%8s %10s %14s %12s %12s" % ("cases", "blocks", "codegen(ms)", "jit(ms)", "run(ms)"))
+    try:
+        for cases in case_counts:
+            blocks, codegen, jit, elapsed = results[cases] = _measure(cases, iterations, opt_level)
+            print("%8d %10d %14.1f %12.1f %12.1f" % (cases, blocks, codegen * 1000, jit * 1000, elapsed * 1000))
+    finally:
+        sys.setrecursionlimit(old_limit)
+    return results
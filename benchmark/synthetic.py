@@ -0,0 +1,206 @@
+"""
+生成任意规模的合法TinyC程序，用来测试编译器各部分随输入规模增长的表现。
+生成的程序只使用generator.py支持的语法：函数、结构体、数组初始化、嵌套的if/while/for、switch和长表达式链，
+并且运行结果是确定的，main函数打印所有函数返回值的校验和。
+"""
+import random
+import sys
+import time
+import tracemalloc
+from antlr4 import InputStream
+from generator.generator import parse, TinyCGenerator
+from generator.errors import TinyCErrorListener
+from executor.executor import initialize, create_execution_engine, compile_ir
+from benchmark.common import RECURSION_LIMIT
+
+_OPERATORS = ("+", "-", "*", "^", "|", "&")
+
+
+def _expression_chain(rng, length, names):
+    """由names中的变量和小常数组成的长度为length的表达式链"""
+    terms = [rng.choice(names) if rng.random() < 0.6 else str(rng.randint(1, 9)) for _ in range(length)]
+    expression = terms[0]
+    for term in terms[1:]:
+        expression += " %s %s" % (rng.choice(_OPERATORS), term)
+    return expression
+
+
+def _nested_blocks(rng, depth, chain):
+    """嵌套depth层的if/while/for语句，最内层是一条表达式链"""
+    lines = []
+    for level in range(depth):
+        kind = level % 3
+        if kind == 0:
+            lines.append("if (a %% %d != %d) {" % (level + 2, level % 2))
+        elif kind == 1:
+            lines.append("for (int i%d = 0; i%d < 2; i%d++) {" % (level, level, level))
+        else:
+            lines.append("while (n%d < 2) {" % level)
+            lines.append("n%d = n%d + 1;" % (level, level))
+    lines.append("r = r + (%s);" % _expression_chain(rng, chain, ["a", "b", "r"]))
+    for level in reversed(range(depth)):
+        lines.append("}")
+        if level % 3 == 2:
+            lines.insert(0, "int n%d = 0;" % level)
+    return lines
+
+
+def _switch(rng, cases):
+    """有cases个分支的switch语句"""
+    lines = ["switch (a %% %d) {" % (cases + 1)]
+    for case in range(cases):
+        lines.append("case %d:" % case)
+        lines.append("r = r + %d;" % rng.randint(1, 100))
+        if rng.random() < 0.8:
+            lines.append("break;")
+    lines += ["default:", "r = r - 1;", "break;", "}"]
+    return lines
+
+
+def synthetic_program(functions=10, depth=4, chain=16, cases=8, initializer=16, seed=0):
+    """
+    生成一个合法的TinyC程序
+    :param functions: 函数个数
+    :param depth: 每个函数中语句块嵌套的层数
+    :param chain: 表达式链的长度
+    :param cases: 每个switch的分支数
+    :param initializer: 全局数组和结构体数组初始化列表的长度
+    :param seed: 随机数种子，相同的参数总是生成相同的程序
+    :return: C代码字符串
+    """
+    rng = random.Random(seed)
+    lines = [
+        "int printf(const char *format,...);",
+        "struct Item {",
+        "    int key;",
+        "    int value;",
+        "};",
+        "int table[%d] = {%s};" % (initializer, ", ".join(str(rng.randint(0, 999)) for _ in range(initializer))),
+        "struct Item items[%d] = {%s};" % (initializer, ", ".join(
+            "{%d, %d}" % (rng.randint(0, 99), rng.randint(0, 99)) for _ in range(initializer))),
+    ]
+    for index in range(functions):
+        lines.append("int f%d(int a, int b)" % index)
+        lines.append("{")
+        lines.append("int r = %d;" % index)
+        lines.append("struct Item item;")
+        lines.append("item.key = a;")
+        lines.append("item.value = table[(a + %d) %% %d];" % (index, initializer))
+        lines.extend(_nested_blocks(rng, depth, chain))
+        lines.extend(_switch(rng, cases))
+        lines.append("r = r + item.key * item.value + items[(b + %d) %% %d].value;" % (index, initializer))
+        if index > 0:
+            lines.append("r = r + f%d(b, a %% 7);" % (rng.randrange(index)))
+        lines.append("return r & 65535;")
+        lines.append("}")
+    lines.append("int main()")
+    lines.append("{")
+    lines.append("int sum = 0;")
+    lines.append("int values[%d] = {%s};" % (initializer, ", ".join(str(rng.randint(0, 99)) for _ in range(initializer))))
+    for index in range(functions):
+        lines.append("sum = (sum + f%d(values[%d], %d)) & 1048575;" % (index, index % initializer, index))
+    lines.append('printf("checksum=%d\\n", sum);')
+    lines.append("return 0;")
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def _compile(source):
+    """
+    编译一次source
+    :return: ({阶段: 时间（秒）}, IR代码)
+    """
+    times = {}
+    start = time.perf_counter()
+    error_listener = TinyCErrorListener()
+    tree = parse(InputStream(source), error_listener)
+    times["parse"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    generator = TinyCGenerator(error_listener)
+    generator.visit(tree)
+    llvm_ir = repr(generator.module)
+    times["codegen"] = time.perf_counter() - start
+    if error_listener.errors:
+        error_listener.print_errors()
+        raise ValueError("Synthetic program does not compile")
+
+    start = time.perf_counter()
+    compile_ir(create_execution_engine(), llvm_ir)
+    times["jit"] = time.perf_counter() - start
+    return times, llvm_ir
+
+
+def _peak_memory(source):
+    """编译source时Python堆内存的峰值（字节），不含LLVM的原生内存"""
+    tracemalloc.start()
+    try:
+        error_listener = TinyCErrorListener()
+        generator = TinyCGenerator(error_listener)
+        generator.visit(parse(InputStream(source), error_listener))
+        repr(generator.module)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def plot(rows, filename):
+    """
+    画出各阶段时间和内存峰值随源代码行数变化的曲线，需要安装matplotlib
+    :param rows: run()的结果
+    :param filename: 图片文件名
+    :return: None
+    """
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("matplotlib is required to plot, skip", filename)
+        return
+    lines = [row[1] for row in rows]
+    figure, (time_axis, memory_axis) = plt.subplots(1, 2, figsize=(12, 5))
+    for column, label in ((2, "parse"), (3, "codegen"), (4, "jit")):
+        time_axis.plot(lines, [row[column] for row in rows], marker="o", label=label)
+    time_axis.set_xlabel("source lines")
+    time_axis.set_ylabel("time (s)")
+    time_axis.legend()
+    memory_axis.plot(lines, [row[5] / 1024 / 1024 for row in rows], marker="o")
+    memory_axis.set_xlabel("source lines")
+    memory_axis.set_ylabel("peak Python memory (MB)")
+    figure.savefig(filename)
+
+
+def run(sizes, depth=4, chain=16, cases=8, initializer=16, csv_filename=None, plot_filename=None):
+    """
+    生成函数个数为sizes中各个值的程序，记录各阶段时间与内存峰值随规模的变化
+    :param sizes: 函数个数的列表
+    :param csv_filename: 结果另存为CSV文件
+    :param plot_filename: 结果画成图片（需要matplotlib）
+    :return: [(函数个数, 源代码行数, 语法分析时间, 代码生成时间, JIT时间, 内存峰值)]
+    """
+    initialize()
+    old_limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(old_limit, RECURSION_LIMIT))
+    rows = []
+    print("%10s %10s %12s %12s %12s %12s" % ("functions", "lines", "parse(ms)", "codegen(ms)", "jit(ms)", "peak(KB)"))
+    try:
+        for size in sizes:
+            source = synthetic_program(size, depth, chain, cases, initializer)
+            times, _ = _compile(source)
+            peak = _peak_memory(source)
+            row = (size, source.count("\n"), times["parse"], times["codegen"], times["jit"], peak)
+            rows.append(row)
+            print("%10d %10d %12.1f %12.1f %12.1f %12.1f" %
+                  (size, row[1], times["parse"] * 1000, times["codegen"] * 1000, times["jit"] * 1000, peak / 1024))
+    finally:
+        sys.setrecursionlimit(old_limit)
+
+    if csv_filename:
+        with open(csv_filename, "w") as f:
+            f.write("functions,lines,parse_s,codegen_s,jit_s,peak_bytes\n")
+            for row in rows:
+                f.write(",".join(str(value) for value in row) + "\n")
+    if plot_filename:
+        plot(rows, plot_filename)
+    return rows
@@ -1,8 +1,294 @@
 import llvmlite.binding as llvm
+import hashlib
+import os
+import subprocess
 import sys
+import tempfile
+import threading
+import time
+import unittest
 from ctypes import CFUNCTYPE, c_int
 
-def create_execution_engine():
+# 支持的优化级别，与clang的-O0到-O3对应
+OPT_LEVELS = (0, 1, 2, 3)
+
+# 各优化级别下函数内联的阈值，与clang一致
+_INLINE_THRESHOLDS = {1: 0, 2: 225, 3: 275}
+
+# LLVM bitcode文件开头的魔数
+BITCODE_MAGIC = b"BC\xc0\xde"
+
+
+_initialized = False
+_target_data = None
+
+
+def initialize():
+    """初始化LLVM的本机目标，代码生成前必须调用，重复调用时只初始化一次"""
+    global _initialized
+    if _initialized:
+        return
+    llvm.initialize()
+    llvm.initialize_native_target()
+    llvm.initialize_native_asmprinter()
+    _initialized = True
+
+
+def target_data():
+    """
+    本机的数据布局，和JIT以及生成本机代码时使用的布局一致，代码生成时用来计算sizeof
+    :return: llvmlite.binding.TargetData
+    """
+    global _target_data
+    if _target_data is None:
+        initialize()
+        _target_data = llvm.Target.from_default_triple().create_target_machine().target_data
+    return _target_data
+
+
+def optimize_module(mod, opt_level):
+    """
+    用PassManagerBuilder构造的优化流水线原地优化模块
+    -O1及以上包含mem2reg、instcombine、GVN、LICM和函数内联，-O2及以上再打开循环展开和向量化
+    :param mod: llvmlite.binding的模块
+    :param opt_level: 优化级别，0表示不优化
+    :return: 优化后的模块
+    """
+    if opt_level not in OPT_LEVELS:
+        raise ValueError("Unsupported optimization level -O{}".format(opt_level))
+    if opt_level == 0:
+        return mod
+    pmb = llvm.create_pass_manager_builder()
+    pmb.opt_level = opt_level
+    pmb.inlining_threshold = _INLINE_THRESHOLDS[opt_level]
+    pmb.disable_unroll_loops = opt_level < 2
+    pmb.loop_vectorize = opt_level >= 2
+    pmb.slp_vectorize = opt_level >= 2
+
+    target_machine = llvm.Target.from_default_triple().create_target_machine(opt=opt_level)
+    fpm = llvm.create_function_pass_manager(mod)
+    mpm = llvm.create_module_pass_manager()
+    target_machine.add_analysis_passes(fpm)
+    target_machine.add_analysis_passes(mpm)
+    pmb.populate(fpm)
+    pmb.populate(mpm)
+
+    fpm.initialize()
+    for function in mod.functions:
+        fpm.run(function)
+    fpm.finalize()
+    mpm.run(mod)
+    return mod
+
+
+def parse_module(llvm_ir):
+    """
+    解析IR代码或bitcode
+    :param llvm_ir: IR代码字符串，或者bitcode字节串
+    :return: llvmlite.binding的模块
+    """
+    if isinstance(llvm_ir, bytes):
+        return llvm.parse_bitcode(llvm_ir)
+    return llvm.parse_assembly(llvm_ir)
+
+
+def to_bitcode(llvm_ir, opt_level=0):
+    """
+    把IR代码验证、优化后转成bitcode
+    :param llvm_ir: IR代码
+    :param opt_level: 优化级别
+    :return: bitcode字节串
+    """
+    initialize()
+    mod = llvm.parse_assembly(llvm_ir)
+    mod.verify()
+    return optimize_module(mod, opt_level).as_bitcode()
+
+
+def optimize_ir(llvm_ir, opt_level):
+    """
+    优化IR代码字符串
+    :param llvm_ir: IR代码
+    :param opt_level: 优化级别
+    :return: 优化后的IR代码
+    """
+    if opt_level == 0:
+        return llvm_ir
+    initialize()
+    mod = llvm.parse_assembly(llvm_ir)
+    mod.verify()
+    return str(optimize_module(mod, opt_level))
+
+
+def _native_module(llvm_ir, opt_level):
+    """
+    解析并优化IR代码，设置成本机的目标三元组和数据布局，用于生成本机代码
+    :return: (模块, 目标机器)
+    """
+    initialize()
+    # 生成可执行文件时链接器默认生成位置无关的可执行文件，目标代码也要位置无关
+    target_machine = llvm.Target.from_default_triple().create_target_machine(opt=opt_level, reloc="pic")
+    mod = llvm.parse_assembly(llvm_ir)
+    mod.triple = target_machine.triple
+    mod.data_layout = str(target_machine.target_data)
+    mod.verify()
+    optimize_module(mod, opt_level)
+    return mod, target_machine
+
+
+def emit_object(llvm_ir, opt_level=0):
+    """
+    把IR代码编译成本机的目标文件
+    :param llvm_ir: IR代码
+    :param opt_level: 优化级别
+    :return: 目标文件的内容
+    """
+    mod, target_machine = _native_module(llvm_ir, opt_level)
+    return target_machine.emit_object(mod)
+
+
+def emit_assembly(llvm_ir, opt_level=0):
+    """
+    把IR代码编译成本机的汇编代码
+    :param llvm_ir: IR代码
+    :param opt_level: 优化级别
+    :return: 汇编代码
+    """
+    mod, target_machine = _native_module(llvm_ir, opt_level)
+    return target_machine.emit_assembly(mod)
+
+
+def link_executable(object_code, filename, linker="cc"):
+    """
+    用系统的C编译器驱动程序把目标代码和C标准库链接成可执行文件
+    :param object_code: 目标文件的内容
+    :param filename: 可执行文件名
+    :param linker: 链接时调用的命令
+    :return: None
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        object_filename = os.path.join(directory, "main.o")
+        with open(object_filename, "wb") as f:
+            f.write(object_code)
+        subprocess.run([linker, object_filename, "-o", filename, "-lm"], check=True)
+
+
+class ObjectCache(object):
+    """
+    磁盘上的JIT目标代码缓存，通过ExecutionEngine.set_object_cache挂到MCJIT上。
+    键是IR代码、目标三元组、CPU型号与特性以及优化级别的哈希，命中时直接加载目标代码，跳过验证、优化和代码生成。
+    缓存目录总大小超过max_bytes时按最近使用时间淘汰，超过max_age秒未使用的文件也会被删除
+    """
+    SUFFIX = ".o"
+
+    def __init__(self, directory, max_bytes=64 * 1024 * 1024, max_age=7 * 24 * 3600):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0  # 命中次数
+        self.misses = 0  # 未命中次数
+        self.stores = 0  # 写入次数
+        self.evictions = 0  # 淘汰的文件数
+        self._modules = {}  # id(模块) -> (键, 已加载的目标代码)
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(llvm_ir, opt_level):
+        """
+        计算缓存的键
+        :param llvm_ir: IR代码或bitcode
+        :param opt_level: 优化级别
+        :return: 十六进制字符串
+        """
+        digest = hashlib.sha256()
+        for part in (llvm.get_process_triple(), llvm.get_host_cpu_name(),
+                     llvm.get_host_cpu_features().flatten(), str(opt_level), llvm_ir):
+            digest.update(part if isinstance(part, bytes) else part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.SUFFIX)
+
+    def load(self, key):
+        """
+        读取缓存的目标代码并更新命中计数
+        :return: 目标代码，未命中时返回None
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                buffer = f.read()
+            os.utime(path)  # 记录最近一次使用的时间
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return buffer
+
+    def store(self, key, buffer):
+        """写入目标代码，先写临时文件再改名，避免并发的进程读到一半的文件"""
+        path = self._path(key)
+        temp_path = "%s.%d.tmp" % (path, os.getpid())
+        with open(temp_path, "wb") as f:
+            f.write(buffer)
+        os.replace(temp_path, path)
+        self.stores += 1
+        self.evict()
+
+    def evict(self):
+        """删除过期的文件，再按最近使用时间从旧到新删除，直到总大小不超过max_bytes"""
+        now = time.time()
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(self.SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:  # 已被其他进程删除
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for mtime, size, path in entries:
+            if now - mtime <= self.max_age and total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                self.evictions += 1
+            except OSError:
+                pass
+            total -= size
+
+    def register(self, mod, key, buffer):
+        """记录模块对应的键和已加载的目标代码，供MCJIT的回调使用"""
+        self._modules[id(mod)] = (key, buffer)
+
+    def attach(self, engine):
+        """把缓存挂到执行引擎上"""
+        engine.set_object_cache(self._notify, self._getbuffer)
+
+    def _notify(self, mod, buffer):
+        """MCJIT生成目标代码之后的回调"""
+        entry = self._modules.pop(id(mod), None)
+        if entry is not None and entry[1] is None:
+            self.store(entry[0], buffer)
+
+    def _getbuffer(self, mod):
+        """MCJIT生成目标代码之前的回调，返回None时MCJIT自己生成"""
+        entry = self._modules.get(id(mod))
+        if entry is None or entry[1] is None:
+            return None
+        del self._modules[id(mod)]
+        return entry[1]
+
+    def summary(self):
+        return "Object cache: %d hits, %d misses, %d stores, %d evictions" % \
+               (self.hits, self.misses, self.stores, self.evictions)
+
+
+def create_execution_engine(opt_level=0):
     """
     Create an ExecutionEngine suitable for JIT code generation on
     the host CPU.  The engine is reusable for an arbitrary number of
@@ -10,56 +296,211 @@ def create_execution_engine():
     """
     # Create a target machine representing the host
     target = llvm.Target.from_default_triple()
-    target_machine = target.create_target_machine()
+    target_machine = target.create_target_machine(opt=opt_level)
     # And an execution engine with an empty backing module
     backing_mod = llvm.parse_assembly("")
     engine = llvm.create_mcjit_compiler(backing_mod, target_machine)
     return engine
 
 
-def compile_ir(engine, llvm_ir):
+def check_symbols(mod):
+    """
+    检查模块中只有声明没有定义的函数和全局变量都能在当前进程中找到（C标准库等已加载的动态库）。
+    执行引擎会记住之前加载过的模块的符号，即使模块已经移除，只有声明的函数也可能解析到其他程序的代码，
+    因此在加入执行引擎之前拒绝这样的模块
+    :param mod: llvmlite.binding的模块
+    :return: None
+    """
+    for value in list(mod.functions) + list(mod.global_variables):
+        if value.is_declaration and not value.name.startswith("llvm.") and \
+                llvm.address_of_symbol(value.name) is None:
+            raise ValueError("Undefined symbol {}".format(value.name))
+
+
+class _NoPhase(object):
+    """不计时的阶段，什么也不做（contextlib.nullcontext要Python 3.7才有）"""
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NO_PHASE = _NoPhase()
+
+
+def _phase(stats, name):
+    """stats为None时不计时，否则记录名为name的阶段的耗时（stats是generator.stats.Statistics）"""
+    return _NO_PHASE if stats is None else stats.phase(name)
+
+
+def compile_ir(engine, llvm_ir, opt_level=0, object_cache=None, stats=None):
     """
-    Compile the LLVM IR string with the given engine.
+    Compile the LLVM IR string or bitcode bytes with the given engine.
+    Declarations that the process cannot resolve are rejected with ValueError.
+    The module is optimized at opt_level before being added.
+    If object_cache holds the object code of the same IR, verification,
+    optimization and code generation are all skipped.
+    If stats is given, the time of each step is recorded in it.
     The compiled module object is returned.
     """
+    buffer = None
+    if object_cache is not None:
+        key = object_cache.key(llvm_ir, opt_level)
+        buffer = object_cache.load(key)
+        if stats is not None:
+            stats.count("object_cache_hit", int(buffer is not None))
     # Create a LLVM module object from the IR
-    mod = llvm.parse_assembly(llvm_ir)
-    mod.verify()
+    with _phase(stats, "ir_parse"):
+        mod = parse_module(llvm_ir)
+    check_symbols(mod)
+    if buffer is None:
+        with _phase(stats, "verify"):
+            mod.verify()
+        with _phase(stats, "optimize"):
+            optimize_module(mod, opt_level)
+    if object_cache is not None:
+        object_cache.register(mod, key, buffer)
+        object_cache.attach(engine)
     # Now add the module and make sure it is ready for execution
-    engine.add_module(mod)
-    engine.finalize_object()
+    with _phase(stats, "jit"):
+        engine.add_module(mod)
+        engine.finalize_object()
     return mod
 
 
-def execute(ir_filename):
+class Executor(object):
+    """
+    可复用的执行器：LLVM只初始化一次，执行引擎放在池中反复使用。
+    每个程序都编译成新的模块加入引擎，运行结束后再从引擎中移除；
+    引擎仍然记得移除的模块定义过的符号，所以只声明不定义的函数必须由C标准库提供（见check_symbols），程序之间互不影响。
+    MCJIT不会释放已加载的目标代码，因此一个引擎运行max_runs个程序后就会被丢弃，换成新的引擎
+    """
+    def __init__(self, opt_level=0, object_cache=None, pool_size=2, max_runs=64):
+        """
+        :param opt_level: JIT编译前的优化级别
+        :param object_cache: 目标代码缓存ObjectCache，为None时不使用缓存
+        :param pool_size: 池中最多保留的空闲执行引擎数
+        :param max_runs: 每个执行引擎最多运行的程序数
+        """
+        initialize()
+        self.opt_level = opt_level
+        self.object_cache = object_cache
+        self.pool_size = pool_size
+        self.max_runs = max_runs
+        self.engines_created = 0  # 创建过的执行引擎数
+        self._pool = []  # 空闲的(执行引擎, 已运行的程序数)
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        """从池中取出一个执行引擎，池为空时新建"""
+        with self._lock:
+            if self._pool:
+                return self._pool.pop()
+            self.engines_created += 1
+        return create_execution_engine(self.opt_level), 0
+
+    def _release(self, engine, runs):
+        """把执行引擎放回池中，运行过太多程序或池已满时丢弃"""
+        with self._lock:
+            if runs < self.max_runs and len(self._pool) < self.pool_size:
+                self._pool.append((engine, runs))
+
+    def execute_ir(self, llvm_ir, stats=None):
+        """
+        编译并执行IR代码的main函数
+        :param llvm_ir: IR代码字符串，或者bitcode字节串
+        :param stats: 统计信息，不为None时记录编译和运行各阶段的耗时
+        :return: main函数的返回值
+        """
+        engine, runs = self._acquire()
+        try:
+            mod = compile_ir(engine, llvm_ir, self.opt_level, self.object_cache, stats)
+        except ValueError:  # 模块加入引擎之前就被拒绝，引擎没有变化，可以继续使用
+            self._release(engine, runs)
+            raise
+        try:
+            main_func = CFUNCTYPE(c_int)(engine.get_function_address("main"))
+            with _phase(stats, "run"):
+                ret = main_func()
+        finally:
+            engine.remove_module(mod)
+            self._release(engine, runs + 1)
+        return ret
+
+    def execute(self, ir_filename, stats=None):
+        """
+        执行IR代码文件，根据文件开头的魔数区分bitcode和文本格式
+        :param ir_filename: 文件名
+        :param stats: 统计信息，不为None时记录读文件、编译和运行各阶段的耗时
+        :return: main函数的返回值
+        """
+        with _phase(stats, "read"):
+            with open(ir_filename, "rb") as f:
+                data = f.read()
+            if not data.startswith(BITCODE_MAGIC):
+                data = data.decode("utf-8")
+        ret = self.execute_ir(data, stats)
+        if stats is not None:
+            stats.record_peak_rss()
+        return ret
+
+    def execute_many(self, ir_filenames):
+        """
+        依次执行多个IR代码文件
+        :param ir_filenames: 文件名列表
+        :return: 各个main函数的返回值列表
+        """
+        return [self.execute(ir_filename) for ir_filename in ir_filenames]
+
+
+def execute(ir_filename, opt_level=0, object_cache=None, stats=None):
     """
     执行ir代码
-    :param ir_filename:文件名
-    :param 代码输出的文件，如果没有，则打印在屏幕上
+    :param ir_filename:文件名，可以是文本格式的.ll或者bitcode格式的.bc
+    :param opt_level: JIT编译前的优化级别
+    :param object_cache: 目标代码缓存ObjectCache，为None时不使用缓存
+    :param stats: 统计信息generator.stats.Statistics，为None时不统计
     :return:
     """
-    # All these initializations are required for code generation!
-    llvm.initialize()
-    llvm.initialize_native_target()
-    llvm.initialize_native_asmprinter()
+    return Executor(opt_level, object_cache).execute(ir_filename, stats)
 
-    with open(ir_filename) as f:
-        llvm_ir = f.read()
-        engine = create_execution_engine()
-        mod = compile_ir(engine, llvm_ir)
 
-        main_type = CFUNCTYPE(c_int)
-        main_func = main_type(engine.get_function_address("main"))
-        ret = main_func()
+class ExecutorTest(unittest.TestCase):
+    """执行器单元测试"""
+    DEFINE = 'define i32 @helper() {\n  ret i32 42\n}\n' \
+             'define i32 @main() {\n  %r = call i32 @helper()\n  ret i32 %r\n}\n'
+    DECLARE = 'declare i32 @helper()\n' \
+              'define i32 @main() {\n  %r = call i32 @helper()\n  %s = add i32 %r, 1\n  ret i32 %s\n}\n'
+    LIBC = 'declare i32 @abs(i32)\n' \
+           'define i32 @main() {\n  %r = call i32 @abs(i32 -7)\n  ret i32 %r\n}\n'
 
-        return ret
+    def setUp(self):
+        self.executor = Executor(pool_size=1)
+
+    def test_1(self):
+        """只声明的函数不能解析到之前运行的程序中的定义"""
+        self.assertEqual(self.executor.execute_ir(self.DEFINE), 42)
+        with self.assertRaises(ValueError):
+            self.executor.execute_ir(self.DECLARE)
+        self.assertEqual(self.executor.execute_ir(self.DEFINE), 42)
+        self.assertEqual(self.executor.engines_created, 1)
+
+    def test_2(self):
+        """C标准库中的函数可以只声明"""
+        self.assertEqual(self.executor.execute_ir(self.LIBC), 7)
+        self.assertEqual(self.executor.execute_ir(self.DEFINE), 42)
 
 
 if __name__ == '__main__':
     if len(sys.argv) < 2:
-        print("IR filename required. Usage: python executor.py IR_filename")
+        print("IR filename required. Usage: python executor.py IR_filename [opt_level] [cache_directory]")
         exit(-1)
 
-    ret = execute(sys.argv[1])
+    cache = ObjectCache(sys.argv[3]) if len(sys.argv) > 3 else None
+    ret = execute(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 0, cache)
+    if cache is not None:
+        sys.stdout.flush()
+        print(cache.summary(), file=sys.stderr)
     if ret is not None:
         print("Program exits with code ", ret)
\ No newline at end of file
@@ -0,0 +1,458 @@
+"""
+表达式的抽象语法树（AST）以及从ANTLR语法树到AST的降低（lowering）。
+C.g4中每一级二元运算符都是一条单独的左递归规则，即使是一个字面量1，语法树中也会产生
+assignmentExpression -> conditionalExpression -> logicalOrExpression -> ... -> primaryExpression
+这样十几层只有一个孩子的节点，代码生成时还要反复调用getText()判断匹配的是哪一个分支。
+lower_expression在代码生成前把表达式语法树转换成紧凑的AST：
+单孩子节点和括号被跳过，节点类型用Kind枚举表示，运算符、常量和标识符在降低时就已经解码好，
+操作数都是常量的运算在降低时就折叠成Constant节点（见folding.py）。
+"""
+import enum
+import sys
+from antlr4 import ParserRuleContext
+from parser_.CParser import CParser
+from generator.types import TinyCTypes
+from generator.util import parse_escape
+from generator.folding import is_foldable, fold_binary, fold_unary, fold_conditional
+
+
+class Kind(enum.IntEnum):
+    """AST节点的类型"""
+    IDENTIFIER = 0
+    CONSTANT = 1
+    STRING = 2
+    BINARY = 3
+    ASSIGN = 4
+    CONDITIONAL = 5
+    UNARY = 6
+    PREFIX = 7
+    POSTFIX = 8
+    INDEX = 9
+    CALL = 10
+    MEMBER = 11
+    COMMA = 12
+    SIZEOF = 13
+
+
+class Node(object):
+    """AST节点基类，ctx是对应的语法树节点，只用于报错"""
+    __slots__ = ('ctx',)
+    kind = None
+
+
+class Identifier(Node):
+    """标识符"""
+    __slots__ = ('name',)
+    kind = Kind.IDENTIFIER
+
+    def __init__(self, name, ctx):
+        self.ctx = ctx
+        self.name = sys.intern(name)
+
+
+class Constant(Node):
+    """整数、浮点数或字符常量，value是已经解码好的ir.Constant"""
+    __slots__ = ('value',)
+    kind = Kind.CONSTANT
+
+    def __init__(self, value, ctx):
+        self.ctx = ctx
+        self.value = value
+
+
+class String(Node):
+    """字符串字面量，value是已经处理过转义字符的内容（不含结尾的'\\0'）"""
+    __slots__ = ('value',)
+    kind = Kind.STRING
+
+    def __init__(self, value, ctx):
+        self.ctx = ctx
+        self.value = value
+
+
+class Binary(Node):
+    """二元运算，包括短路的'&&'和'||'"""
+    __slots__ = ('op', 'lhs', 'rhs')
+    kind = Kind.BINARY
+
+    def __init__(self, op, lhs, rhs, ctx):
+        self.ctx = ctx
+        self.op = op
+        self.lhs = lhs
+        self.rhs = rhs
+
+
+class Assign(Node):
+    """赋值，op是'='或者复合赋值运算符"""
+    __slots__ = ('op', 'target', 'value')
+    kind = Kind.ASSIGN
+
+    def __init__(self, op, target, value, ctx):
+        self.ctx = ctx
+        self.op = op
+        self.target = target
+        self.value = value
+
+
+class Conditional(Node):
+    """条件表达式 cond ? then : otherwise"""
+    __slots__ = ('cond', 'then', 'otherwise')
+    kind = Kind.CONDITIONAL
+
+    def __init__(self, cond, then, otherwise, ctx):
+        self.ctx = ctx
+        self.cond = cond
+        self.then = then
+        self.otherwise = otherwise
+
+
+class Unary(Node):
+    """一元运算，op是'&', '*', '+', '-', '~', '!'之一"""
+    __slots__ = ('op', 'operand')
+    kind = Kind.UNARY
+
+    def __init__(self, op, operand, ctx):
+        self.ctx = ctx
+        self.op = op
+        self.operand = operand
+
+
+class Prefix(Node):
+    """前加减 ++x, --x"""
+    __slots__ = ('op', 'operand')
+    kind = Kind.PREFIX
+
+    def __init__(self, op, operand, ctx):
+        self.ctx = ctx
+        self.op = op
+        self.operand = operand
+
+
+class Postfix(Node):
+    """后加减 x++, x--"""
+    __slots__ = ('op', 'operand')
+    kind = Kind.POSTFIX
+
+    def __init__(self, op, operand, ctx):
+        self.ctx = ctx
+        self.op = op
+        self.operand = operand
+
+
+class Index(Node):
+    """数组下标 base[index]"""
+    __slots__ = ('base', 'index')
+    kind = Kind.INDEX
+
+    def __init__(self, base, index, ctx):
+        self.ctx = ctx
+        self.base = base
+        self.index = index
+
+
+class Call(Node):
+    """函数调用 callee(args)"""
+    __slots__ = ('callee', 'args')
+    kind = Kind.CALL
+
+    def __init__(self, callee, args, ctx):
+        self.ctx = ctx
+        self.callee = callee
+        self.args = args
+
+
+class Member(Node):
+    """结构体成员 base.name 或 base->name"""
+    __slots__ = ('op', 'base', 'name')
+    kind = Kind.MEMBER
+
+    def __init__(self, op, base, name, ctx):
+        self.ctx = ctx
+        self.op = op
+        self.base = base
+        self.name = sys.intern(name)
+
+
+class Comma(Node):
+    """逗号表达式，依次求值，结果为最后一个表达式的值"""
+    __slots__ = ('items',)
+    kind = Kind.COMMA
+
+    def __init__(self, items, ctx):
+        self.ctx = ctx
+        self.items = items
+
+
+class Sizeof(Node):
+    """sizeof，operand是表达式的AST，或者type_name是类型名的语法树节点，两者只有一个不为None"""
+    __slots__ = ('operand', 'type_name')
+    kind = Kind.SIZEOF
+
+    def __init__(self, operand, type_name, ctx):
+        self.ctx = ctx
+        self.operand = operand
+        self.type_name = type_name
+
+
+# 形如 xxxExpression : yyyExpression | xxxExpression op yyyExpression 的二元运算规则
+BINARY_RULES = frozenset([
+    CParser.RULE_multiplicativeExpression,
+    CParser.RULE_additiveExpression,
+    CParser.RULE_shiftExpression,
+    CParser.RULE_relationalExpression,
+    CParser.RULE_equalityExpression,
+    CParser.RULE_andExpression,
+    CParser.RULE_exclusiveOrExpression,
+    CParser.RULE_inclusiveOrExpression,
+    CParser.RULE_logicalAndExpression,
+    CParser.RULE_logicalOrExpression,
+])
+
+# 只有一个孩子时可以直接跳过的规则
+_PASS_THROUGH_RULES = BINARY_RULES | frozenset([
+    CParser.RULE_expression,
+    CParser.RULE_forExpression,
+    CParser.RULE_assignmentExpression,
+    CParser.RULE_conditionalExpression,
+    CParser.RULE_constantExpression,
+    CParser.RULE_castExpression,
+    CParser.RULE_unaryExpression,
+    CParser.RULE_postfixExpression,
+])
+
+# 所有会被降低成AST的表达式规则
+EXPRESSION_RULES = _PASS_THROUGH_RULES | frozenset([CParser.RULE_primaryExpression])
+
+
+def _skip(ctx):
+    """跳过只有一个孩子的表达式节点以及括号，返回第一个真正有内容的节点"""
+    while True:
+        rule = ctx.getRuleIndex()
+        children = ctx.children
+        if len(children) == 1 and rule in _PASS_THROUGH_RULES and isinstance(children[0], ParserRuleContext):
+            ctx = children[0]
+        elif len(children) == 3 and rule == CParser.RULE_primaryExpression \
+                and isinstance(children[1], CParser.ExpressionContext):  # '(' expression ')'
+            ctx = children[1]
+        else:
+            return ctx
+
+
+def lower_expression(ctx):
+    """
+    将表达式语法树降低成AST
+    :param ctx: 任意一级表达式的语法树节点
+    :return: AST节点
+    """
+    ctx = _skip(ctx)
+    rule = ctx.getRuleIndex()
+    if rule in BINARY_RULES:
+        return _lower_binary(ctx)
+    return _lowerers[rule](ctx)
+
+
+def _lower_binary(ctx):
+    """
+    xxxExpression
+        :   yyyExpression
+        |   xxxExpression op yyyExpression
+        ;
+    左递归链a+b+c+...沿左侧向下迭代展开，不会因为表达式很长而递归过深
+    """
+    spine = []
+    while ctx.getRuleIndex() in BINARY_RULES:
+        spine.append(ctx)
+        ctx = _skip(ctx.children[0])
+    node = lower_expression(ctx)
+    for binary_ctx in reversed(spine):
+        op, rhs = binary_ctx.children[1].symbol.text, lower_expression(binary_ctx.children[2])
+        if _is_constant(node) and _is_constant(rhs):
+            value = fold_binary(op, node.value, rhs.value)
+            if value is not None:
+                node = Constant(value, binary_ctx)
+                continue
+        node = Binary(op, node, rhs, binary_ctx)
+    return node
+
+
+def _is_constant(node):
+    """是否是可以参与常量折叠的常量节点"""
+    return node.kind is Kind.CONSTANT and is_foldable(node.value)
+
+
+def _lower_list(ctx):
+    """
+    expression
+        :   assignmentExpression
+        |   expression ',' assignmentExpression
+        ;
+    forExpression
+        :   assignmentExpression
+        |   forExpression ',' assignmentExpression
+        ;
+    """
+    items = []
+    list_ctx = ctx
+    while list_ctx.getRuleIndex() == ctx.getRuleIndex() and len(list_ctx.children) == 3:
+        items.append(lower_expression(list_ctx.children[2]))
+        list_ctx = list_ctx.children[0]
+    items.append(lower_expression(list_ctx))
+    items.reverse()
+    return Comma(items, ctx)
+
+
+def _lower_assignment(ctx):
+    """
+    assignmentExpression
+        :   conditionalExpression
+        |   unaryExpression assignmentOperator assignmentExpression
+        |   DigitSequence
+        ;
+    """
+    if len(ctx.children) == 1:  # DigitSequence
+        return _lower_digit_sequence(ctx)
+    op = ctx.children[1].children[0].symbol.text
+    return Assign(op, lower_expression(ctx.children[0]), lower_expression(ctx.children[2]), ctx)
+
+
+def _lower_conditional(ctx):
+    """
+    conditionalExpression
+        :   logicalOrExpression ('?' expression ':' conditionalExpression)?
+        ;
+    """
+    cond, then, otherwise = (lower_expression(ctx.children[i]) for i in (0, 2, 4))
+    if _is_constant(cond) and _is_constant(then) and _is_constant(otherwise):
+        value = fold_conditional(cond.value, then.value, otherwise.value)
+        if value is not None:
+            return Constant(value, ctx)
+    return Conditional(cond, then, otherwise, ctx)
+
+
+def _lower_cast(ctx):
+    """
+    castExpression
+        :   '(' typeName ')' castExpression
+        |   unaryExpression
+        |   DigitSequence
+        ;
+    """
+    if len(ctx.children) == 1:  # DigitSequence
+        return _lower_digit_sequence(ctx)
+    # TODO 实现类型转换表达式
+    raise NotImplementedError("Cast expression is not supported yet.")
+
+
+def _lower_unary(ctx):
+    """
+    unaryExpression
+        :   postfixExpression
+        |   '++' unaryExpression
+        |   '--' unaryExpression
+        |   unaryOperator castExpression
+        |   'sizeof' unaryExpression
+        |   'sizeof' '(' typeName ')'
+        ;
+    unaryOperator
+        :   '&' | '*' | '+' | '-' | '~' | '!'
+        ;
+    """
+    first = ctx.children[0]
+    if isinstance(first, CParser.UnaryOperatorContext):
+        op, operand = first.children[0].symbol.text, lower_expression(ctx.children[1])
+        if _is_constant(operand):
+            value = fold_unary(op, operand.value)
+            if value is not None:
+                return Constant(value, ctx)
+        return Unary(op, operand, ctx)
+    op = first.symbol.text
+    if op in ('++', '--'):
+        return Prefix(op, lower_expression(ctx.children[1]), ctx)
+    if op == 'sizeof':
+        if len(ctx.children) == 4:  # 'sizeof' '(' typeName ')'
+            return Sizeof(None, ctx.children[2], ctx)
+        return Sizeof(lower_expression(ctx.children[1]), None, ctx)
+    raise NotImplementedError("visitUnaryExpression not finished yet.")
+
+
+def _lower_postfix(ctx):
+    """
+    postfixExpression
+        :   primaryExpression
+        |   postfixExpression '[' expression ']'
+        |   postfixExpression '(' argumentExpressionList? ')'
+        |   postfixExpression '.' Identifier
+        |   postfixExpression '->' Identifier
+        |   postfixExpression '++'
+        |   postfixExpression '--'
+        ;
+    argumentExpressionList
+        :   assignmentExpression
+        |   argumentExpressionList ',' assignmentExpression
+        ;
+    """
+    if not isinstance(ctx.children[0], CParser.PostfixExpressionContext):
+        raise NotImplementedError("visitPostfixExpression not finished yet")
+    base = lower_expression(ctx.children[0])
+    op = ctx.children[1].symbol.text
+    if op == '[':
+        return Index(base, lower_expression(ctx.children[2]), ctx)
+    elif op == '(':
+        args = []
+        if len(ctx.children) == 4:
+            arg_list = ctx.children[2]
+            while len(arg_list.children) == 3:
+                args.append(lower_expression(arg_list.children[2]))
+                arg_list = arg_list.children[0]
+            args.append(lower_expression(arg_list.children[0]))
+            args.reverse()
+        return Call(base, args, ctx)
+    elif op in ('.', '->'):
+        return Member(op, base, ctx.children[2].symbol.text, ctx)
+    else:  # '++' | '--'
+        return Postfix(op, base, ctx)
+
+
+def _lower_primary(ctx):
+    """
+    primaryExpression
+        :   Identifier
+        |   Constant
+        |   StringLiteral+
+        |   '(' expression ')'
+        ;
+    """
+    token = ctx.children[0].symbol
+    if token.type == CParser.Identifier:
+        return Identifier(token.text, ctx)
+    elif token.type == CParser.StringLiteral:  # 相邻的字符串字面量拼接成一个
+        return String(''.join(parse_escape(child.symbol.text[1:-1]) for child in ctx.children), ctx)
+    elif token.type == CParser.Constant:
+        text = token.text
+        # TODO 需要根据text的特点，确定其为浮点数、整数还是字符(目前的策略比较简单)
+        if '.' in text:  # 浮点数
+            value = TinyCTypes.get_const_from_str(TinyCTypes.double, text, ctx=ctx)
+        elif text.startswith("'"):  # 字符
+            value = TinyCTypes.get_const_from_str(TinyCTypes.char, text, ctx=ctx)
+        else:  # 整数
+            value = TinyCTypes.get_const_from_str(TinyCTypes.int, text, ctx=ctx)
+        return Constant(value, ctx)
+    raise NotImplementedError("visitPrimaryExpression not finished yet")
+
+
+def _lower_digit_sequence(ctx):
+    """DigitSequence，按整数常量处理"""
+    return Constant(TinyCTypes.get_const_from_str(TinyCTypes.int, ctx.children[0].symbol.text, ctx=ctx), ctx)
+
+
+# 语法规则到降低函数的映射表，二元运算规则由_lower_binary统一处理
+_lowerers = {
+    CParser.RULE_expression: _lower_list,
+    CParser.RULE_forExpression: _lower_list,
+    CParser.RULE_assignmentExpression: _lower_assignment,
+    CParser.RULE_conditionalExpression: _lower_conditional,
+    CParser.RULE_castExpression: _lower_cast,
+    CParser.RULE_unaryExpression: _lower_unary,
+    CParser.RULE_postfixExpression: _lower_postfix,
+    CParser.RULE_primaryExpression: _lower_primary,
+}
@@ -0,0 +1,168 @@
+"""
+常量折叠。降低表达式时，操作数都是常量的运算直接在编译时求值成ir.Constant，不再生成运行时的指令。
+折叠的规则和generator.py生成的指令保持一致：二元算术和比较先把右边转成左边的类型，
+整数按位宽回绕，比较和逻辑运算的结果是bool，'!'的结果是int。无法在编译时确定的情况（除以0、移位越界、
+指针、浮点数取余等）不折叠，留给代码生成按原来的方式处理或报错。
+"""
+import math
+import llvmlite.ir as ir
+from generator.types import TinyCTypes
+
+
+def _wrap(value, int_type):
+    """把Python整数按int_type的位宽回绕成有符号数"""
+    if int_type is TinyCTypes.bool:
+        return 1 if value & 1 else 0
+    mask = (1 << int_type.width) - 1
+    value &= mask
+    if value >> (int_type.width - 1):
+        value -= mask + 1
+    return value
+
+
+def _value(constant):
+    """ir.Constant对应的Python值，整数统一为有符号数"""
+    if TinyCTypes.is_int(constant.type) or constant.type is TinyCTypes.bool:
+        return _wrap(int(constant.constant), constant.type)
+    return float(constant.constant)
+
+
+def is_foldable(constant):
+    """是否是可以参与折叠的整数、bool或浮点数常量"""
+    return isinstance(constant, ir.Constant) and isinstance(constant.constant, (int, float)) and \
+        (TinyCTypes.is_int(constant.type) or TinyCTypes.is_float(constant.type) or constant.type is TinyCTypes.bool)
+
+
+def cast_constant(constant, target_type):
+    """
+    常量的类型转换，与TinyCTypes.cast_type一致，另外整数0可以转成空指针
+    :param constant: 可以折叠的常量
+    :param target_type: 目标类型
+    :return: 转换后的常量，不能转换时返回None
+    """
+    if constant.type == target_type:
+        return constant
+    value = _value(constant)
+    if TinyCTypes.is_int(target_type):
+        if isinstance(value, float):
+            if math.isinf(value) or math.isnan(value):
+                return None
+            value = int(value)  # fptosi向0取整
+        return target_type(_wrap(value, target_type))
+    elif TinyCTypes.is_float(target_type):
+        return target_type(float(value))
+    elif target_type is TinyCTypes.bool:
+        return target_type(1 if value != 0 else 0)
+    elif isinstance(target_type, ir.PointerType) and not isinstance(value, float) and value == 0:
+        return ir.Constant(target_type, None)  # 整数0是空指针常量
+    return None
+
+
+def _truth(constant):
+    """常量转成bool后的值"""
+    return _value(constant) != 0
+
+
+def _divide(lhs, rhs):
+    """有符号整数除法，商向0取整，余数的符号与被除数相同"""
+    quotient = abs(lhs) // abs(rhs)
+    if (lhs < 0) != (rhs < 0):
+        quotient = -quotient
+    return quotient, lhs - quotient * rhs
+
+
+def fold_binary(op, lhs, rhs):
+    """
+    折叠二元运算
+    :param op: 运算符
+    :param lhs: 左边的常量
+    :param rhs: 右边的常量
+    :return: 结果常量，不能折叠时返回None
+    """
+    if op in ('&&', '||'):
+        return TinyCTypes.bool(int(_truth(lhs) and _truth(rhs) if op == '&&' else _truth(lhs) or _truth(rhs)))
+
+    target_type = lhs.type
+    if op in ('<<', '>>', '&', '|', '^'):
+        # 位运算不做类型转换，两边的类型必须相同
+        if rhs.type != target_type or not TinyCTypes.is_int(target_type):
+            return None
+        a, b = _value(lhs), _value(rhs)
+        if op == '&':
+            return target_type(_wrap(a & b, target_type))
+        elif op == '|':
+            return target_type(_wrap(a | b, target_type))
+        elif op == '^':
+            return target_type(_wrap(a ^ b, target_type))
+        if not 0 <= b < target_type.width:
+            return None
+        return target_type(_wrap(a << b if op == '<<' else a >> b, target_type))
+
+    rhs = cast_constant(rhs, target_type)
+    if rhs is None:
+        return None
+    a, b = _value(lhs), _value(rhs)
+    if op in ('<', '>', '<=', '>=', '==', '!='):
+        if not (TinyCTypes.is_int(target_type) or TinyCTypes.is_float(target_type)):
+            return None
+        result = {'<': a < b, '>': a > b, '<=': a <= b, '>=': a >= b, '==': a == b, '!=': a != b}[op]
+        return TinyCTypes.bool(int(result))
+    if TinyCTypes.is_int(target_type):
+        if op == '+':
+            result = a + b
+        elif op == '-':
+            result = a - b
+        elif op == '*':
+            result = a * b
+        elif b == 0:  # 除以0留到运行时
+            return None
+        else:
+            quotient, remainder = _divide(a, b)
+            result = quotient if op == '/' else remainder
+        return target_type(_wrap(result, target_type))
+    elif TinyCTypes.is_float(target_type):
+        if op == '+':
+            return target_type(a + b)
+        elif op == '-':
+            return target_type(a - b)
+        elif op == '*':
+            return target_type(a * b)
+        elif op == '/' and b != 0:
+            return target_type(a / b)
+    return None
+
+
+def fold_unary(op, operand):
+    """
+    折叠一元运算'+', '-', '~', '!'
+    :return: 结果常量，不能折叠时返回None
+    """
+    value = _value(operand)
+    if op == '+':
+        return operand
+    elif op == '-':
+        if isinstance(value, float):
+            return operand.type(-value)
+        return operand.type(_wrap(-value, operand.type))
+    elif op == '~':
+        if not TinyCTypes.is_int(operand.type):
+            return None
+        return operand.type(_wrap(~value, operand.type))
+    elif op == '!':
+        # 与代码生成一致：先转成int，再和0比较，结果扩展成int
+        converted = cast_constant(operand, TinyCTypes.int)
+        if converted is None:
+            return None
+        return TinyCTypes.int(int(_value(converted) == 0))
+    return None
+
+
+def fold_conditional(cond, then, otherwise):
+    """
+    折叠条件表达式，结果的类型与代码生成一致，为then的类型
+    :return: 结果常量，不能折叠时返回None
+    """
+    otherwise = cast_constant(otherwise, then.type)
+    if otherwise is None:
+        return None
+    return then if _truth(cond) else otherwise
@@ -2,32 +2,67 @@ from parser_.CVisitor import CVisitor
 from parser_.CLexer import CLexer
 from parser_.CParser import CParser
 from antlr4 import *
+from antlr4.atn.PredictionMode import PredictionMode
+from antlr4.error.ErrorStrategy import BailErrorStrategy, DefaultErrorStrategy
+from antlr4.error.Errors import ParseCancellationException
+import os
 import llvmlite.ir as ir
 from generator.types import TinyCTypes
 from generator.util import *
 from generator.errors import *
 from generator.symbol_table import SymbolTable, RedefinitionError
+from generator.expression import Kind, lower_expression
+from generator.folding import is_foldable, cast_constant, fold_binary, fold_unary, fold_conditional
+from generator.stats import Statistics
+from executor.executor import Executor, optimize_ir, to_bitcode, emit_object, emit_assembly, link_executable, \
+    target_data
 
 
 class TinyCGenerator(CVisitor):
     def __init__(self, error_listener=TinyCErrorListener()):
-        self.module = ir.Module()
+        self.global_context = ir.Context()  # 每次生成使用独立的类型上下文，同一进程内可以多次编译
+        self.module = ir.Module(context=self.global_context)
         self.builder = ir.IRBuilder()
+        self.alloca_builder = ir.IRBuilder()  # 在当前函数入口块中分配栈空间的builder
         self.symbol_table = SymbolTable()  # 符号表
         self.continue_block = None  # 当调用continue时应该跳转到的语句块
         self.break_block = None  # 当调用break时应该跳转到的语句块
-        self.switch_context = None  # TODO
+        self.switch_context = None  # 当前switch语句的上下文，见visitSelectionStatement
         self.current_base_type = None  #当前上下文的基础数据类型
         self.is_global = True  #当前是否处于全局环境中
         self.error_listener = error_listener  #错误监听器
-        self.global_context = ir.global_context
         self.struct_reflection = {}
+        self.string_constants = {}  # 字符串内容 -> 指向模块中字符串常量首字符的指针
         self.is_defining_struct = ''
 
     BASE_TYPE=0
     ARRAY_TYPE=1
     FUNCTION_TYPE=2
 
+    # 基本类型关键字的token类型到LLVM类型的映射表
+    token2type = {
+        CLexer.Void: TinyCTypes.void,
+        CLexer.Char: TinyCTypes.char,
+        CLexer.Short: TinyCTypes.short,
+        CLexer.Int: TinyCTypes.int,
+        CLexer.Long: TinyCTypes.int,
+        CLexer.Float: TinyCTypes.float,
+        CLexer.Double: TinyCTypes.double,
+    }
+
+    def _constant_int(self, ctx):
+        """
+        在编译时求出整数常量表达式的值，如case标签、数组的维数和枚举常量的值
+        :param ctx: 表达式的语法树节点
+        :return: 整数，不是整数常量时返回None
+        """
+        value = self._constant_value(lower_expression(ctx))
+        if value is not None and value.type is TinyCTypes.bool:  # 比较和逻辑运算的结果转成int
+            value = cast_constant(value, TinyCTypes.int)
+        if value is None or not TinyCTypes.is_int(value.type):
+            return None
+        return value.constant
+
     def visitDeclarationSpecifiers(self, ctx:CParser.DeclarationSpecifiersContext):
         """
         declarationSpecifiers
@@ -57,9 +92,8 @@ class TinyCGenerator(CVisitor):
                 old_type, name, old_llvm_type, args = init_declarator_list
                 if old_type == self.FUNCTION_TYPE:  #说明是函数声明
                     func_name, function_type = name, old_llvm_type
-                    llvm_function = ir.Function(self.module, function_type, name=func_name)
                     if func_name not in self.symbol_table:  # 允许函数重复声明
-                        self.symbol_table[func_name] = llvm_function
+                        self.symbol_table[func_name] = ir.Function(self.module, function_type, name=func_name)
 
     def visitFunctionDefinition(self, ctx:CParser.FunctionDefinitionContext):
         """
@@ -71,14 +105,19 @@ class TinyCGenerator(CVisitor):
         ret_type = self.visit(ctx.declarationSpecifiers())  #函数返回值的类型
         self.current_base_type = ret_type
         _, func_name, function_type, arg_names = self.visit(ctx.declarator())  # 获得函数名、函数类型、参数名列表
-        if func_name in self.symbol_table:
-            llvm_function = self.symbol_table[func_name]
+        llvm_function = self.symbol_table.get(func_name)
+        if llvm_function is not None:
             if llvm_function.function_type != function_type:
                 raise SemanticError("Function {}'s definition different from its declaration".format(func_name), ctx)
         else:
             llvm_function = ir.Function(self.module, function_type, name=func_name)
             self.symbol_table[func_name] = llvm_function
-        self.builder = ir.IRBuilder(llvm_function.append_basic_block(name="entry"))
+        # 入口块只放alloca，由alloca_builder在跳转到函数体之前插入，函数体从body块开始
+        entry_block = llvm_function.append_basic_block(name="entry")
+        body_block = llvm_function.append_basic_block(name="body")
+        self.alloca_builder = ir.IRBuilder(entry_block)
+        self.alloca_builder.position_before(self.alloca_builder.branch(body_block))
+        self.builder = ir.IRBuilder(body_block)
 
         self.symbol_table.enter_scope()
         try:
@@ -92,8 +131,11 @@ class TinyCGenerator(CVisitor):
 
         self.visit(ctx.compoundStatement())
 
-        if function_type.return_type == TinyCTypes.void:
-            self.builder.ret_void()
+        if not self.builder.block.is_terminated:
+            if function_type.return_type == TinyCTypes.void:
+                self.builder.ret_void()
+            else:  # 执行到函数末尾时返回0，和main函数的约定一致
+                self.builder.ret(ir.Constant(function_type.return_type, None))
         self.symbol_table.exit_scope()
         self.is_global = True
 
@@ -131,15 +173,20 @@ class TinyCGenerator(CVisitor):
             if base_type == TinyCTypes.void:
                 base_type = TinyCTypes.int
             return ir.PointerType(base_type)
-        elif match_texts(ctx, TinyCTypes.str2type.keys()):
+        elif match_tokens(ctx.children[0], self.token2type):
             # void | char | short | int | long | float | double |
-            return TinyCTypes.str2type[ctx.getText()]
-        elif match_text(ctx, "unsigned"):  # 自动忽视unsigned
+            return self.token2type[ctx.children[0].symbol.type]
+        elif match_token(ctx.children[0], CLexer.Unsigned):  # 自动忽视unsigned
             return None
         elif match_rule(ctx.children[0], CParser.RULE_typedefName):  # typedefName
-            return self.visit(ctx.typedefName())
+            type_name = self.visit(ctx.typedefName())
+            if type_name in TinyCTypes.str2type:  # bool等不是C关键字的类型名
+                return TinyCTypes.str2type[type_name]
+            return type_name
         elif match_rule(ctx.children[0], CParser.RULE_structOrUnionSpecifier):
             return self.visit(ctx.structOrUnionSpecifier())
+        elif match_rule(ctx.children[0], CParser.RULE_enumSpecifier):
+            return self.visit(ctx.enumSpecifier())
         else:
             raise NotImplementedError("visitTypeSpecifier")
 
@@ -255,6 +302,64 @@ class TinyCGenerator(CVisitor):
             else:
                 raise NotImplementedError("Union is not supported yet.")
 
+    def visitEnumSpecifier(self, ctx:CParser.EnumSpecifierContext):
+        """
+        enumSpecifier
+            :   'enum' Identifier? '{' enumeratorList '}'
+            |   'enum' Identifier? '{' enumeratorList ',' '}'
+            |   'enum' Identifier
+            ;
+        枚举类型按int处理，枚举常量作为int常量加入当前作用域的符号表
+        :param ctx:
+        :return: LLVM类型
+        """
+        enumerator_list = ctx.enumeratorList()
+        if enumerator_list is None:
+            return TinyCTypes.int
+        enumerators = []
+        while enumerator_list.enumeratorList() is not None:  # 左递归的列表，从后往前展开
+            enumerators.append(enumerator_list.enumerator())
+            enumerator_list = enumerator_list.enumeratorList()
+        enumerators.append(enumerator_list.enumerator())
+        value = 0
+        for enumerator in reversed(enumerators):
+            name = enumerator.enumerationConstant().Identifier().getText()
+            if enumerator.constantExpression() is not None:
+                value = self._constant_int(enumerator.constantExpression())
+                if value is None:
+                    raise SemanticError(ctx=enumerator, msg="Enumerator value for {} is not an integer constant".format(name))
+            try:
+                self.symbol_table[name] = TinyCTypes.int(value)
+            except RedefinitionError:
+                raise SemanticError(ctx=enumerator, msg="Redefinition of enumerator {}".format(name))
+            value += 1
+        return TinyCTypes.int
+
+    def visitTypeName(self, ctx:CParser.TypeNameContext):
+        """
+        typeName
+            :   specifierQualifierList abstractDeclarator?
+            ;
+        目前只支持类型说明符后面跟若干个'*'，如int、struct Node *
+        :param ctx:
+        :return: LLVM类型
+        """
+        specifiers = ctx.specifierQualifierList()
+        if len(specifiers.children) != 1:
+            raise NotImplementedError("Type name with qualifiers is not supported yet.")
+        llvm_type = self.visit(specifiers.typeSpecifier())
+        if isinstance(llvm_type, str):
+            raise SemanticError(ctx=ctx, msg="Unknown type name {}".format(llvm_type))
+        abstract_declarator = ctx.abstractDeclarator()
+        if abstract_declarator is not None:
+            if abstract_declarator.directAbstractDeclarator() is not None:
+                raise NotImplementedError("Abstract declarator is not supported yet.")
+            pointer = abstract_declarator.pointer()
+            while pointer is not None:
+                llvm_type = ir.PointerType(llvm_type)
+                pointer = pointer.pointer()
+        return llvm_type
+
     def visitParameterList(self, ctx:CParser.ParameterListContext):
         """
         parameterList
@@ -333,23 +438,23 @@ class TinyCGenerator(CVisitor):
                     如果变量是普通类型BASE_TYPE,会返回一个空列表
         """
         if len(ctx.children) == 1:  # Identifier
-            return self.BASE_TYPE, ctx.getText(), self.current_base_type, []
+            return self.BASE_TYPE, ctx.children[0].symbol.text, self.current_base_type, []
         elif match_rule(ctx.children[0], CParser.RULE_directDeclarator):
             old_type, name, old_llvm_type, size_list = self.visit(ctx.directDeclarator())
-            if ctx.children[1].getText() == '[':
-                if match_text(ctx.children[2], ']'):  # directDeclarator '[' ']'
+            if match_token(ctx.children[1], CLexer.LeftBracket):
+                if match_token(ctx.children[2], CLexer.RightBracket):  # directDeclarator '[' ']'
                     new_llvm_type = ir.PointerType(old_llvm_type)
                     return old_type, name, new_llvm_type, size_list
                 else:  # directDeclarator '[' assignmentExpression ']'
-                    try:
-                        array_size = int(ctx.children[2].getText())
-                    except:
-                        raise SemanticError("Doesn't support array dimension {}".format(ctx.children[2].getText()), ctx)
+                    array_size = self._constant_int(ctx.children[2])
+                    if array_size is None:
+                        raise SemanticError("Array dimension {} is not an integer constant".format(
+                            ctx.children[2].getText()), ctx)
                     if array_size <= 0:
                         raise SemanticError("Array dimension must be possitive!", ctx)
                     size_list.append(array_size)
                     return self.ARRAY_TYPE, name, old_llvm_type, size_list
-            elif ctx.children[1].getText() == '(':
+            elif match_token(ctx.children[1], CLexer.LeftParen):
                 if match_rule(ctx.children[2], CParser.RULE_parameterTypeList):
                     # directDeclarator '(' parameterTypeList ')'
                     (arg_names, arg_types), var_arg = self.visit(ctx.parameterTypeList())  # 获得函数参数的名字列表和类型列表
@@ -367,348 +472,575 @@ class TinyCGenerator(CVisitor):
         else:
             raise NotImplementedError("visitDirectDeclarator")
 
-    def visitAssignmentExpression(self, ctx:CParser.AssignmentExpressionContext):
+    def visitExpression(self, ctx:CParser.ExpressionContext):
         """
-        assignmentExpression
-            :   conditionalExpression
-            |   unaryExpression assignmentOperator assignmentExpression
+        所有表达式规则的入口，包括expression, forExpression, constantExpression, assignmentExpression,
+        conditionalExpression, 各级二元运算表达式, castExpression, unaryExpression, postfixExpression
+        和primaryExpression。先将表达式语法树降低成AST（见generator/expression.py），再根据AST生成代码
         :param ctx:
         :return: 表达式的值，变量本身
         """
-        if match_rule(ctx.children[0], CParser.RULE_conditionalExpression):
-            lhs, lhs_ptr = self.visit(ctx.conditionalExpression())
-            return lhs, lhs_ptr
-        elif match_rule(ctx.children[0], CParser.RULE_unaryExpression):
-            lhs, lhs_ptr = self.visit(ctx.unaryExpression())
-            op = self.visit(ctx.assignmentOperator())
-            rhs, _ = self.visit(ctx.assignmentExpression())
-            if op == '=':
-                converted_rhs = TinyCTypes.cast_type(self.builder, value=rhs, target_type=lhs_ptr.type.pointee, ctx=ctx)
-                self.builder.store(converted_rhs, lhs_ptr)
-                return converted_rhs, None
-            else:
-                target_type = lhs_ptr.type.pointee
-                converted_rhs = TinyCTypes.cast_type(self.builder, value=rhs, target_type=target_type, ctx=ctx)
-                if op == '+=':
-                    if TinyCTypes.is_int(target_type):
-                        new_value = self.builder.add(lhs, converted_rhs)
-                    elif TinyCTypes.is_float(target_type):
-                        new_value = self.builder.fadd(lhs, converted_rhs)
-                elif op == '-=':
-                    if TinyCTypes.is_int(target_type):
-                        new_value = self.builder.sub(lhs, converted_rhs)
-                    elif TinyCTypes.is_float(target_type):
-                        new_value = self.builder.fsub(lhs, converted_rhs)
-                elif op == '*=':
-                    if TinyCTypes.is_int(target_type):
-                        new_value = self.builder.mul(lhs, converted_rhs)
-                    elif TinyCTypes.is_float(target_type):
-                        new_value = self.builder.fmul(lhs, converted_rhs)
-                elif op == '/=':
-                    if TinyCTypes.is_int(target_type):
-                        new_value = self.builder.sdiv(lhs, converted_rhs)
-                    elif TinyCTypes.is_float(target_type):
-                        new_value = self.builder.fdiv(lhs, converted_rhs)
-                elif op == '%=':
-                    if TinyCTypes.is_int(target_type):
-                        new_value = self.builder.srem(lhs, converted_rhs)
-                    elif TinyCTypes.is_float(target_type):
-                        raise SemanticError(ctx=ctx, msg="Float doesn't support % operation")
-                elif op == '<<=':
-                    if TinyCTypes.is_int(target_type):
-                        new_value = self.builder.shl(lhs, converted_rhs)
-                    elif TinyCTypes.is_float(target_type):
-                        raise SemanticError(ctx=ctx, msg="Float doesn't support % operation")
-                elif op == '<<=':
-                    if TinyCTypes.is_int(target_type):
-                        new_value = self.builder.shl(lhs, converted_rhs)
-                    elif TinyCTypes.is_float(target_type):
-                        raise SemanticError(ctx=ctx, msg="Float doesn't support % operation")
-                elif op == '>>=':
-                    if TinyCTypes.is_int(target_type):
-                        new_value = self.builder.ashr(lhs, converted_rhs)
-                    elif TinyCTypes.is_float(target_type):
-                        raise SemanticError(ctx=ctx, msg="Float doesn't support % operation")
-                elif op == '|=':
-                    if TinyCTypes.is_int(target_type):
-                        new_value = self.builder.or_(lhs, converted_rhs)
-                    elif TinyCTypes.is_float(target_type):
-                        raise SemanticError(ctx=ctx, msg="Float doesn't support % operation")
-                elif op == '&=':
-                    if TinyCTypes.is_int(target_type):
-                        new_value = self.builder.and_(lhs, converted_rhs)
-                    elif TinyCTypes.is_float(target_type):
-                        raise SemanticError(ctx=ctx, msg="Float doesn't support % operation")
-                elif op == '^=':
-                    if TinyCTypes.is_int(target_type):
-                        new_value = self.builder.xor(lhs, converted_rhs)
-                    elif TinyCTypes.is_float(target_type):
-                        raise SemanticError(ctx=ctx, msg="Float doesn't support % operation")
-                self.builder.store(new_value, lhs_ptr)
-                return new_value, None
-
-    def visitAssignmentOperator(self, ctx:CParser.AssignmentOperatorContext):
+        return self.visitExpressionNode(lower_expression(ctx))
+
+    visitForExpression = visitConstantExpression = visitAssignmentExpression = visitConditionalExpression = \
+        visitLogicalOrExpression = visitLogicalAndExpression = visitInclusiveOrExpression = \
+        visitExclusiveOrExpression = visitAndExpression = visitEqualityExpression = visitRelationalExpression = \
+        visitShiftExpression = visitAdditiveExpression = visitMultiplicativeExpression = visitCastExpression = \
+        visitUnaryExpression = visitPostfixExpression = visitPrimaryExpression = visitExpression
+
+    def visitExpressionNode(self, node):
+        """
+        生成表达式AST的代码
+        :param node: AST节点
+        :return: 表达式的值，变量本身
+        """
+        if node.kind is Kind.BINARY:
+            return self._binary_visitors[node.op](self, node)
+        return self._node_visitors[node.kind](self, node)
+
+    def _visitAssign(self, node):
         """
+        unaryExpression assignmentOperator assignmentExpression
         assignmentOperator
             :   '=' | '*=' | '/=' | '%=' | '+=' | '-=' | '<<=' | '>>=' | '&=' | '^=' | '|='
             ;
-        :param ctx:
-        :return:
+        :param node:
+        :return: 表达式的值，变量本身
         """
-        return ctx.getText()
+        ctx = node.ctx
+        lhs, lhs_ptr = self.visitExpressionNode(node.target)
+        op = node.op
+        rhs, _ = self.visitExpressionNode(node.value)
+        if op == '=':
+            converted_rhs = TinyCTypes.cast_type(self.builder, value=rhs, target_type=lhs_ptr.type.pointee, ctx=ctx,
+                                                 alloca_builder=self.alloca_builder)
+            self.builder.store(converted_rhs, lhs_ptr)
+            return converted_rhs, None
+        else:
+            target_type = lhs_ptr.type.pointee
+            converted_rhs = TinyCTypes.cast_type(self.builder, value=rhs, target_type=target_type, ctx=ctx)
+            if op == '+=':
+                if TinyCTypes.is_int(target_type):
+                    new_value = self.builder.add(lhs, converted_rhs)
+                elif TinyCTypes.is_float(target_type):
+                    new_value = self.builder.fadd(lhs, converted_rhs)
+            elif op == '-=':
+                if TinyCTypes.is_int(target_type):
+                    new_value = self.builder.sub(lhs, converted_rhs)
+                elif TinyCTypes.is_float(target_type):
+                    new_value = self.builder.fsub(lhs, converted_rhs)
+            elif op == '*=':
+                if TinyCTypes.is_int(target_type):
+                    new_value = self.builder.mul(lhs, converted_rhs)
+                elif TinyCTypes.is_float(target_type):
+                    new_value = self.builder.fmul(lhs, converted_rhs)
+            elif op == '/=':
+                if TinyCTypes.is_int(target_type):
+                    new_value = self.builder.sdiv(lhs, converted_rhs)
+                elif TinyCTypes.is_float(target_type):
+                    new_value = self.builder.fdiv(lhs, converted_rhs)
+            elif op == '%=':
+                if TinyCTypes.is_int(target_type):
+                    new_value = self.builder.srem(lhs, converted_rhs)
+                elif TinyCTypes.is_float(target_type):
+                    raise SemanticError(ctx=ctx, msg="Float doesn't support % operation")
+            elif op == '<<=':
+                if TinyCTypes.is_int(target_type):
+                    new_value = self.builder.shl(lhs, converted_rhs)
+                elif TinyCTypes.is_float(target_type):
+                    raise SemanticError(ctx=ctx, msg="Float doesn't support % operation")
+            elif op == '>>=':
+                if TinyCTypes.is_int(target_type):
+                    new_value = self.builder.ashr(lhs, converted_rhs)
+                elif TinyCTypes.is_float(target_type):
+                    raise SemanticError(ctx=ctx, msg="Float doesn't support % operation")
+            elif op == '|=':
+                if TinyCTypes.is_int(target_type):
+                    new_value = self.builder.or_(lhs, converted_rhs)
+                elif TinyCTypes.is_float(target_type):
+                    raise SemanticError(ctx=ctx, msg="Float doesn't support % operation")
+            elif op == '&=':
+                if TinyCTypes.is_int(target_type):
+                    new_value = self.builder.and_(lhs, converted_rhs)
+                elif TinyCTypes.is_float(target_type):
+                    raise SemanticError(ctx=ctx, msg="Float doesn't support % operation")
+            elif op == '^=':
+                if TinyCTypes.is_int(target_type):
+                    new_value = self.builder.xor(lhs, converted_rhs)
+                elif TinyCTypes.is_float(target_type):
+                    raise SemanticError(ctx=ctx, msg="Float doesn't support % operation")
+            self.builder.store(new_value, lhs_ptr)
+            return new_value, None
 
-    def visitConditionalExpression(self, ctx:CParser.ConditionalExpressionContext):
+    def _visitConditional(self, node):
         """
-        conditionalExpression
-            :   logicalOrExpression ('?' expression ':' conditionalExpression)?
-        :param ctx:
+        logicalOrExpression '?' expression ':' conditionalExpression，只计算被选中的分支，结果用phi节点合并
+        :param node:
         :return:表达式的值，变量本身
         """
-        if ctx.expression() is None:
-            return self.visit(ctx.logicalOrExpression())
-        cond_val, _ = self.visit(ctx.logicalOrExpression())
-        converted_cond_val = TinyCTypes.cast_type(self.builder, target_type=TinyCTypes.bool, value=cond_val, ctx=ctx)
-        # TODO type cast
-        true_val, _ = self.visit(ctx.expression())
-        false_val, _ = self.visit(ctx.conditionalExpression())
-        ret_pointer = self.builder.alloca(true_val.type)
+        cond_val, _ = self.visitExpressionNode(node.cond)
+        converted_cond_val = TinyCTypes.cast_type(self.builder, target_type=TinyCTypes.bool, value=cond_val, ctx=node.ctx)
         with self.builder.if_else(converted_cond_val) as (then, otherwise):
             with then:
-                self.builder.store(true_val, ret_pointer)
+                true_val, _ = self.visitExpressionNode(node.then)
+                true_block = self.builder.block
             with otherwise:
-                self.builder.store(false_val, ret_pointer)
-        ret_val = self.builder.load(ret_pointer)
+                false_val, _ = self.visitExpressionNode(node.otherwise)
+                false_val = TinyCTypes.cast_type(self.builder, value=false_val, target_type=true_val.type, ctx=node.ctx)
+                false_block = self.builder.block
+        ret_val = self.builder.phi(true_val.type)
+        ret_val.add_incoming(true_val, true_block)
+        ret_val.add_incoming(false_val, false_block)
         return ret_val, None
 
-    def visitLogicalOrExpression(self, ctx:CParser.LogicalOrExpressionContext):
+    def _visitShortCircuit(self, node, short_value):
         """
-        logicalOrExpression
-            :   logicalAndExpression
-            |   logicalOrExpression '||' logicalAndExpression
-            ;
-        :param ctx:
+        &&和||的短路求值：左边转成bool后等于short_value时不计算右边，结果用phi节点合并
+        :param node:
+        :param short_value: 短路时表达式的值，&&为0，||为1
         :return:表达式的值，变量本身
         """
-        if len(ctx.children) == 1:  # logicalAndExpression
-            rhs, rhs_ptr = self.visit(ctx.logicalAndExpression())
-            return rhs, rhs_ptr
-        else:  # logicalOrExpression '||' logicalAndExpression
-            lhs, _ = self.visit(ctx.logicalOrExpression())
-            converted_lhs = TinyCTypes.cast_type(self.builder, value=lhs, target_type=TinyCTypes.bool, ctx=ctx)
-            result = self.builder.alloca(TinyCTypes.bool)
-            with self.builder.if_else(converted_lhs) as (then, otherwise):
-                with then:
-                    self.builder.store(TinyCTypes.bool(1), result)
-                with otherwise:
-                    rhs, rhs_ptr = self.visit(ctx.logicalAndExpression())
-                    converted_rhs = TinyCTypes.cast_type(self.builder, value=rhs, target_type=TinyCTypes.bool, ctx=ctx)
-                    self.builder.store(converted_rhs, result)
-            return self.builder.load(result), None
-
-    def visitUnaryExpression(self, ctx:CParser.UnaryExpressionContext):
-        """
-        unaryExpression
-            :   postfixExpression
-            |   '++' unaryExpression
-            |   '--' unaryExpression
-            |   unaryOperator castExpression
-            |   'sizeof' unaryExpression
-            |   'sizeof' '(' typeName ')'
-            ;
-        :param ctx:
-        :return: 表达式的值，变量本身
+        lhs, _ = self.visitExpressionNode(node.lhs)
+        converted_lhs = TinyCTypes.cast_type(self.builder, value=lhs, target_type=TinyCTypes.bool, ctx=node.ctx)
+        lhs_block = self.builder.block
+        rhs_block = self.builder.append_basic_block(name='logic.rhs')
+        end_block = self.builder.append_basic_block(name='logic.end')
+        if short_value:
+            self.builder.cbranch(converted_lhs, end_block, rhs_block)
+        else:
+            self.builder.cbranch(converted_lhs, rhs_block, end_block)
+        self.builder.position_at_end(rhs_block)
+        rhs, _ = self.visitExpressionNode(node.rhs)
+        converted_rhs = TinyCTypes.cast_type(self.builder, value=rhs, target_type=TinyCTypes.bool, ctx=node.ctx)
+        rhs_block = self.builder.block  # 右边可能含有短路求值，结束时已不在原来的块中
+        self.builder.branch(end_block)
+        self.builder.position_at_end(end_block)
+        result = self.builder.phi(TinyCTypes.bool)
+        result.add_incoming(TinyCTypes.bool(short_value), lhs_block)
+        result.add_incoming(converted_rhs, rhs_block)
+        return result, None
+
+    def _visitLogicalOr(self, node):
+        """
+        logicalOrExpression '||' logicalAndExpression，实现短路原则
+        :param node:
+        :return:表达式的值，变量本身
+        """
+        return self._visitShortCircuit(node, 1)
+
+    def _visitLogicalAnd(self, node):
+        """
+        logicalAndExpression '&&' inclusiveOrExpression，实现短路原则
+        :param node:
+        :return:表达式的值，变量本身
+        """
+        return self._visitShortCircuit(node, 0)
+
+    def _visitInclusiveOr(self, node):
+        """inclusiveOrExpression '|' exclusiveOrExpression"""
+        rhs, rhs_ptr = self.visitExpressionNode(node.rhs)
+        lhs, _ = self.visitExpressionNode(node.lhs)
+        return self.builder.or_(lhs, rhs), None
+
+    def _visitExclusiveOr(self, node):
+        """exclusiveOrExpression '^' andExpression"""
+        rhs, rhs_ptr = self.visitExpressionNode(node.rhs)
+        lhs, _ = self.visitExpressionNode(node.lhs)
+        return self.builder.xor(lhs, rhs), None
+
+    def _visitAnd(self, node):
+        """andExpression '&' equalityExpression"""
+        rhs, rhs_ptr = self.visitExpressionNode(node.rhs)
+        lhs, _ = self.visitExpressionNode(node.lhs)
+        return self.builder.and_(lhs, rhs), None
+
+    def _visitRelatioinAndEqualityExpression(self, node):
+        """
+        relationalExpression ('<'|'>'|'<='|'>=') shiftExpression
+        equalityExpression ('=='|'!=') relationalExpression
+        两者的处理过程非常相像，因此合并成一个函数
+        :param node:
+        :return:
         """
-        if match_rule(ctx.children[0], CParser.RULE_postfixExpression):  # postfixExpression
-            return self.visit(ctx.postfixExpression())
-        elif match_texts(ctx.children[0], ['++', '--']):  # '++' unaryExpression | '--' unaryExpression
-            rhs, rhs_ptr = self.visit(ctx.unaryExpression())
-            one = TinyCTypes.int(1)
-            if match_text(ctx.children[0], '++'):
-                res = self.builder.add(rhs, one)
+        rhs, rhs_ptr = self.visitExpressionNode(node.rhs)
+        lhs, _ = self.visitExpressionNode(node.lhs)
+        op = node.op
+        converted_target = lhs.type
+        if type(lhs.type) == ir.PointerType and type(rhs.type) == ir.IntType:
+            converted_target = TinyCTypes.int
+            converted_rhs = rhs
+            lhs = TinyCTypes.cast_type(self.builder, value=lhs, target_type=TinyCTypes.int, ctx=node.ctx)
+        else:
+            converted_rhs = TinyCTypes.cast_type(self.builder, value=rhs, target_type=converted_target, ctx=node.ctx)
+        if TinyCTypes.is_int(converted_target):
+            return self.builder.icmp_signed(cmpop=op, lhs=lhs, rhs=converted_rhs), None
+        elif TinyCTypes.is_float(converted_target):
+            return self.builder.fcmp_ordered(cmpop=op, lhs=lhs, rhs=converted_rhs), None
+        else:
+            raise SemanticError(ctx=node.ctx, msg="Unknown relation expression: " + str(lhs) + str(op) + str(rhs))
+
+    def _visitShift(self, node):
+        """shiftExpression ('<<'|'>>') additiveExpression"""
+        rhs, rhs_ptr = self.visitExpressionNode(node.rhs)
+        lhs, _ = self.visitExpressionNode(node.lhs)
+        if node.op == '<<':
+            return self.builder.shl(lhs, rhs), None
+        else:
+            return self.builder.ashr(lhs, rhs), None
+
+    def _visitAdditive(self, node):
+        """additiveExpression ('+'|'-') multiplicativeExpression"""
+        rhs, rhs_ptr = self.visitExpressionNode(node.rhs)
+        lhs, _ = self.visitExpressionNode(node.lhs)
+        op = node.op
+        convert_target = lhs.type
+        converted_rhs = TinyCTypes.cast_type(self.builder, value=rhs, target_type=convert_target, ctx=node.ctx)
+        if TinyCTypes.is_int(convert_target):
+            if op == '+':
+                return self.builder.add(lhs, converted_rhs), None
             else:
-                res = self.builder.sub(rhs, one)
-            self.builder.store(res, rhs_ptr)
-            return res, rhs_ptr
-        elif match_rule(ctx.children[0], CParser.RULE_unaryOperator):  #unaryOperator castExpression
-            op = self.visit(ctx.unaryOperator())
-            rhs, rhs_ptr = self.visit(ctx.castExpression())
-            if op == '&':
-                return rhs_ptr, None
-            elif op == '*':
-                return self.builder.load(rhs), rhs
-            elif op == '+':
-                return rhs, None
-            elif op == '-':
-                zero = ir.Constant(rhs.type, 0)
-                res = self.builder.sub(zero, rhs)
-                return res, None
-            elif op == '!':
-                origin = TinyCTypes.cast_type(self.builder, TinyCTypes.int, rhs, ctx)
-                zero = TinyCTypes.int(0)
-                res = self.builder.icmp_signed("==", zero, origin)
-                res = self.builder.zext(res, TinyCTypes.int)
-                return res, None
-            elif op == '~':
-                if TinyCTypes.is_int(rhs.type):
-                    res = self.builder.not_(rhs)
-                    return res, None
-                else:
-                    raise SemanticError(ctx=ctx, msg="Wrong type argument to bit-complement.")
+                return self.builder.sub(lhs, converted_rhs), None
+        elif TinyCTypes.is_float(convert_target):
+            if op == '+':
+                return self.builder.fadd(lhs, converted_rhs), None
+            else:
+                return self.builder.fsub(lhs, converted_rhs), None
+        else:
+            raise SemanticError(ctx=node.ctx, msg="Illegal operation: "+str(lhs)+op+str(rhs))
+
+    def _visitMultiplicative(self, node):
+        """multiplicativeExpression ('*'|'/'|'%') castExpression"""
+        rhs, rhs_ptr = self.visitExpressionNode(node.rhs)
+        lhs, lhs_ptr = self.visitExpressionNode(node.lhs)
+        converted_target = lhs.type
+        converted_rhs = TinyCTypes.cast_type(self.builder, value=rhs, target_type=converted_target, ctx=node.ctx)  # 将rhs转成lhs的类型
+        op = node.op
+        if TinyCTypes.is_int(converted_target): # 整数运算
+            if op == '*':
+                return self.builder.mul(lhs, converted_rhs), None
+            elif op == '/':
+                return self.builder.sdiv(lhs, converted_rhs), None
+            else:
+                return self.builder.srem(lhs, converted_rhs), None
+        elif TinyCTypes.is_float(converted_target):  #浮点数运算
+            if op == '*':
+                return self.builder.fmul(lhs, converted_rhs), None
+            elif op == '/':
+                return self.builder.fdiv(lhs, converted_rhs), None
             else:
-                raise SemanticError(ctx=ctx, msg="Should not reach here.")
+                raise SemanticError(ctx=node.ctx, msg="Float doesn't support % operation")
         else:
-            raise NotImplementedError("visitUnaryExpression not finished yet.")
+            raise SemanticError(ctx=node.ctx, msg="Illegal operation: "+str(lhs)+op+str(rhs))
 
-    def visitCastExpression(self, ctx:CParser.CastExpressionContext):
+    def _visitPrefix(self, node):
         """
-        castExpression
-            :   '(' typeName ')' castExpression
-            |   unaryExpression
-            ;
-        :param ctx:
+        '++' unaryExpression | '--' unaryExpression
+        :param node:
         :return: 表达式的值，变量本身
         """
-        # TODO 实现类型转换表达式
-        return self.visit(ctx.unaryExpression())
+        rhs, rhs_ptr = self.visitExpressionNode(node.operand)
+        one = TinyCTypes.int(1)
+        if node.op == '++':
+            res = self.builder.add(rhs, one)
+        else:
+            res = self.builder.sub(rhs, one)
+        self.builder.store(res, rhs_ptr)
+        return res, rhs_ptr
 
-    def visitUnaryOperator(self, ctx:CParser.UnaryOperatorContext):
+    def _visitUnary(self, node):
         """
+        unaryOperator castExpression
         unaryOperator
             :   '&' | '*' | '+' | '-' | '~' | '!'
             ;
-        :param ctx:
-        :return: 一元运算符对应的符号
+        :param node:
+        :return: 表达式的值，变量本身
         """
-        return ctx.getText()
+        op = node.op
+        rhs, rhs_ptr = self.visitExpressionNode(node.operand)
+        if op == '&':
+            return rhs_ptr, None
+        elif op == '*':
+            return self._load(rhs), rhs
+        elif op == '+':
+            return rhs, None
+        elif op == '-':
+            zero = ir.Constant(rhs.type, 0)
+            res = self.builder.sub(zero, rhs)
+            return res, None
+        elif op == '!':
+            origin = TinyCTypes.cast_type(self.builder, TinyCTypes.int, rhs, node.ctx)
+            zero = TinyCTypes.int(0)
+            res = self.builder.icmp_signed("==", zero, origin)
+            res = self.builder.zext(res, TinyCTypes.int)
+            return res, None
+        elif op == '~':
+            if TinyCTypes.is_int(rhs.type):
+                res = self.builder.not_(rhs)
+                return res, None
+            else:
+                raise SemanticError(ctx=node.ctx, msg="Wrong type argument to bit-complement.")
+        else:
+            raise SemanticError(ctx=node.ctx, msg="Should not reach here.")
 
-    def visitPostfixExpression(self, ctx:CParser.PostfixExpressionContext):
+    def _visitIndex(self, node):
         """
-        postfixExpression
-            :   primaryExpression
-            |   postfixExpression '[' expression ']'
-            |   postfixExpression '(' argumentExpressionList? ')'
-            |   postfixExpression '.' Identifier
-            |   postfixExpression '->' Identifier
-            |   postfixExpression '++'
-            |   postfixExpression '--'
-            ;
-        :param ctx:
+        postfixExpression '[' expression ']'
+        数组在求值时已经退化成指向首元素的指针，下标运算统一为指针加偏移，不复制数组
+        :param node:
         :return: 表达式的值，变量本身
         """
-        if match_rule(ctx.children[0], CParser.RULE_primaryExpression):  # primaryExpression
-            return self.visit(ctx.primaryExpression())
-        elif match_rule(ctx.children[0], CParser.RULE_postfixExpression):
-            lhs, lhs_ptr = self.visit(ctx.postfixExpression())
-            op = ctx.children[1].getText()
-            if op == '[':  # postfixExpression '[' expression ']'
-                array_index, _ = self.visit(ctx.expression())
-                array_index = TinyCTypes.cast_type(self.builder, target_type=TinyCTypes.int, value=array_index, ctx=ctx)
-                zero = ir.Constant(TinyCTypes.int, 0)
-                if type(lhs_ptr) is ir.Argument:
-                    array_indices = [array_index]
-                else:
-                    array_indices = [zero, array_index]
-                ptr = self.builder.gep(lhs_ptr, array_indices)
-                return self.builder.load(ptr), ptr
-            elif op == '(':  # postfixExpression '(' argumentExpressionList? ')'
-                if len(ctx.children) == 4:
-                    args = self.visit(ctx.argumentExpressionList())
-                else:
-                    args = []
-                converted_args = [TinyCTypes.cast_type(self.builder, value=arg, target_type=callee_arg.type, ctx=ctx)
-                                  for arg, callee_arg in zip(args, lhs.args)]
-                if len(converted_args) < len(args):  # 考虑变长参数
-                    converted_args += args[len(lhs.args):]
-                return self.builder.call(lhs, converted_args), None
-            elif op in ["++", "--"]:
-                one = lhs.type(1)
-                if op == '++':
-                    res = self.builder.add(lhs, one)
-                else:
-                    res = self.builder.sub(lhs, one)
-                self.builder.store(res, lhs_ptr)
-                return lhs, lhs_ptr
-            elif op == '.':
-                ele_name = ctx.Identifier().getText()
-                target_name = lhs_ptr.type.pointee.name
-                array_index = self.struct_reflection[target_name][ele_name]['index']
-                array_index = ir.Constant(TinyCTypes.int, array_index)
-                zero = ir.Constant(TinyCTypes.int, 0)
-                array_indices = [zero, array_index]
-                ptr = self.builder.gep(lhs_ptr, array_indices)
-                return self.builder.load(ptr), ptr
-            else:
-                # ->
-                ele_name = ctx.Identifier().getText()
-                target_name = lhs.type.pointee.name
-                if type(lhs.type.pointee) != ir.IdentifiedStructType:
-                    raise SemanticError(ctx=ctx, msg="Illegal operation on -> operator.")
-                array_index = self.struct_reflection[target_name][ele_name]['index']
-                array_index = ir.Constant(TinyCTypes.int, array_index)
-                zero = ir.Constant(TinyCTypes.int, 0)
-                array_indices = [zero, array_index]
-                ptr = self.builder.gep(lhs, array_indices)
-                return self.builder.load(ptr), ptr
-        raise NotImplementedError("visitPostfixExpression not finished yet")
+        lhs, _ = self.visitExpressionNode(node.base)
+        if not isinstance(lhs.type, ir.PointerType):
+            raise SemanticError(ctx=node.ctx, msg="Subscripted value is neither array nor pointer.")
+        array_index, _ = self.visitExpressionNode(node.index)
+        array_index = TinyCTypes.cast_type(self.builder, target_type=TinyCTypes.int, value=array_index, ctx=node.ctx)
+        ptr = self.builder.gep(lhs, [array_index])
+        return self._load(ptr), ptr
 
-    def visitPrimaryExpression(self, ctx:CParser.PrimaryExpressionContext):
+    def _visitCall(self, node):
         """
-        primaryExpression
-            :   Identifier
-            |   Constant
-            |   StringLiteral+
-            |   '(' expression ')'
-        :param ctx:
+        postfixExpression '(' argumentExpressionList? ')'
+        :param node:
         :return: 表达式的值，变量本身
         """
-        if len(ctx.children) == 3:
-            return self.visit(ctx.expression())
+        lhs, _ = self.visitExpressionNode(node.callee)
+        args = [self.visitExpressionNode(arg)[0] for arg in node.args]
+        converted_args = [TinyCTypes.cast_type(self.builder, value=arg, target_type=callee_arg.type, ctx=node.ctx,
+                                               alloca_builder=self.alloca_builder)
+                          for arg, callee_arg in zip(args, lhs.args)]
+        if len(converted_args) < len(args):  # 考虑变长参数
+            for arg in args[len(lhs.args):]:
+                # 默认实参提升：比int短的整数先扩展成int，否则printf读到的高位是未定义的
+                if TinyCTypes.is_int(arg.type) and arg.type.width < TinyCTypes.int.width:
+                    arg = self.builder.sext(arg, TinyCTypes.int)
+                elif arg.type is TinyCTypes.bool:
+                    arg = self.builder.zext(arg, TinyCTypes.int)
+                converted_args.append(arg)
+        return self.builder.call(lhs, converted_args), None
+
+    def _visitPostfix(self, node):
+        """
+        postfixExpression '++' | postfixExpression '--'
+        :param node:
+        :return: 表达式的值，变量本身
+        """
+        lhs, lhs_ptr = self.visitExpressionNode(node.operand)
+        one = lhs.type(1)
+        if node.op == '++':
+            res = self.builder.add(lhs, one)
         else:
-            text = ctx.getText()
-            if ctx.Identifier():
-                if text in self.symbol_table:
-                    var = self.symbol_table[text]
-                    if type(var) in [ir.Argument, ir.Function]:
-                        var_val = var
-                    else:
-                        if isinstance(var.type.pointee, ir.ArrayType) or isinstance(var.type.pointee, ir.IdentifiedStructType):
-                            zero = ir.Constant(TinyCTypes.int, 0)
-                            var_val = self.builder.gep(var, [zero, zero])
-                        else:
-                            var_val = self.builder.load(var)
-                    return var_val, var
-                else:
-                    raise SemanticError(ctx=ctx, msg="undefined identifier "+text)
-            elif ctx.StringLiteral():
-                str_len = len(parse_escape(text[1:-1]))
-                return TinyCTypes.get_const_from_str(ir.ArrayType(TinyCTypes.char, str_len+1), const_value=text, ctx=ctx), None
-            else:
-                # TODO 需要根据text的特点，确定其为浮点数、整数还是字符(目前的策略比较简单)
-                if '.' in text:  # 浮点数
-                    const_value = TinyCTypes.get_const_from_str(TinyCTypes.double, text, ctx=ctx)
-                elif text.startswith("'"):  # 字符
-                    const_value = TinyCTypes.get_const_from_str(TinyCTypes.char, text, ctx=ctx)
-                else:  # 整数
-                    const_value = TinyCTypes.get_const_from_str(TinyCTypes.int, text, ctx=ctx)
-                return const_value, None
-
-    def visitArgumentExpressionList(self, ctx:CParser.ArgumentExpressionListContext):
-        """
-        argumentExpressionList
-            :   assignmentExpression
-            |   argumentExpressionList ',' assignmentExpression
-            ;
-        :param ctx:
-        :return: 返回参数值的一个列表
+            res = self.builder.sub(lhs, one)
+        self.builder.store(res, lhs_ptr)
+        return lhs, lhs_ptr
+
+    def _visitMember(self, node):
         """
-        if len(ctx.children) == 1:
-            arg_list = []
+        postfixExpression '.' Identifier | postfixExpression '->' Identifier
+        :param node:
+        :return: 表达式的值，变量本身
+        """
+        lhs, lhs_ptr = self.visitExpressionNode(node.base)
+        if node.op == '.':
+            struct_ptr = lhs_ptr
+        else:
+            if type(lhs.type.pointee) != ir.IdentifiedStructType:
+                raise SemanticError(ctx=node.ctx, msg="Illegal operation on -> operator.")
+            struct_ptr = lhs
+        target_name = struct_ptr.type.pointee.name
+        array_index = self.struct_reflection[target_name][node.name]['index']
+        array_index = ir.Constant(TinyCTypes.int, array_index)
+        zero = ir.Constant(TinyCTypes.int, 0)
+        array_indices = [zero, array_index]
+        ptr = self.builder.gep(struct_ptr, array_indices)
+        return self._load(ptr), ptr
+
+    def _load(self, ptr):
+        """
+        读取ptr指向的值。数组不整体读取，而是退化成指向首元素的指针，和原来的存储共享内存
+        :param ptr: 变量、数组元素或结构体成员的地址
+        :return: 值
+        """
+        if isinstance(ptr.type.pointee, ir.ArrayType):
+            zero = ir.Constant(TinyCTypes.int, 0)
+            return self.builder.gep(ptr, [zero, zero])
+        return self.builder.load(ptr)
+
+    def _visitIdentifier(self, node):
+        """
+        Identifier
+        :param node:
+        :return: 表达式的值，变量本身
+        """
+        name = node.name
+        var = self.symbol_table.get(name)
+        if var is not None:
+            if isinstance(var, ir.Constant):  # 枚举常量
+                return var, None
+            elif type(var) in [ir.Argument, ir.Function]:
+                var_val = var
+            elif isinstance(var.type.pointee, ir.IdentifiedStructType):
+                zero = ir.Constant(TinyCTypes.int, 0)
+                var_val = self.builder.gep(var, [zero, zero])
+            else:
+                var_val = self._load(var)
+            return var_val, var
         else:
-            arg_list = self.visit(ctx.argumentExpressionList())
-        arg, _ = self.visit(ctx.assignmentExpression())
-        arg_list.append(arg)
-        return arg_list
+            raise SemanticError(ctx=node.ctx, msg="undefined identifier "+name)
 
+    def _visitConstant(self, node):
+        """
+        Constant
+        :param node:
+        :return: 表达式的值，变量本身
+        """
+        return node.value, None
+
+    def _visitString(self, node):
+        """
+        StringLiteral+
+        :param node:
+        :return: 表达式的值，变量本身
+        """
+        return self._string_constant(node.value + '\0'), None
+
+    def _string_constant(self, str_val):
+        """
+        字符串字面量作为private unnamed_addr常量在模块中只保存一份，内容相同的字面量共用一个全局常量
+        :param str_val: 字符串，含结尾的'\0'
+        :return: 指向首字符的常量指针
+        """
+        pointer = self.string_constants.get(str_val)
+        if pointer is None:
+            array = ir.Constant(ir.ArrayType(TinyCTypes.char, len(str_val)), bytearray(str_val, 'ascii'))
+            variable = ir.GlobalVariable(self.module, array.type, name=self.module.get_unique_name('.str'))
+            variable.initializer = array
+            variable.global_constant = True
+            variable.linkage = 'private'
+            variable.unnamed_addr = True
+            zero = ir.Constant(TinyCTypes.int, 0)
+            pointer = self.string_constants[str_val] = variable.gep([zero, zero])
+        return pointer
+
+    def _visitComma(self, node):
+        """
+        expression ',' assignmentExpression
+        :param node:
+        :return: 最后一个表达式的值，变量本身
+        """
+        for item in node.items:
+            result = self.visitExpressionNode(item)
+        return result
+
+    def _visitSizeof(self, node):
+        """
+        'sizeof' unaryExpression | 'sizeof' '(' typeName ')'
+        按本机的数据布局在编译时求出大小，操作数不求值
+        :param node:
+        :return: 表达式的值，变量本身
+        """
+        if node.operand is None:
+            value_type = self.visit(node.type_name)
+        else:
+            value_type = self._type_of(node.operand)
+            if value_type is TinyCTypes.bool:  # 比较和逻辑运算的结果在C中是int，作为值使用时也会扩展成int
+                value_type = TinyCTypes.int
+        if not isinstance(value_type, ir.Type) or value_type == TinyCTypes.void or \
+                isinstance(value_type, ir.FunctionType):
+            raise SemanticError(ctx=node.ctx, msg="Invalid application of sizeof to {}".format(value_type))
+        return TinyCTypes.int(value_type.get_abi_size(target_data(), context=self.global_context)), None
+
+    def _type_of(self, node):
+        """
+        求表达式的类型，不在当前函数中生成任何代码
+        数组、结构体变量和字符串字面量取它们本身的类型，而不是退化后的指针；
+        其他表达式在一个不属于模块的临时函数中求值，&&、||和?:生成的基本块与phi节点也都留在临时函数里
+        :param node: 表达式的AST
+        :return: LLVM类型
+        """
+        kind = node.kind
+        if kind is Kind.STRING:
+            return ir.ArrayType(TinyCTypes.char, len(node.value) + 1)
+        elif kind is Kind.CONSTANT:
+            return node.value.type
+        elif kind is Kind.IDENTIFIER:
+            var = self.symbol_table.get(node.name)
+            if isinstance(var, (ir.AllocaInstr, ir.GlobalVariable)):
+                return var.type.pointee
+            elif var is not None:
+                return var.type
+        scratch = ir.Function(ir.Module(context=self.global_context), ir.FunctionType(TinyCTypes.void, []),
+                              name='sizeof')
+        builders = self.builder, self.alloca_builder
+        self.builder = self.alloca_builder = ir.IRBuilder(scratch.append_basic_block(name='entry'))
+        try:
+            value, ptr = self.visitExpressionNode(node)
+        finally:
+            self.builder, self.alloca_builder = builders
+        if ptr is not None and not isinstance(ptr, (ir.Argument, ir.Function)):
+            return ptr.type.pointee
+        return value.type
+
+    def _constant_value(self, node):
+        """
+        在编译时求值，除了字面量之外还可以使用枚举常量和sizeof
+        :param node: 表达式的AST
+        :return: ir.Constant，不是常量表达式时返回None
+        """
+        kind = node.kind
+        if kind is Kind.CONSTANT:
+            return node.value
+        elif kind is Kind.STRING:
+            return self._string_constant(node.value + '\0')
+        elif kind is Kind.IDENTIFIER:
+            var = self.symbol_table.get(node.name)
+            return var if isinstance(var, ir.Constant) else None
+        elif kind is Kind.SIZEOF:
+            return self._visitSizeof(node)[0]
+        elif kind is Kind.BINARY:
+            lhs, rhs = self._constant_value(node.lhs), self._constant_value(node.rhs)
+            if lhs is not None and rhs is not None and is_foldable(lhs) and is_foldable(rhs):
+                return fold_binary(node.op, lhs, rhs)
+        elif kind is Kind.UNARY:
+            operand = self._constant_value(node.operand)
+            if operand is not None and is_foldable(operand):
+                return fold_unary(node.op, operand)
+        elif kind is Kind.CONDITIONAL:
+            values = [self._constant_value(child) for child in (node.cond, node.then, node.otherwise)]
+            if all(value is not None and is_foldable(value) for value in values):
+                return fold_conditional(*values)
+        return None
+
+    # 二元运算符到对应代码生成函数的映射表
+    _binary_visitors = {
+        '*': _visitMultiplicative, '/': _visitMultiplicative, '%': _visitMultiplicative,
+        '+': _visitAdditive, '-': _visitAdditive,
+        '<<': _visitShift, '>>': _visitShift,
+        '<': _visitRelatioinAndEqualityExpression, '>': _visitRelatioinAndEqualityExpression,
+        '<=': _visitRelatioinAndEqualityExpression, '>=': _visitRelatioinAndEqualityExpression,
+        '==': _visitRelatioinAndEqualityExpression, '!=': _visitRelatioinAndEqualityExpression,
+        '&': _visitAnd,
+        '^': _visitExclusiveOr,
+        '|': _visitInclusiveOr,
+        '&&': _visitLogicalAnd,
+        '||': _visitLogicalOr,
+    }
+
+    # AST节点类型到对应代码生成函数的映射表，按Kind的值索引
+    _node_visitors = [None] * len(Kind)
+    _node_visitors[Kind.IDENTIFIER] = _visitIdentifier
+    _node_visitors[Kind.CONSTANT] = _visitConstant
+    _node_visitors[Kind.STRING] = _visitString
+    _node_visitors[Kind.ASSIGN] = _visitAssign
+    _node_visitors[Kind.CONDITIONAL] = _visitConditional
+    _node_visitors[Kind.UNARY] = _visitUnary
+    _node_visitors[Kind.PREFIX] = _visitPrefix
+    _node_visitors[Kind.POSTFIX] = _visitPostfix
+    _node_visitors[Kind.INDEX] = _visitIndex
+    _node_visitors[Kind.CALL] = _visitCall
+    _node_visitors[Kind.MEMBER] = _visitMember
+    _node_visitors[Kind.COMMA] = _visitComma
+    _node_visitors[Kind.SIZEOF] = _visitSizeof
 
     def visitJumpStatement(self, ctx:CParser.JumpStatementContext):
         """
@@ -720,20 +1052,21 @@ class TinyCGenerator(CVisitor):
         :param ctx:
         :return:
         """
-        jump_str = ctx.children[0].getText()
-        if jump_str == "return":
+        jump_type = ctx.children[0].symbol.type
+        if jump_type == CLexer.Return:
             if len(ctx.children) == 3:
                 ret_val, _ = self.visit(ctx.expression())
                 converted_val = TinyCTypes.cast_type(
-                    self.builder, target_type=self.builder.function.type.pointee.return_type, value=ret_val, ctx=ctx)
+                    self.builder, target_type=self.builder.function.type.pointee.return_type, value=ret_val, ctx=ctx,
+                    alloca_builder=self.alloca_builder)
                 self.builder.ret(converted_val)
             else:
                 self.builder.ret_void()
-        elif jump_str == 'continue':
+        elif jump_type == CLexer.Continue:
             if self.continue_block is None:
                 raise SemanticError("continue can not be used here", ctx)
             self.builder.branch(self.continue_block)
-        elif jump_str == 'break':
+        elif jump_type == CLexer.Break:
             if self.break_block is None:
                 raise SemanticError("break can not be used here", ctx)
             self.builder.branch(self.break_block)
@@ -741,42 +1074,6 @@ class TinyCGenerator(CVisitor):
             # TODO 尚未支持goto语句
             raise NotImplementedError("goto")
 
-    def visitMultiplicativeExpression(self, ctx:CParser.MultiplicativeExpressionContext):
-        """
-        multiplicativeExpression
-            :   castExpression
-            |   multiplicativeExpression '*' castExpression
-            |   multiplicativeExpression '/' castExpression
-            |   multiplicativeExpression '%' castExpression
-            ;
-        :param ctx:
-        :return: 表达式的值,变量本身
-        """
-        rhs, rhs_ptr = self.visit(ctx.castExpression())
-        if match_rule(ctx.children[0], CParser.RULE_castExpression):
-            return rhs, rhs_ptr
-        else:
-            lhs, lhs_ptr = self.visit(ctx.multiplicativeExpression())
-            converted_target = lhs.type
-            converted_rhs = TinyCTypes.cast_type(self.builder, value=rhs, target_type=converted_target, ctx=ctx)  # 将rhs转成lhs的类型
-            op = ctx.children[1].getText()
-            if TinyCTypes.is_int(converted_target): # 整数运算
-                if op == '*':
-                    return self.builder.mul(lhs, converted_rhs), None
-                elif op == '/':
-                    return self.builder.sdiv(lhs, converted_rhs), None
-                else:
-                    return self.builder.srem(lhs, converted_rhs), None
-            elif TinyCTypes.is_float(converted_target):  #浮点数运算
-                if op == '*':
-                    return self.builder.fmul(lhs, converted_rhs), None
-                elif op == '/':
-                    return self.builder.fdiv(lhs, converted_rhs), None
-                else:
-                    raise SemanticError(ctx=ctx, msg="Float doesn't support % operation")
-            else:
-                raise SemanticError(ctx=ctx, msg="Illegal operation: "+str(lhs)+op+str(rhs))
-
     def visitInitDeclaratorList(self, ctx:CParser.InitDeclaratorListContext):
         """
         initDeclaratorList
@@ -805,14 +1102,24 @@ class TinyCGenerator(CVisitor):
             return old_type, name, old_llvm_type, args
         else:
             var_name, var_type = name, old_llvm_type
-            if len(ctx.children) == 3:
+            string_init = self._string_initializer(ctx, var_type) if len(ctx.children) == 3 else None
+            if string_init is not None:  # 用字符串初始化字符数组，数组有自己的一份拷贝
+                var_type, converted_val = string_init
+            elif len(ctx.children) == 3:
                 init_val = self.visit(ctx.initializer())
                 if isinstance(init_val, list):  # 如果初始值是一个列表
                     converted_val = ir.Constant(var_type, init_val)
                 else:  # 如果初始值是一个值
                     if isinstance(var_type, ir.PointerType) and isinstance(init_val.type, ir.ArrayType) and var_type.pointee == init_val.type.element:
                         var_type = init_val.type  # 数组赋值给指针，不需要进行强制转换
-                    converted_val = TinyCTypes.cast_type(self.builder, value=init_val, target_type=var_type, ctx=ctx)
+                    if self.is_global:  # 全局变量的初始值在编译时求出，不能生成指令
+                        converted_val = cast_constant(init_val, var_type) if is_foldable(init_val) else init_val
+                        if not isinstance(converted_val, ir.Constant) or converted_val.type != var_type:
+                            raise SemanticError(msg="Initializer of {} is not a compile-time constant".format(var_name),
+                                                ctx=ctx)
+                    else:
+                        converted_val = TinyCTypes.cast_type(self.builder, value=init_val, target_type=var_type,
+                                                             ctx=ctx, alloca_builder=self.alloca_builder)
                 # TODO 目前多维数组初始化必须使用嵌套的方式，并且无法自动补零
                 # TODO 数组变量初始化时，未能自动进行类型转换
             try:
@@ -822,12 +1129,40 @@ class TinyCGenerator(CVisitor):
                     if len(ctx.children) == 3:
                         self.symbol_table[var_name].initializer = converted_val
                 else:  #如果是局部变量
-                    self.symbol_table[var_name] = self.builder.alloca(var_type)
+                    self.symbol_table[var_name] = self.alloca_builder.alloca(var_type)
                     if len(ctx.children) == 3:
                         self.builder.store(converted_val, self.symbol_table[var_name])
             except RedefinitionError as e:
                 raise SemanticError(msg="redefinition variable {}".format(var_name), ctx=ctx)
 
+    def _string_initializer(self, ctx, var_type):
+        """
+        用字符串字面量初始化字符数组，如char s[] = "abc"或char s[8] = "abc"
+        :param ctx: initDeclarator
+        :param var_type: 声明的类型，char s[]的类型为char*
+        :return: (数组类型, 数组的初始值)，不是这种情况时返回None
+        """
+        expression = ctx.initializer().assignmentExpression()
+        if expression is None:
+            return None
+        if isinstance(var_type, ir.ArrayType):
+            count, element = var_type.count, var_type.element
+        elif isinstance(var_type, ir.PointerType) and \
+                match_token(ctx.declarator().directDeclarator().children[-1], CLexer.RightBracket):
+            count, element = None, var_type.pointee
+        else:
+            return None
+        if element != TinyCTypes.char:
+            return None
+        node = lower_expression(expression)
+        if node.kind is not Kind.STRING:
+            return None
+        str_val = node.value + '\0'
+        if count is not None:  # 长度固定的数组截断或补零
+            str_val = str_val[:count].ljust(count, '\0')
+        array_type = ir.ArrayType(TinyCTypes.char, len(str_val))
+        return array_type, ir.Constant(array_type, bytearray(str_val, 'ascii'))
+
     def visitInitializer(self, ctx:CParser.InitializerContext):
         """
         initializer
@@ -839,6 +1174,11 @@ class TinyCGenerator(CVisitor):
         :return:
         """
         if len(ctx.children) == 1:
+            if self.is_global:  # 全局变量的初始值在编译时求出，不能生成指令
+                value = self._constant_value(lower_expression(ctx.assignmentExpression()))
+                if value is None:
+                    raise SemanticError(ctx=ctx, msg="Initializer element is not a compile-time constant")
+                return value
             value, _ = self.visit(ctx.assignmentExpression())
             return value
         else:
@@ -882,21 +1222,21 @@ class TinyCGenerator(CVisitor):
         last_continue, last_break = self.continue_block, self.break_block
         self.continue_block, self.break_block = update_block, end_block
 
-        iteration_type = ctx.children[0].getText()  # 循环类型
+        iteration_type = ctx.children[0].symbol.type  # 循环类型
 
         cond_expression = None
         update_expression = None
-        if iteration_type == "while":  # while循环
+        if iteration_type == CLexer.While:  # while循环
             cond_expression = ctx.expression()
-        elif iteration_type == "for":  # for循环
+        elif iteration_type == CLexer.For:  # for循环
             cond_expression, update_expression = self.visit(ctx.forCondition())
-        elif iteration_type == "do":  # do while
+        elif iteration_type == CLexer.Do:  # do while
             cond_expression = ctx.expression()
         else:
             raise SemanticError(ctx=ctx, msg="Cannot recognize loop form!")
         self.builder.branch(do_block)
         self.builder.position_at_start(do_block)
-        if iteration_type == "do":
+        if iteration_type == CLexer.Do:
             self.visit(ctx.statement())
         self.builder.branch(cond_block)
         self.builder.position_at_start(cond_block)
@@ -977,7 +1317,7 @@ class TinyCGenerator(CVisitor):
         :param ctx:
         :return:
         """
-        if ctx.children[0].getText() == 'if':
+        if match_token(ctx.children[0], CLexer.If):
             cond_val, _ = self.visit(ctx.expression())
             converted_cond_val = TinyCTypes.cast_type(self.builder, target_type=TinyCTypes.bool, value=cond_val, ctx=ctx)
             statements = ctx.statement()
@@ -993,37 +1333,41 @@ class TinyCGenerator(CVisitor):
                     self.visit(statements[0])
             self.symbol_table.exit_scope()
         else:
+            # switch直接生成LLVM的switch指令，由LLVM决定生成跳转表还是二分查找
+            cond_val, _ = self.visit(ctx.expression())
+            if not TinyCTypes.is_int(cond_val.type):
+                raise SemanticError(ctx=ctx, msg="switch condition must be an integer")
             name_prefix = self.builder.block.name
-            start_block = self.builder.block
             end_block = self.builder.append_basic_block(name=name_prefix + '.end_switch')
+            switch = self.builder.switch(cond_val, end_block)
             old_context = self.switch_context
             old_break = self.break_block
             self.break_block = end_block
-            cond_val, _ = self.visit(ctx.expression())
-            self.switch_context = [[], None, name_prefix + '.case.']
+            # [switch指令, 语句块名前缀, 已有的case值, 值不是常量的case标签, default标签的语句块]
+            self.switch_context = [switch, name_prefix + '.case.', set(), [], None]
             self.visit(ctx.statement(0))
             try:
                 self.builder.branch(end_block)
             except AssertionError:
                 # 最后一个标签里有break或return语句，不用跳转
                 pass
-            label_blocks = []
-            for i in range(len(self.switch_context[0])):
-                label_blocks.append(self.builder.append_basic_block(name=name_prefix + '.label.' + str(i)))
-            self.builder.position_at_end(start_block)
-            self.builder.branch(label_blocks[0])
-            for i, (label, _block) in enumerate(self.switch_context[0]):
-                self.builder.position_at_end(label_blocks[i])
-                if isinstance(label, str):
-                    self.builder.branch(_block)
-                else:
+            _, _, _, dynamic_labels, default_block = self.switch_context
+            default_block = default_block or end_block  # 没有default标签时跳到switch之后
+            if dynamic_labels:
+                # 值不是常量的标签（如全局变量）无法放进switch指令，在default分支中依次比较
+                switch.default = self.builder.append_basic_block(name=name_prefix + '.label.0')
+                self.builder.position_at_end(switch.default)
+                for i, (label, content_block) in enumerate(dynamic_labels):
                     constant, _ = self.visit(label)
                     condition = self.builder.icmp_signed(cmpop='==', lhs=cond_val, rhs=constant)
-                    if i == len(self.switch_context[0]) - 1:
-                        false_block = end_block
+                    if i == len(dynamic_labels) - 1:
+                        false_block = default_block
                     else:
-                        false_block = label_blocks[i + 1]
-                    self.builder.cbranch(condition, _block, false_block)
+                        false_block = self.builder.append_basic_block(name=name_prefix + '.label.' + str(i + 1))
+                    self.builder.cbranch(condition, content_block, false_block)
+                    self.builder.position_at_end(false_block)
+            else:
+                switch.default = default_block
             self.builder.position_at_start(end_block)
             self.switch_context = old_context
             self.break_block = old_break
@@ -1038,206 +1382,34 @@ class TinyCGenerator(CVisitor):
         :param ctx:
         :return:
         """
-        if ctx.children[0].getText() == 'Identifier':
+        if match_token(ctx.children[0], CLexer.Identifier):
             raise NotImplementedError('Identifier label is not implemented yet.')
+        if self.switch_context is None:
+            raise SemanticError(ctx=ctx, msg="case label not within a switch statement")
+        switch, prefix, values, dynamic_labels, default_block = self.switch_context
+        block_name = prefix + str(len(switch.cases) + len(dynamic_labels))
         if len(ctx.children) == 4:
-            block_name, label = self.switch_context[2] + str(len(self.switch_context[0])),  ctx.constantExpression()
+            value = self._constant_int(ctx.constantExpression())
+            content_block = self.builder.append_basic_block(name=block_name)
+            if value is None:
+                dynamic_labels.append((ctx.constantExpression(), content_block))
+            elif value in values:
+                raise SemanticError(ctx=ctx, msg="duplicate case value {}".format(value))
+            else:
+                values.add(value)
+                switch.add_case(value, content_block)
         else:
-            block_name, label = self.switch_context[2] + 'default', 'default'
-        content_block = self.builder.append_basic_block(name=block_name)
+            if default_block is not None:
+                raise SemanticError(ctx=ctx, msg="multiple default labels in one switch")
+            content_block = self.builder.append_basic_block(name=prefix + 'default')
+            self.switch_context[4] = content_block
+        if not self.builder.block.is_terminated:
+            # 上一个分支没有break或return语句时落入当前分支
+            self.builder.branch(content_block)
         self.builder.position_at_end(content_block)
-        if self.switch_context[1] is not None:
-            cur_block = self.builder.block
-            self.builder.position_at_end(self.switch_context[1])
-            try:
-                self.builder.branch(cur_block)
-            except AssertionError:
-                # 上一个分支有return或break语句时不用跳到当前分支
-                pass
-            self.builder.position_at_end(cur_block)
-        self.switch_context[1] = self.builder.block
         self.symbol_table.enter_scope()
         self.visit(ctx.statement())
         self.symbol_table.exit_scope()
-        self.switch_context[0].append((label, content_block))
-
-    def visitAdditiveExpression(self, ctx:CParser.AdditiveExpressionContext):
-        """
-        additiveExpression
-            :   multiplicativeExpression
-            |   additiveExpression '+' multiplicativeExpression
-            |   additiveExpression '-' multiplicativeExpression
-            ;
-        :param ctx:
-        :return:
-        """
-        rhs, rhs_ptr = self.visit(ctx.multiplicativeExpression())
-        if len(ctx.children) == 1:  # multiplicativeExpression
-            return rhs, rhs_ptr
-        else:
-            lhs, _ = self.visit(ctx.additiveExpression())
-            op = ctx.children[1].getText()
-            convert_target = lhs.type
-            converted_rhs = TinyCTypes.cast_type(self.builder, value=rhs, target_type=convert_target, ctx=ctx)
-            if TinyCTypes.is_int(convert_target):
-                if op == '+':
-                    return self.builder.add(lhs, converted_rhs), None
-                else:
-                    return self.builder.sub(lhs, converted_rhs), None
-            elif TinyCTypes.is_float(convert_target):
-                if op == '+':
-                    return self.builder.fadd(lhs, converted_rhs), None
-                else:
-                    return self.builder.fsub(lhs, converted_rhs), None
-            else:
-                raise SemanticError(ctx=ctx, msg="Illegal operation: "+str(lhs)+op+str(rhs))
-
-    def _visitRelatioinAndEqualityExpression(self, ctx):
-        """
-        由于visitRelationalExpression和visitEqualityExpression的处理过程非常相像，
-        因此将它们的处理过程抽离成一个函数
-        :param ctx:
-        :return:
-        """
-        rhs, rhs_ptr = self.visit(ctx.children[-1])
-        if len(ctx.children) == 1:
-            return rhs, rhs_ptr
-        else:
-            lhs, _ = self.visit(ctx.children[0])
-            op = ctx.children[1].getText()
-            converted_target = lhs.type
-            if type(lhs.type) == ir.PointerType and type(rhs.type) == ir.IntType:
-                converted_target = TinyCTypes.int
-                converted_rhs = rhs
-                lhs = TinyCTypes.cast_type(self.builder, value=lhs, target_type=TinyCTypes.int, ctx=ctx)
-            else:
-                converted_rhs = TinyCTypes.cast_type(self.builder, value=rhs, target_type=converted_target, ctx=ctx)
-            if TinyCTypes.is_int(converted_target):
-                return self.builder.icmp_signed(cmpop=op, lhs=lhs, rhs=converted_rhs), None
-            elif TinyCTypes.is_float(converted_target):
-                return self.builder.fcmp_ordered(cmpop=op, lhs=lhs, rhs=converted_rhs), None
-            else:
-                raise SemanticError(ctx=ctx, msg="Unknown relation expression: " + str(lhs) + str(op) + str(rhs))
-
-    def visitRelationalExpression(self, ctx:CParser.RelationalExpressionContext):
-        """
-        relationalExpression
-            :   shiftExpression
-            |   relationalExpression '<' shiftExpression
-            |   relationalExpression '>' shiftExpression
-            |   relationalExpression '<=' shiftExpression
-            |   relationalExpression '>=' shiftExpression
-            ;
-        :param ctx:
-        :return:
-        """
-        return self._visitRelatioinAndEqualityExpression(ctx)
-
-    def visitShiftExpression(self, ctx:CParser.ShiftExpressionContext):
-        """
-        shiftExpression
-            :   additiveExpression
-            |   shiftExpression '<<' additiveExpression
-            |   shiftExpression '>>' additiveExpression
-            ;
-        :param ctx:
-        :return:
-        """
-        rhs, rhs_ptr = self.visit(ctx.additiveExpression())
-        if len(ctx.children) == 1:
-            return rhs, rhs_ptr
-        else:
-            lhs, _ = self.visit(ctx.shiftExpression())
-            if ctx.children[1].getText() == '<<':
-                return self.builder.shl(lhs, rhs), None
-            else:
-                return self.builder.ashr(lhs, rhs), None
-
-
-    def visitEqualityExpression(self, ctx:CParser.EqualityExpressionContext):
-        """
-        equalityExpression
-            :   relationalExpression
-            |   equalityExpression '==' relationalExpression
-            |   equalityExpression '!=' relationalExpression
-            ;
-        :param ctx:
-        :return:
-        """
-        return self._visitRelatioinAndEqualityExpression(ctx)
-
-    def visitLogicalAndExpression(self, ctx:CParser.LogicalAndExpressionContext):
-        """
-        logicalAndExpression
-            :   inclusiveOrExpression
-            |   logicalAndExpression '&&' inclusiveOrExpression
-            ;
-        :param ctx:
-        :return:
-        """
-        if len(ctx.children) == 1:
-            rhs, rhs_ptr = self.visit(ctx.inclusiveOrExpression())
-            return rhs, rhs_ptr
-        else:
-            lhs, _ = self.visit(ctx.logicalAndExpression())
-            converted_lhs = TinyCTypes.cast_type(self.builder, value=lhs, target_type=TinyCTypes.bool, ctx=ctx)
-            result = self.builder.alloca(TinyCTypes.bool)
-            with self.builder.if_else(converted_lhs) as (then, otherwise):
-                with then:
-                    rhs, rhs_ptr = self.visit(ctx.inclusiveOrExpression())
-                    converted_rhs = TinyCTypes.cast_type(self.builder, value=rhs, target_type=TinyCTypes.bool, ctx=ctx)
-                    self.builder.store(converted_rhs, result)
-                with otherwise:
-                    self.builder.store(TinyCTypes.bool(0), result)
-            return self.builder.load(result), None
-
-    def visitInclusiveOrExpression(self, ctx: CParser.InclusiveOrExpressionContext):
-        """
-        inclusiveOrExpression
-            :   exclusiveOrExpression
-            |   inclusiveOrExpression '|' exclusiveOrExpression
-            ;
-        :param ctx:
-        :return:
-        """
-        rhs, rhs_ptr = self.visit(ctx.exclusiveOrExpression())
-        if len(ctx.children) == 1:
-            return rhs, rhs_ptr
-        else:
-            lhs, _ = self.visit(ctx.inclusiveOrExpression())
-            return self.builder.or_(lhs, rhs), None
-
-    def visitExclusiveOrExpression(self, ctx:CParser.ExclusiveOrExpressionContext):
-        """
-        exclusiveOrExpression
-            :   andExpression
-            |   exclusiveOrExpression '^' andExpression
-            ;
-        :param ctx:
-        :return:
-        """
-        rhs, rhs_ptr = self.visit(ctx.andExpression())
-        if len(ctx.children) == 1:
-            return rhs, rhs_ptr
-        else:
-            lhs, _ = self.visit(ctx.exclusiveOrExpression())
-            return self.builder.xor(lhs, rhs), None
-
-    def visitAndExpression(self, ctx:CParser.AndExpressionContext):
-        """
-        andExpression
-            :   equalityExpression
-            |   andExpression '&' equalityExpression
-            ;
-        :param ctx:
-        :return:
-        """
-        rhs, rhs_ptr = self.visit(ctx.equalityExpression())
-        if len(ctx.children) == 1:
-            return rhs, rhs_ptr
-        else:
-            lhs, _ = self.visit(ctx.andExpression())
-            return self.builder.and_(lhs, rhs), None
 
     def visitBlockItem(self, ctx:CParser.BlockItemContext):
         """
@@ -1265,41 +1437,163 @@ class TinyCGenerator(CVisitor):
         :param ctx:
         :return:
         """
-        if not match_text(ctx.children[0], ","):
+        if not match_token(ctx.children[0], CLexer.Semi):
             try:
                 self.visit(ctx.children[0])
             except SemanticError as e:
                 self.error_listener.register_semantic_error(e)
 
-    def save(self, filename):
-        """保存到文件"""
+    def save(self, filename, opt_level=0, emit="ll"):
+        """
+        保存到文件
+        :param filename: 输出文件
+        :param opt_level: 保存前的优化级别，0表示保存未优化的IR
+        :param emit: 输出的格式，ll为IR代码，bc为bitcode，obj为目标文件，asm为汇编代码，exe为可执行文件
+        :return: None
+        """
+        save_ir(repr(self.module), filename, opt_level, emit)
+
+
+def save_ir(llvm_ir, filename, opt_level=0, emit="ll"):
+    """
+    把IR代码按指定的格式保存到文件
+    :param llvm_ir: IR代码字符串
+    :param filename: 输出文件
+    :param opt_level: 保存前的优化级别，0表示保存未优化的IR
+    :param emit: 输出的格式，ll为IR代码，bc为bitcode，obj为目标文件，asm为汇编代码，exe为可执行文件
+    :return: None
+    """
+    if emit == "ll":
         with open(filename, "w") as f:
-            f.write(repr(self.module))
+            f.write(optimize_ir(llvm_ir, opt_level))
+    elif emit == "bc":
+        with open(filename, "wb") as f:
+            f.write(to_bitcode(llvm_ir, opt_level))
+    elif emit == "obj":
+        with open(filename, "wb") as f:
+            f.write(emit_object(llvm_ir, opt_level))
+    elif emit == "asm":
+        with open(filename, "w") as f:
+            f.write(emit_assembly(llvm_ir, opt_level))
+    elif emit == "exe":
+        link_executable(emit_object(llvm_ir, opt_level), filename)
+    else:
+        raise ValueError("Unknown output format: " + emit)
+
+
+# 两阶段语法分析的统计信息：sll为SLL模式直接成功的次数，ll为回退到完整LL模式的次数
+two_stage_statistics = {"sll": 0, "ll": 0}
 
 
-def generate(input_filename, output_filename):
+def tokenize(input_stream):
     """
-    将C代码文件转成IR代码文件
-    :param input_filename: C代码文件
-    :param output_filename: IR代码文件
-    :return: 生成是否成功
+    对输入流进行词法分析，一次性读完所有的token
+    :param input_stream: ANTLR输入流
+    :return: 已填满的token流
     """
-    lexer = CLexer(FileStream(input_filename))
-    stream = CommonTokenStream(lexer)
-    parser = CParser(stream)
+    stream = CommonTokenStream(CLexer(input_stream))
+    stream.fill()
+    return stream
 
-    error_listener = TinyCErrorListener()
+
+def parse(input_stream, error_listener, two_stage=False):
+    """
+    对输入流进行词法和语法分析
+    :param input_stream: ANTLR输入流，或者tokenize()得到的token流（此时跳过词法分析）
+    :param error_listener: 错误监听器，只在完整LL模式下挂载
+    :param two_stage: 是否先用SLL预测模式和遇错即停的策略分析，失败时再回退到完整LL模式
+    :return: 语法树
+    """
+    if isinstance(input_stream, CommonTokenStream):
+        stream = input_stream
+    else:
+        stream = CommonTokenStream(CLexer(input_stream))
+    parser = CParser(stream)
     parser.removeErrorListeners()
+
+    if two_stage:
+        parser._interp.predictionMode = PredictionMode.SLL
+        parser._errHandler = BailErrorStrategy()
+        try:
+            tree = parser.compilationUnit()
+            two_stage_statistics["sll"] += 1
+            return tree
+        except ParseCancellationException:
+            # SLL失败不代表存在语法错误，需要用完整的LL模式重新分析一遍。
+            # typedefName就是Identifier，'int b;'中的b在SLL下总被当成类型说明符，这样的声明一定会回退
+            two_stage_statistics["ll"] += 1
+            parser.reset()
+            parser._interp.predictionMode = PredictionMode.LL
+            parser._errHandler = DefaultErrorStrategy()
+
     parser.addErrorListener(error_listener)
+    return parser.compilationUnit()
 
-    tree = parser.compilationUnit()
 
-    generator = TinyCGenerator(error_listener)
-    generator.visit(tree)
-    generator.save(output_filename)
+def generate(input_filename, output_filename, two_stage=False, opt_level=0, emit="ll", stats=None, profiler=None):
+    """
+    将C代码文件转成IR代码文件
+    :param input_filename: C代码文件
+    :param output_filename: 输出文件
+    :param two_stage: 是否使用SLL-LL两阶段语法分析
+    :param opt_level: 输出的优化级别，有错误时不优化
+    :param emit: 输出的格式，ll/bc/obj/asm/exe，有错误时只输出IR代码，不是ll时写到同名的.ll文件
+    :param stats: 统计信息Statistics，不为None时记录lex/parse/codegen/save各阶段的耗时和计数
+    :param profiler: 性能剖析器generator.profiler.Profiler，不为None时统计代码生成中每个函数的耗时
+    :return: 生成是否成功
+    """
+    collect = stats is not None
+    if not collect:  # 各阶段的计时开销很小，计数则只在需要时进行
+        stats = Statistics()
+    error_listener = TinyCErrorListener()
+    with stats.phase("lex"):
+        tokens = tokenize(FileStream(input_filename))
+    with stats.phase("parse"):
+        tree = parse(tokens, error_listener, two_stage=two_stage)
+
+    with stats.phase("codegen"):
+        generator = TinyCGenerator(error_listener)
+        if profiler is not None:
+            with profiler.attach(generator):
+                generator.visit(tree)
+        else:
+            generator.visit(tree)
+    with stats.phase("save"):
+        if len(error_listener.errors) == 0:
+            generator.save(output_filename, opt_level, emit)
+        else:  # 有错误时只保存未优化的IR代码；要求其他格式时另存为.ll，不把文本IR写进.bc/.o/.s/.out文件
+            generator.save(output_filename if emit == "ll" else os.path.splitext(output_filename)[0] + ".ll")
+
+    if collect:
+        stats.record_tree(tokens, tree)
+        stats.record_module(generator.module)
+        stats.record_peak_rss()
 
     if len(error_listener.errors) == 0:
         return True
     else:
         error_listener.print_errors()
         return False
+
+
+def compile_and_run(source, opt_level=0, executor=None, two_stage=False):
+    """
+    在内存中编译并运行C代码，不读写任何文件
+    IR代码只在交给执行器时解析一次，不经过写文件再读回的过程
+    :param source: C代码字符串
+    :param opt_level: JIT编译前的优化级别，只在新建执行器时使用
+    :param executor: 执行器Executor，为None时新建一个
+    :param two_stage: 是否使用SLL-LL两阶段语法分析
+    :return: (生成是否成功, main函数的返回值)
+    """
+    error_listener = TinyCErrorListener()
+    tree = parse(InputStream(source), error_listener, two_stage=two_stage)
+
+    generator = TinyCGenerator(error_listener)
+    generator.visit(tree)
+    if len(error_listener.errors) != 0:
+        error_listener.print_errors()
+        return False, None
+    if executor is None:
+        executor = Executor(opt_level)
+    return True, executor.execute_ir(repr(generator.module))
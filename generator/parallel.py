@@ -0,0 +1,294 @@
+"""
+按函数并行的代码生成。
+语法分析和代码生成的时间都与函数体的大小成正比，而且不同函数体之间互不依赖。
+先只做词法分析，按顶层的外部声明把源代码切开，把函数定义按源代码的顺序分成连续的若干块；
+每块交给一个工作进程，工作进程拿到的源代码包含这一块之前的所有全局声明、之前函数的原型和这一块的函数定义，
+独立地完成语法分析和代码生成，得到一个LLVM模块。最后按块的顺序用link_in把模块链接成一个，
+函数在结果中的顺序和源代码一致，与工作进程的个数无关。
+"""
+import gc
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import llvmlite.ir as ir
+import llvmlite.binding as llvm
+from antlr4 import FileStream, InputStream, CommonTokenStream, Token
+from parser_.CLexer import CLexer
+from generator.generator import tokenize, parse, TinyCGenerator, save_ir, two_stage_statistics
+from generator.errors import TinyCErrorListener
+from generator.stats import Statistics
+from executor.executor import initialize
+
+
+class Piece(object):
+    """一个顶层的外部声明在源代码中的位置"""
+    __slots__ = ("start", "stop", "body", "line", "column", "tokens")
+
+    def __init__(self, start, stop, body, line, column, tokens):
+        self.start = start  # 第一个字符的下标
+        self.stop = stop  # 最后一个字符之后的下标
+        self.body = body  # 函数定义中函数体'{'的下标，不是函数定义时为None
+        self.line = line  # 第一个token所在的行和列
+        self.column = column
+        self.tokens = tokens  # token的个数，用来估计分析和生成代码的工作量
+
+
+def split_external_declarations(tokens):
+    """
+    只根据token把源代码切分成顶层的外部声明：
+    深度为0的';'结束一个声明，紧跟在')'之后的深度为0的'{'开始一个函数体，与它匹配的'}'结束这个函数定义。
+    结构体、枚举和初始化列表中的'{'前面不是')'，会一直读到后面的';'
+    :param tokens: tokenize()得到的token流
+    :return: [Piece]，按源代码的顺序排列
+    """
+    pieces = []
+    depth = 0
+    first = None  # 当前声明的第一个token
+    body = None
+    previous = None
+    count = 0
+    for token in tokens.tokens:
+        kind = token.type
+        if kind == Token.EOF:
+            break
+        if first is None:
+            first, count = token, 0
+        count += 1
+        if kind == CLexer.LeftBrace:
+            if depth == 0 and previous == CLexer.RightParen:
+                body = token.start
+            depth += 1
+        elif kind == CLexer.RightBrace:
+            depth -= 1
+            if depth == 0 and body is not None:
+                pieces.append(Piece(first.start, token.stop + 1, body, first.line, first.column, count))
+                first, body = None, None
+        elif kind == CLexer.Semi and depth == 0:
+            pieces.append(Piece(first.start, token.stop + 1, None, first.line, first.column, count))
+            first = None
+        previous = kind
+    if first is not None:  # 不完整的声明原样保留，由语法分析报告错误
+        last = tokens.tokens[-2]
+        pieces.append(Piece(first.start, last.stop + 1, None, first.line, first.column, count))
+    return pieces
+
+
+def _split_chunks(pieces, count):
+    """
+    把函数定义按源代码的顺序分成至多count个连续的块，每块的token数大致相同
+    :return: [(第一个函数定义的下标, 最后一个函数定义的下标)]，下标是pieces中的下标
+    """
+    functions = [index for index, piece in enumerate(pieces) if piece.body is not None]
+    if not functions:
+        return [(None, None)]
+    count = max(1, min(count, len(functions)))
+    remaining = sum(pieces[index].tokens for index in functions)
+    chunks = []
+    first = functions[0]
+    weight = 0
+    for position, index in enumerate(functions):
+        weight += pieces[index].tokens
+        chunks_left = count - len(chunks)
+        functions_left = len(functions) - position - 1
+        # 当前块达到剩余工作量的平均值，或者剩下的函数刚好每块一个时，结束当前块
+        if chunks_left > 1 and functions_left > 0 and \
+                (weight * chunks_left >= remaining or functions_left < chunks_left):
+            chunks.append((first, index))
+            remaining -= weight
+            weight = 0
+            first = functions[position + 1]
+    chunks.append((first, functions[-1]))
+    return chunks
+
+
+def _chunk_source(source, pieces, first, last, owner):
+    """
+    生成一个块的源代码：这一块的函数定义原样保留，之前的函数定义换成原型，之后的声明去掉（最后一块没有之后的函数定义）。
+    每个声明都放在原来的行和列上，语法错误和语义错误报告的位置与原文件一致
+    :param first: 这一块第一个函数定义的下标，为None时没有函数定义
+    :param last: 这一块最后一个函数定义的下标
+    :param owner: 是否是拥有全局变量的最后一块，这一块包含所有的声明
+    :return: C代码字符串
+    """
+    parts = []
+    line, column = 1, 0
+    for index, piece in enumerate(pieces):
+        if first is not None and index > last and not owner:
+            break
+        if piece.body is None or (first is not None and first <= index <= last):
+            text = source[piece.start:piece.stop]
+        else:
+            text = source[piece.start:piece.body].rstrip() + ";"
+        if piece.line > line:
+            parts.append("\n" * (piece.line - line))
+            line, column = piece.line, 0
+        if piece.column > column:
+            parts.append(" " * (piece.column - column))
+            column = piece.column
+        elif column > 0:  # 原型比原来的函数定义短，不会出现这种情况，只是保证声明之间有分隔
+            parts.append(" ")
+            column += 1
+        parts.append(text)
+        newlines = text.count("\n")
+        if newlines:
+            line += newlines
+            column = len(text) - text.rfind("\n") - 1
+        else:
+            column += len(text)
+    return "".join(parts) + "\n"
+
+
+def _export_globals(module, owner):
+    """
+    全局变量只在拥有它们的块中定义，其他块中改成外部声明，链接时解析到同一个定义。
+    链接前需要把internal改成外部链接，链接后再改回来
+    :param module: 块的llvmlite.ir模块
+    :param owner: 是否拥有全局变量
+    :return: 改过链接属性的全局变量名
+    """
+    names = []
+    for value in module.global_values:
+        if isinstance(value, ir.GlobalVariable) and value.linkage == "internal":
+            names.append(value.name)
+            if owner:
+                if value.initializer is None:  # 和internal时一样是undef，但不能成为外部声明
+                    value.initializer = ir.Constant(value.value_type, ir.Undefined)
+            else:
+                value.initializer = None
+            value.linkage = ""
+    return names
+
+
+def _generate_chunk(task):
+    """
+    在工作进程中分析一块源代码并生成代码
+    :param task: (C代码, 是否使用两阶段语法分析, 是否拥有全局变量, 主进程的递归深度)
+    :return: 同_generate
+    """
+    source, two_stage, owner, recursion_limit = task
+    # 分析深层嵌套的代码需要和主进程相同的递归深度（进程池的initializer参数要Python 3.7才有）
+    sys.setrecursionlimit(recursion_limit)
+    lexer = CLexer(InputStream(source))
+    lexer.removeErrorListeners()  # 词法错误在切分时已经报告过
+    tokens = CommonTokenStream(lexer)
+    tokens.fill()
+    return _generate(tokens, two_stage, owner)
+
+
+def _generate(tokens, two_stage, owner=None):
+    """
+    分析token流并生成代码
+    :param owner: 是否拥有全局变量，为None时是整个程序，不需要链接
+    :return: (IR代码，有错误时为None, 错误列表, 全局变量名, 两阶段语法分析统计的增量)
+    """
+    before = dict(two_stage_statistics)
+    error_listener = TinyCErrorListener()
+    tree = parse(tokens, error_listener, two_stage=two_stage)
+    generator = TinyCGenerator(error_listener)
+    generator.visit(tree)
+    delta = {key: two_stage_statistics[key] - before[key] for key in before}
+    if error_listener.errors:
+        return None, error_listener.errors, [], delta
+    names = _export_globals(generator.module, owner) if owner is not None else []
+    return repr(generator.module), [], names, delta
+
+
+def link_modules(llvm_irs, global_names):
+    """
+    按顺序把各块的模块链接成一个
+    :param llvm_irs: 各块的IR代码，第一个作为链接的目标
+    :param global_names: 链接后恢复成internal的全局变量名
+    :return: 链接后的IR代码
+    """
+    initialize()
+    context = llvm.create_context()
+    linked = llvm.parse_assembly(llvm_irs[0], context)
+    for llvm_ir in llvm_irs[1:]:
+        linked.link_in(llvm.parse_assembly(llvm_ir, context))
+    for name in global_names:
+        linked.get_global_variable(name).linkage = llvm.Linkage.internal
+    linked.verify()
+    return str(linked)
+
+
+def generate_ir(source, tokens, jobs=None, two_stage=False, stats=None):
+    """
+    用jobs个进程并行地生成source的IR代码
+    :param source: C代码字符串
+    :param tokens: source的token流
+    :param jobs: 进程数，默认为CPU核数
+    :param two_stage: 是否使用SLL-LL两阶段语法分析
+    :param stats: 统计信息Statistics，记录codegen和link阶段的耗时以及块数
+    :return: (IR代码，有错误时为None, 错误列表)
+    """
+    if stats is None:
+        stats = Statistics()
+    jobs = jobs or os.cpu_count()
+    pieces = split_external_declarations(tokens)
+    chunks = _split_chunks(pieces, jobs)
+    stats.count("chunks", len(chunks))
+
+    with stats.phase("codegen"):
+        if len(chunks) == 1:  # 只有一块时就是整个源代码，直接使用已有的token流，统计信息直接记在当前进程中
+            results = [_generate(tokens, two_stage)]
+        else:
+            owner = len(chunks) - 1
+            recursion_limit = sys.getrecursionlimit()
+            tasks = [(_chunk_source(source, pieces, first, last, index == owner), two_stage, index == owner,
+                      recursion_limit) for index, (first, last) in enumerate(chunks)]
+            # fork之前冻结已有的对象，子进程的垃圾回收不再遍历它们，避免写时复制把父进程的整个堆复制一遍。
+            # gc.freeze要Python 3.7才有，更早的版本只是少了这个优化
+            freeze = hasattr(gc, "freeze")
+            if freeze:
+                gc.freeze()
+            try:
+                with ProcessPoolExecutor(max_workers=min(jobs, len(tasks))) as pool:
+                    results = list(pool.map(_generate_chunk, tasks))
+            finally:
+                if freeze:
+                    gc.unfreeze()
+            for _, _, _, delta in results:
+                for key, value in delta.items():
+                    two_stage_statistics[key] += value
+
+    # 全局声明在每一块中都会被分析，它们的错误只报告一次
+    errors = list(dict.fromkeys(error for _, chunk_errors, _, _ in results for error in chunk_errors))
+    if errors:
+        return None, errors
+    if len(results) == 1:
+        return results[0][0], []
+    with stats.phase("link"):
+        llvm_ir = link_modules([result[0] for result in results], results[-1][2])
+    return llvm_ir, []
+
+
+def generate(input_filename, output_filename, jobs=None, two_stage=False, opt_level=0, emit="ll", stats=None):
+    """
+    将C代码文件并行地转成IR代码文件，与generator.generate的区别是函数体由多个进程分析并生成代码
+    有错误时只打印错误，不输出文件
+    :param input_filename: C代码文件
+    :param output_filename: 输出文件
+    :param jobs: 进程数，默认为CPU核数
+    :param two_stage: 是否使用SLL-LL两阶段语法分析
+    :param opt_level: 输出的优化级别
+    :param emit: 输出的格式，ll/bc/obj/asm/exe
+    :param stats: 统计信息Statistics，不为None时记录lex/codegen/link/save各阶段的耗时和块数
+    :return: 生成是否成功
+    """
+    collect = stats is not None
+    if not collect:
+        stats = Statistics()
+    input_stream = FileStream(input_filename)
+    with stats.phase("lex"):
+        tokens = tokenize(input_stream)
+    llvm_ir, errors = generate_ir(input_stream.strdata, tokens, jobs, two_stage, stats)
+    if errors:
+        error_listener = TinyCErrorListener()
+        error_listener.errors = errors
+        error_listener.print_errors()
+        return False
+    with stats.phase("save"):
+        save_ir(llvm_ir, output_filename, opt_level, emit)
+    if collect:
+        stats.record_peak_rss()
+    return True
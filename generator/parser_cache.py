@@ -0,0 +1,138 @@
+"""
+进程级的语法分析器缓存。
+CLexer和CParser的ATN与DFA都是类属性，同一进程内所有的词法/语法分析器共享它们，
+因此只要DFA预热过一次，之后的文件就能以热启动的速度分析。
+本模块负责预热DFA、清空DFA以及把DFA快照保存到磁盘，供其他进程直接加载。
+"""
+import hashlib
+import pickle
+import sys
+from antlr4 import FileStream
+from antlr4.atn.ATNSimulator import ATNSimulator
+from antlr4.atn.LexerATNSimulator import LexerATNSimulator
+from antlr4.atn.LexerAction import LexerSkipAction, LexerMoreAction, LexerPopModeAction
+from antlr4.atn.SemanticContext import SemanticContext
+from antlr4.dfa.DFA import DFA
+from antlr4.PredictionContext import PredictionContext, PredictionContextCache
+from parser_.CLexer import CLexer
+from parser_.CParser import CParser, serializedATN
+from generator.generator import parse
+from generator.errors import TinyCErrorListener
+
+
+# 序列化DFA对象图时需要的递归深度
+_PICKLE_RECURSION_LIMIT = 20000
+
+
+def _grammar_digest():
+    """当前语法的摘要，用来判断磁盘上的快照是否来自同一份CParser.py"""
+    return hashlib.sha1(serializedATN().encode("utf-8")).hexdigest()
+
+
+def _shared_objects():
+    """
+    快照中不能复制的对象：ANTLR运行时用is比较的单例，以及import时已经反序列化好的ATN状态。
+    序列化时它们只记录一个编号，加载时替换回当前进程里的同一个对象
+    :return: {编号: 对象}
+    """
+    shared = {
+        "ATNSimulator.ERROR": ATNSimulator.ERROR,
+        "LexerATNSimulator.ERROR": LexerATNSimulator.ERROR,
+        "SemanticContext.NONE": SemanticContext.NONE,
+        "PredictionContext.EMPTY": PredictionContext.EMPTY,
+        "LexerSkipAction.INSTANCE": LexerSkipAction.INSTANCE,
+        "LexerMoreAction.INSTANCE": LexerMoreAction.INSTANCE,
+        "LexerPopModeAction.INSTANCE": LexerPopModeAction.INSTANCE,
+    }
+    for prefix, recognizer in (("lexer", CLexer), ("parser", CParser)):
+        for state in recognizer.atn.states:
+            if state is not None:
+                shared[(prefix, state.stateNumber)] = state
+    return shared
+
+
+class _SnapshotPickler(pickle.Pickler):
+    def __init__(self, file):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.shared_ids = {id(obj): key for key, obj in _shared_objects().items()}
+
+    def persistent_id(self, obj):
+        return self.shared_ids.get(id(obj))
+
+
+class _SnapshotUnpickler(pickle.Unpickler):
+    def __init__(self, file):
+        super().__init__(file)
+        self.shared = _shared_objects()
+
+    def persistent_load(self, pid):
+        return self.shared[pid]
+
+
+def dfa_size():
+    """返回词法和语法分析器DFA中已缓存的状态数"""
+    lexer_states = sum(len(dfa._states) for dfa in CLexer.decisionsToDFA)
+    parser_states = sum(len(dfa._states) for dfa in CParser.decisionsToDFA)
+    return lexer_states, parser_states
+
+
+def reset():
+    """清空所有DFA缓存，使下一次语法分析回到冷启动状态"""
+    for recognizer in (CLexer, CParser):
+        recognizer.decisionsToDFA = [DFA(ds, i) for i, ds in enumerate(recognizer.atn.decisionToState)]
+    CParser.sharedContextCache = PredictionContextCache()
+
+
+def warm_up(filenames, two_stage=False):
+    """
+    依次分析filenames中的文件来预热DFA，分析结果丢弃
+    :param filenames: C代码文件列表
+    :param two_stage: 是否使用SLL-LL两阶段语法分析（两种模式共享同一份DFA）
+    :return: None
+    """
+    for filename in filenames:
+        parse(FileStream(filename), TinyCErrorListener(), two_stage=two_stage)
+
+
+def save_snapshot(filename):
+    """
+    将预热过的DFA保存到磁盘
+    :param filename: 快照文件名
+    :return: None
+    """
+    state = {
+        "digest": _grammar_digest(),
+        "lexer": CLexer.decisionsToDFA,
+        "parser": (CParser.decisionsToDFA, CParser.sharedContextCache),
+    }
+    old_limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(old_limit, _PICKLE_RECURSION_LIMIT))
+    try:
+        with open(filename, "wb") as f:
+            _SnapshotPickler(f).dump(state)
+    finally:
+        sys.setrecursionlimit(old_limit)
+
+
+def load_snapshot(filename):
+    """
+    从磁盘加载DFA快照，替换CLexer和CParser的DFA缓存
+    之后新建的词法/语法分析器都会使用加载的DFA
+    :param filename: 快照文件名
+    :return: 是否加载成功（文件不存在、无法解析或与当前语法不一致时返回False）
+    """
+    old_limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(old_limit, _PICKLE_RECURSION_LIMIT))
+    try:
+        with open(filename, "rb") as f:
+            state = _SnapshotUnpickler(f).load()
+    except Exception:  # 文件不存在或内容损坏时，pickle可能抛出各种异常
+        return False
+    finally:
+        sys.setrecursionlimit(old_limit)
+
+    if not isinstance(state, dict) or state.get("digest") != _grammar_digest():
+        return False
+    CLexer.decisionsToDFA = state["lexer"]
+    CParser.decisionsToDFA, CParser.sharedContextCache = state["parser"]
+    return True
@@ -0,0 +1,155 @@
+"""
+代码生成器的性能剖析。
+把TinyCGenerator实例上的visitXxx方法、表达式AST的分派以及TinyCTypes.cast_type、SymbolTable、IRBuilder等辅助函数
+替换成计时的包装函数，统计每个函数的调用次数、包含时间（含被调用者）和自身时间（不含被调用者），
+以及每一行C代码上花费的时间。结果可以打印成排序的报告，或者导出为flamegraph.pl可以读取的折叠调用栈文件。
+"""
+import time
+import types
+from antlr4 import ParserRuleContext
+import llvmlite.ir as ir
+from generator.types import TinyCTypes
+from generator.symbol_table import SymbolTable
+from generator.expression import Kind
+
+
+class _Entry(object):
+    __slots__ = ("calls", "inclusive", "exclusive")
+
+    def __init__(self):
+        self.calls = 0
+        self.inclusive = 0.0
+        self.exclusive = 0.0
+
+
+class Profiler(object):
+    def __init__(self, helpers=True):
+        """
+        :param helpers: 是否同时统计cast_type、符号表和IRBuilder的调用
+        """
+        self.helpers = helpers
+        self.functions = {}  # 函数名 -> _Entry
+        self.lines = {}  # C代码行号 -> 自身时间
+        self.stacks = {}  # 折叠的调用栈 -> 自身时间
+        self._stack = []  # [函数名, 行号, 开始时间, 被调用者的时间]
+        self._active = {}  # 函数名 -> 在调用栈中出现的次数，递归时包含时间只在最外层统计
+        self._patched = []  # (对象, 属性名, 原来的值)
+
+    def _call(self, name, line, func, args, kwargs):
+        """调用func并记录时间"""
+        if line is None and self._stack:
+            line = self._stack[-1][1]
+        frame = [name, line, time.perf_counter(), 0.0]
+        self._stack.append(frame)
+        self._active[name] = self._active.get(name, 0) + 1
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - frame[2]
+            self._stack.pop()
+            self._active[name] -= 1
+            exclusive = elapsed - frame[3]
+            entry = self.functions.get(name)
+            if entry is None:
+                entry = self.functions[name] = _Entry()
+            entry.calls += 1
+            entry.exclusive += exclusive
+            if self._active[name] == 0:
+                entry.inclusive += elapsed
+            if self._stack:
+                self._stack[-1][3] += elapsed
+            self.lines[line] = self.lines.get(line, 0.0) + exclusive
+            key = ";".join([caller[0] for caller in self._stack] + [name])
+            self.stacks[key] = self.stacks.get(key, 0.0) + exclusive
+
+    def _wrap_visitor(self, name, method):
+        def wrapper(ctx, *args, **kwargs):
+            line = ctx.start.line if isinstance(ctx, ParserRuleContext) and ctx.start is not None else None
+            return self._call(name, line, method, (ctx,) + args, kwargs)
+        return wrapper
+
+    def _wrap_helper(self, name, func):
+        def wrapper(*args, **kwargs):
+            return self._call(name, None, func, args, kwargs)
+        return wrapper
+
+    def _patch(self, owner, attribute, value):
+        self._patched.append((owner, attribute, owner.__dict__.get(attribute)))
+        setattr(owner, attribute, value)
+
+    def attach(self, generator):
+        """
+        开始统计generator的代码生成
+        :param generator: TinyCGenerator实例
+        :return: self，可以用在with语句中，退出时自动detach()
+        """
+        for name in dir(type(generator)):
+            if name.startswith("visit") and name not in ("visit", "visitExpressionNode"):
+                method = getattr(generator, name)
+                if callable(method):
+                    self._patch(generator, name, self._wrap_visitor(name, method))
+
+        generator_class = type(generator)
+
+        def visit_expression_node(node):
+            if node.kind is Kind.BINARY:
+                func = generator_class._binary_visitors[node.op]
+            else:
+                func = generator_class._node_visitors[node.kind]
+            line = node.ctx.start.line if node.ctx is not None else None
+            return self._call(func.__name__, line, func, (generator, node), {})
+        self._patch(generator, "visitExpressionNode", visit_expression_node)
+
+        if self.helpers:
+            self._patch(TinyCTypes, "cast_type", staticmethod(self._wrap_helper("TinyCTypes.cast_type",
+                                                                                TinyCTypes.cast_type)))
+            for attribute in ("__getitem__", "get", "__setitem__", "__contains__", "enter_scope", "exit_scope"):
+                self._patch(SymbolTable, attribute,
+                            self._wrap_helper("SymbolTable." + attribute, SymbolTable.__dict__[attribute]))
+            for attribute, value in list(ir.IRBuilder.__dict__.items()):
+                if not attribute.startswith("_") and isinstance(value, types.FunctionType):
+                    self._patch(ir.IRBuilder, attribute, self._wrap_helper("IRBuilder." + attribute, value))
+        return self
+
+    def detach(self):
+        """恢复被替换的方法和类属性"""
+        while self._patched:
+            owner, attribute, value = self._patched.pop()
+            if value is None:
+                delattr(owner, attribute)
+            else:
+                setattr(owner, attribute, value)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.detach()
+
+    def report(self, limit=30):
+        """
+        :param limit: 函数和代码行各打印前limit个
+        :return: 按自身时间从大到小排序的报告
+        """
+        lines = ["%-40s %8s %14s %14s" % ("function", "calls", "inclusive(ms)", "exclusive(ms)")]
+        ranked = sorted(self.functions.items(), key=lambda item: item[1].exclusive, reverse=True)
+        for name, entry in ranked[:limit]:
+            lines.append("%-40s %8d %14.2f %14.2f" % (name, entry.calls, entry.inclusive * 1000, entry.exclusive * 1000))
+        lines.append("")
+        lines.append("%-40s %14s" % ("source line", "exclusive(ms)"))
+        ranked_lines = sorted(self.lines.items(), key=lambda item: item[1], reverse=True)
+        for line, seconds in ranked_lines[:limit]:
+            lines.append("%-40s %14.2f" % ("-" if line is None else line, seconds * 1000))
+        return "\n".join(lines)
+
+    def save_collapsed(self, filename):
+        """
+        导出折叠调用栈文件，每行为“调用者;...;被调用者 自身时间（微秒）”，可以直接交给flamegraph.pl
+        :param filename: 文件名
+        :return: None
+        """
+        with open(filename, "w") as f:
+            for stack, seconds in sorted(self.stacks.items()):
+                microseconds = int(round(seconds * 1e6))
+                if microseconds > 0:
+                    f.write("%s %d\n" % (stack, microseconds))
@@ -0,0 +1,78 @@
+"""
+编译与执行过程的统计信息：每个阶段的耗时和各种计数，可以打印成表格或导出为JSON。
+generate()和execute()接受一个可选的Statistics对象，在编译和执行的过程中往里面填数据。
+"""
+import json
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from antlr4 import ParserRuleContext
+
+
+class Statistics(object):
+    def __init__(self):
+        self.phases = {}  # 阶段名 -> 耗时（秒），按阶段开始的顺序排列
+        self.counters = {}  # 计数器名 -> 值
+
+    @contextmanager
+    def phase(self, name):
+        """记录with语句块的耗时，同名的阶段累加"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def count(self, name, value):
+        """设置计数器的值"""
+        self.counters[name] = value
+
+    def record_peak_rss(self):
+        """记录进程到目前为止的内存峰值（字节）"""
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux上ru_maxrss的单位是KB，macOS上是字节
+        self.count("peak_rss", peak if sys.platform == "darwin" else peak * 1024)
+
+    def record_tree(self, tokens, tree):
+        """记录token数（不含EOF）和语法树中非终结符节点的个数"""
+        self.count("tokens", len(tokens.tokens) - 1)
+        nodes = 0
+        stack = [tree]
+        while stack:
+            ctx = stack.pop()
+            nodes += 1
+            if ctx.children:
+                stack.extend(child for child in ctx.children if isinstance(child, ParserRuleContext))
+        self.count("parse_tree_nodes", nodes)
+
+    def record_module(self, module):
+        """记录llvmlite.ir模块中定义的函数、基本块和指令的个数"""
+        functions, blocks, instructions = 0, 0, 0
+        for function in module.functions:
+            if function.is_declaration:
+                continue
+            functions += 1
+            blocks += len(function.blocks)
+            instructions += sum(len(block.instructions) for block in function.blocks)
+        self.count("functions", functions)
+        self.count("basic_blocks", blocks)
+        self.count("instructions", instructions)
+
+    def to_dict(self):
+        return {"phases": dict(self.phases), "counters": dict(self.counters)}
+
+    def save_json(self, filename):
+        """导出为JSON文件"""
+        with open(filename, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def report(self):
+        """
+        :return: 每行一个阶段或计数器的表格
+        """
+        lines = ["%-20s %10.2f ms" % (name, seconds * 1000) for name, seconds in self.phases.items()]
+        if self.phases:
+            lines.append("%-20s %10.2f ms" % ("total", sum(self.phases.values()) * 1000))
+        lines += ["%-20s %13d" % (name, value) for name, value in self.counters.items()]
+        return "\n".join(lines)
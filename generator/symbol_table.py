@@ -11,38 +11,54 @@ class RedefinitionError(Exception):
 
 
 class SymbolTable:
-    """符号表"""
+    """
+    符号表
+    所有作用域共用一个字典，每个名字对应一个遮蔽栈，栈顶是当前可见的定义；
+    每个作用域记录自己定义过的名字（撤销日志），退出时只弹出这些名字的栈顶。
+    查找和插入与嵌套层数无关，退出作用域的代价与该作用域中定义的名字个数成正比。
+    """
     def __init__(self):
-        self.__tables = [{},]
+        self.__symbols = {}  # 名字 -> [(定义所在的层数, 值), ...]，最后一个是当前可见的定义
+        self.__undo = [[]]  # 每一层作用域中定义的名字
         self.__level = 0  # 当前的嵌套层数
 
     def __getitem__(self, item):
-        for l in range(self.__level, -1, -1):
-            if item in self.__tables[l]:
-                return self.__tables[l][item]
-        return None
+        stack = self.__symbols.get(item)
+        return stack[-1][1] if stack is not None else None
+
+    def get(self, item, default=None):
+        """只查找一次，找不到时返回default，用来代替先in再[]"""
+        stack = self.__symbols.get(item)
+        return stack[-1][1] if stack is not None else default
 
     def __setitem__(self, key, value):
-        if key in self.__tables[self.__level]:
+        stack = self.__symbols.get(key)
+        if stack is None:
+            self.__symbols[key] = [(self.__level, value)]
+        elif stack[-1][0] == self.__level:
             raise RedefinitionError(key)
-        self.__tables[self.__level][key] = value
+        else:
+            stack.append((self.__level, value))
+        self.__undo[-1].append(key)
 
     def __contains__(self, item):
-        for l in range(self.__level, -1, -1):
-            if item in self.__tables[l]:
-                return True
-        return False
+        return item in self.__symbols
 
     def enter_scope(self):
         """进入一个新的作用域"""
         self.__level += 1
-        self.__tables.append({})
+        self.__undo.append([])
 
     def exit_scope(self):
         """退出一个作用域"""
         if self.__level == 0:
             return
-        self.__tables.pop(-1)
+        symbols = self.__symbols
+        for name in self.__undo.pop():
+            stack = symbols[name]
+            stack.pop()
+            if not stack:
+                del symbols[name]
         self.__level -= 1
 
 
@@ -72,6 +88,40 @@ class SymbolTableTest(unittest.TestCase):
         self.symbol_table.exit_scope()
         self.assertIsNone(self.symbol_table["abc"])
 
+    def test_3(self):
+        """同一作用域中重复定义报错，不同作用域可以重复定义"""
+        self.symbol_table["abc"] = 1
+        with self.assertRaises(RedefinitionError):
+            self.symbol_table["abc"] = 2
+        self.symbol_table.enter_scope()
+        self.symbol_table["abc"] = 3
+        with self.assertRaises(RedefinitionError):
+            self.symbol_table["abc"] = 4
+        self.symbol_table.exit_scope()
+        self.assertEqual(self.symbol_table["abc"], 1)
+
+    def test_4(self):
+        """多层嵌套时逐层恢复被遮蔽的定义，get在找不到时返回默认值"""
+        for level in range(100):
+            self.symbol_table.enter_scope()
+            self.symbol_table["abc"] = level
+            self.symbol_table["level%d" % level] = level
+        self.assertEqual(self.symbol_table.get("abc"), 99)
+        for level in range(99, -1, -1):
+            self.assertEqual(self.symbol_table["abc"], level)
+            self.assertIn("level%d" % level, self.symbol_table)
+            self.symbol_table.exit_scope()
+            self.assertNotIn("level%d" % level, self.symbol_table)
+        self.assertNotIn("abc", self.symbol_table)
+        self.assertIsNone(self.symbol_table.get("abc"))
+        self.assertEqual(self.symbol_table.get("abc", 0), 0)
+
+    def test_5(self):
+        """全局作用域不能退出"""
+        self.symbol_table["abc"] = 1
+        self.symbol_table.exit_scope()
+        self.assertEqual(self.symbol_table["abc"], 1)
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -3,6 +3,9 @@ from generator.util import parse_escape
 from generator.errors import SemanticError
 
 
+_UNKNOWN = object()  # 转换表中还没有的项
+
+
 class TinyCTypes(object):
     int = ir.IntType(32)
     short = ir.IntType(16)
@@ -22,6 +25,8 @@ class TinyCTypes(object):
         "double": double,
         "void": void
     }
+    _infos = {}  # id(类型) -> TypeInfo，由_register注册
+    _casts = {}  # (id(原类型), id(目标类型)) -> 转换函数，不能转换时为None，第一次转换时算出
     # ASCII 转义表
     ascii_mapping = {
         '\\a': 7,
@@ -47,7 +52,7 @@ class TinyCTypes(object):
         :return:
         """
         if type(const_value) is str:
-            if ctype == cls.char:
+            if ctype is cls.char:
                 if len(const_value) == 3:  # 若const_value形如'3',
                     return cls.char(ord(str(const_value[1:-1])))  # 则将ASCII字符转成对应的整数存储
                 elif len(const_value) == 1:  # 若const_value形如44
@@ -58,9 +63,9 @@ class TinyCTypes(object):
                         return cls.char(cls.ascii_mapping[value])
                     else:
                         raise SemanticError(ctx=ctx, msg="Unknown char value: %s"% value)
-            elif ctype in [cls.float, cls.double]:
+            elif cls.is_float(ctype):
                 return ctype(float(const_value))
-            elif ctype in [cls.short, cls.int]:
+            elif ctype is cls.short or ctype is cls.int:
                 return ctype(int(const_value))
             elif isinstance(ctype, ir.ArrayType) and ctype.element == cls.char:
                 # string
@@ -72,61 +77,148 @@ class TinyCTypes(object):
         else:
             raise SyntaxError(ctx=ctx, msg="get_const_from_str doesn't support const_value which is a " + str(type(const_value)))
 
+    @classmethod
+    def info(cls, type):
+        """
+        规范类型的属性
+        :param type: LLVM类型
+        :return: TypeInfo，不是基本类型时返回None
+        """
+        return cls._infos.get(id(type))
+
     @classmethod
     def is_int(cls, type):
         """判断某个类型是否为整数类型"""
-        return type in [cls.int, cls.short, cls.char]
+        info = cls._infos.get(id(type))
+        return info is not None and info.is_int
 
     @classmethod
     def is_float(cls, type):
         """判断某个类型是否为浮点数类型"""
-        return type in [cls.float, cls.double]
+        info = cls._infos.get(id(type))
+        return info is not None and info.is_float
 
     @classmethod
-    def cast_type(cls, builder, target_type, value, ctx):
+    def cast_type(cls, builder, target_type, value, ctx, alloca_builder=None):
         """
         强制类型转换
         :param builder:
         :param target_type:目标类型
         :param value:
+        :param alloca_builder: 分配临时栈空间的builder（一般位于函数入口块），默认使用builder
         :return:转换后的数字
         """
-        if value.type == target_type:  #如果转换前后类型相同，
+        value_type = value.type
+        if value_type is target_type:  #如果转换前后类型相同，
             return value  #则不转换，直接返回
 
-        if cls.is_int(value.type) or value.type == cls.bool:  #从整数或者布尔值
-            if cls.is_int(target_type): #转成整数
-                if value.type.width < target_type.width:  # 扩展整数位数
-                    return builder.sext(value, target_type)
-                else:  # 减少整数位数
-                    return builder.trunc(value, target_type)
-            elif cls.is_float(target_type):  #转成浮点数
-                return builder.sitofp(value, target_type)
-            elif target_type == cls.bool:
-                return builder.icmp_unsigned('!=', value, cls.bool(0))
-            elif type(target_type) == ir.PointerType:  #转成指针
-                return builder.inttoptr(value, target_type)
-
-        elif cls.is_float(value.type):  #从浮点数
-            if cls.is_float(target_type):  #转成浮点数
-                if value.type == cls.float:  # 增加浮点数精度
-                    return builder.fpext(value, cls.double)
-                else:  # 降低浮点数精度
-                    return builder.fptrunc(value, cls.float)
-            elif cls.is_int(target_type):  #转成整数
-                return builder.fptosi(value, target_type)
-        elif type(value.type) == ir.PointerType and type(target_type) == ir.IntType:
+        key = (id(value_type), id(target_type))
+        cast = cls._casts.get(key, _UNKNOWN)  # 基本类型之间的转换查表
+        if cast is _UNKNOWN:
+            source, target = cls._infos.get(key[0]), cls._infos.get(key[1])
+            cast = None
+            if source is not None and target is not None:
+                cast = cls._casts[key] = _scalar_cast(source, target)
+        if cast is not None:
+            return cast(builder, value, target_type)
+
+        if value_type == target_type:  # 结构相同的指针、数组等类型
+            return value
+        if (cls.is_int(value_type) or value_type is cls.bool) and type(target_type) == ir.PointerType:  #整数转成指针
+            return builder.inttoptr(value, target_type)
+        elif type(value_type) == ir.PointerType and type(target_type) == ir.IntType:
             # 指针转int
             return builder.ptrtoint(value, target_type)
-        elif type(value.type) == ir.ArrayType and type(target_type) == ir.PointerType \
-                and value.type.element == target_type.pointee:  #数组类型转成指针类型
+        elif type(value_type) == ir.ArrayType and type(target_type) == ir.PointerType \
+                and value_type.element == target_type.pointee:  #数组类型转成指针类型
+            # 变量、数组元素、结构体成员中的数组和字符串常量在求值时都已经退化成指针，这里只处理其他没有存储位置的数组值
             zero = ir.Constant(cls.int, 0)
-            tmp = builder.alloca(value.type)
+            tmp = (alloca_builder or builder).alloca(value_type)
             builder.store(value, tmp)
             return builder.gep(tmp, [zero, zero])
-        elif isinstance(value.type, ir.ArrayType) and isinstance(target_type, ir.ArrayType) \
-                and value.type.element == target_type.element:
+        elif isinstance(value_type, ir.ArrayType) and isinstance(target_type, ir.ArrayType) \
+                and value_type.element == target_type.element:
             return builder.bitcast(value, target_type)
-        elif isinstance(value.type, ir.PointerType) and isinstance(target_type, ir.PointerType):  # 指针之间的类型转换
+        elif isinstance(value_type, ir.PointerType) and isinstance(target_type, ir.PointerType):  # 指针之间的类型转换
             return builder.bitcast(value, target_type)
-        raise SemanticError(ctx=ctx, msg="No known conversion from '%s' to '%s'" % (value.type, target_type))
\ No newline at end of file
+        raise SemanticError(ctx=ctx, msg="No known conversion from '%s' to '%s'" % (value_type, target_type))
+
+
+class TypeInfo(object):
+    """基本类型的属性，注册时算好，类型判断只需要一次字典查找和属性访问"""
+    __slots__ = ("type", "is_int", "is_float", "is_bool", "width", "signed")
+
+    def __init__(self, type, is_int=False, is_float=False, is_bool=False, width=0, signed=False):
+        self.type = type
+        self.is_int = is_int
+        self.is_float = is_float
+        self.is_bool = is_bool
+        self.width = width
+        self.signed = signed
+
+
+def _register(*infos):
+    """
+    注册基本类型。llvmlite对IntType和DoubleType的实例做了缓存，同样的类型总是同一个对象，
+    因此可以用对象的id作为键，不需要调用按结构比较的__eq__
+    """
+    for info in infos:
+        TinyCTypes._infos[id(info.type)] = info
+
+
+# 基本类型之间的转换，调用时再取builder的方法，性能剖析时替换的方法同样有效
+def _sext(builder, value, target_type):
+    return builder.sext(value, target_type)
+
+
+def _zext(builder, value, target_type):
+    return builder.zext(value, target_type)
+
+
+def _trunc(builder, value, target_type):
+    return builder.trunc(value, target_type)
+
+
+def _sitofp(builder, value, target_type):
+    return builder.sitofp(value, target_type)
+
+
+def _uitofp(builder, value, target_type):
+    return builder.uitofp(value, target_type)
+
+
+def _fptosi(builder, value, target_type):
+    return builder.fptosi(value, target_type)
+
+
+def _to_bool(builder, value, target_type):
+    return builder.icmp_unsigned('!=', value, TinyCTypes.bool(0))
+
+
+def _scalar_cast(source, target):
+    """
+    两个基本类型之间的转换
+    :param source: 原类型的TypeInfo
+    :param target: 目标类型的TypeInfo
+    :return: 生成转换指令的函数，不能转换时返回None
+    """
+    if source.is_int or source.is_bool:  #从整数或者布尔值
+        if target.is_int:  #转成整数
+            if source.width < target.width:  # 扩展整数位数，bool扩展成0或1
+                return _sext if source.signed else _zext
+            return _trunc  # 减少整数位数
+        elif target.is_float:  #转成浮点数
+            return _sitofp if source.signed else _uitofp
+        elif target.is_bool:
+            return _to_bool
+    elif source.is_float:  #从浮点数
+        if target.is_int:  #转成整数
+            return _fptosi
+    return None
+
+
+_register(TypeInfo(TinyCTypes.int, is_int=True, width=32, signed=True),
+          TypeInfo(TinyCTypes.short, is_int=True, width=16, signed=True),
+          TypeInfo(TinyCTypes.char, is_int=True, width=8, signed=True),
+          TypeInfo(TinyCTypes.bool, is_bool=True, width=1),
+          TypeInfo(TinyCTypes.double, is_float=True, width=64, signed=True))
@@ -1,4 +1,5 @@
 import codecs
+from antlr4.tree.Tree import TerminalNode
 
 
 def parse_escape(s):
@@ -13,14 +14,13 @@ def match_rule(ctx, rule):
         return False
 
 
-def match_texts(ctx, texts):
-    """判断ctx.getText() in texts是否成立.若ctx无getText()则返回False. texts是一个字符串列表"""
-    if hasattr(ctx, 'getText'):
-        return ctx.getText() in texts
-    else:
-        return False
+def match_token(ctx, token_type):
+    """判断ctx是否为类型是token_type的终结符，token_type取CLexer中的常量.
+    只比较token的类型，不会像getText()那样拼接整棵子树的文本"""
+    return isinstance(ctx, TerminalNode) and ctx.symbol.type == token_type
+
 
+def match_tokens(ctx, token_types):
+    """判断ctx是否为类型在token_types中的终结符"""
+    return isinstance(ctx, TerminalNode) and ctx.symbol.type in token_types
 
-def match_text(ctx, text):
-    """判断ctx.getText() == text是否成立.若ctx无getText()则返回False"""
-    return match_texts(ctx, [text])
\ No newline at end of file
@@ -1,10 +1,60 @@
-from generator.generator import generate
-import sys
+from generator.generator import generate, two_stage_statistics
+from generator import parser_cache, parallel
+from generator.stats import Statistics
+from generator.profiler import Profiler
+from executor.executor import OPT_LEVELS
+import argparse
+import os
+
+# 各种输出格式的文件后缀
+EMIT_SUFFIXES = {"ll": ".ll", "bc": ".bc", "obj": ".o", "asm": ".s", "exe": ".out"}
 
 if __name__ == '__main__':
-    if len(sys.argv) >= 2:
-        input_filename = sys.argv[1]
-        output_filename = input_filename.strip(".")+".ll"
-        generate(input_filename, output_filename)
+    arg_parser = argparse.ArgumentParser(description="Compile a C file into LLVM IR.")
+    arg_parser.add_argument("input_filename", help="the C file to compile")
+    arg_parser.add_argument("--two-stage", action="store_true",
+                            help="parse with SLL prediction first and fall back to full LL only on failure; "
+                                 "uninitialized declarations such as 'int b;' always fall back")
+    arg_parser.add_argument("--dfa-snapshot", metavar="FILE",
+                            help="load the parser DFA cache from FILE before compiling and save it back afterwards")
+    arg_parser.add_argument("-O", dest="opt_level", type=int, choices=OPT_LEVELS, default=0,
+                            help="optimization level of the written IR (default: 0)")
+    arg_parser.add_argument("--emit", choices=sorted(EMIT_SUFFIXES), default="ll",
+                            help="output LLVM IR, LLVM bitcode, a native object file, native assembly or a linked executable")
+    arg_parser.add_argument("--stats", action="store_true",
+                            help="print the time of every phase, token/tree/IR counts and peak RSS")
+    arg_parser.add_argument("--stats-json", metavar="FILE", help="write the statistics to FILE as JSON")
+    arg_parser.add_argument("--profile", action="store_true",
+                            help="print calls, inclusive and exclusive time of every visitor method and source line")
+    arg_parser.add_argument("--profile-collapsed", metavar="FILE",
+                            help="write the code generation profile to FILE as flamegraph collapsed stacks")
+    arg_parser.add_argument("-j", "--jobs", type=int, default=1,
+                            help="parse and generate function bodies in JOBS worker processes and link the modules "
+                                 "(default: 1, 0 means the number of CPUs)")
+    args = arg_parser.parse_args()
+
+    if args.dfa_snapshot and os.path.exists(args.dfa_snapshot):
+        if not parser_cache.load_snapshot(args.dfa_snapshot):
+            print("Ignore stale or broken DFA snapshot", args.dfa_snapshot)
+
+    output_filename = args.input_filename.strip(".")+EMIT_SUFFIXES[args.emit]
+    stats = Statistics() if args.stats or args.stats_json else None
+    profiler = Profiler() if args.profile or args.profile_collapsed else None
+    if args.jobs != 1 and profiler is None:  # 性能剖析只统计当前进程，需要串行生成代码
+        parallel.generate(args.input_filename, output_filename, jobs=args.jobs or None, two_stage=args.two_stage,
+                          opt_level=args.opt_level, emit=args.emit, stats=stats)
     else:
-        print("Usage: python main.py (input_filename)")
+        generate(args.input_filename, output_filename, two_stage=args.two_stage, opt_level=args.opt_level,
+                 emit=args.emit, stats=stats, profiler=profiler)
+    if args.dfa_snapshot:
+        parser_cache.save_snapshot(args.dfa_snapshot)
+    if args.two_stage:
+        print("Two-stage parsing:", two_stage_statistics["sll"], "SLL,", two_stage_statistics["ll"], "LL fallbacks")
+    if args.stats:
+        print(stats.report())
+    if args.stats_json:
+        stats.save_json(args.stats_json)
+    if args.profile:
+        print(profiler.report())
+    if args.profile_collapsed:
+        profiler.save_collapsed(args.profile_collapsed)
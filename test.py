@@ -1,12 +1,22 @@
-from generator.generator import generate
-from executor.executor import execute
+from generator.generator import generate, compile_and_run, tokenize
+from generator import parallel
+from antlr4 import InputStream
+from executor.executor import Executor
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import sys
 import test.testcase
 import unit_test.testcase
 import os
-import filecmp
+import ctypes
+import tempfile
 import traceback
 
+_libc = ctypes.CDLL(None)
+
+# 所有测试共用的执行器，避免每个文件都重新初始化LLVM和创建执行引擎
+executor = Executor()
+
 def test_file(filename, print_exception=True):
     """
     测试filename代码的编译与执行
@@ -32,10 +42,10 @@ def test_file(filename, print_exception=True):
         return False
     else:
         if print_exception:
-            execute_result = execute(output_filename)
+            execute_result = executor.execute(output_filename)
         else:
             try:
-                execute_result = execute(output_filename)
+                execute_result = executor.execute(output_filename)
             except Exception as e:
                 print("execute", output_filename, "failed.")
                 traceback.print_exc()
@@ -44,22 +54,18 @@ def test_file(filename, print_exception=True):
         return True
 
 
-def test_files(filenames, print_exception=False, is_unit=False):
+def test_files(filenames, print_exception=False):
     """
     测试文件列表filenames中的所有文件
     :param filenames:
     :param print_exception: 是否打印异常
-    :param is_unit: 是否是单元测试
     :return: None
     """
     success_numbers = 0
     fail_numbers = 0
     for filename in filenames:
         print("Test:",filename)
-        if is_unit:
-            result = unit_test_file(filename)
-        else:
-            result = test_file(filename, print_exception)
+        result = test_file(filename, print_exception)
 
         if result:
             success_numbers += 1
@@ -69,28 +75,122 @@ def test_files(filenames, print_exception=False, is_unit=False):
     print("Test Results:", success_numbers, "success,", fail_numbers, "fails")
 
 
-def unit_test_file(filename):
+def run_captured(filename, jobs=None):
+    """
+    在当前进程中编译并运行filename，捕获程序写到标准输出的内容
+    标准输出的文件描述符被重定向到一个匿名临时文件，每个测试独占自己的临时文件
+    :param filename:
+    :param jobs: 不为None时用jobs个进程并行地生成代码
+    :return: (标准输出的内容, 异常信息，没有异常时为None)
+    """
+    with open(filename) as f:
+        source = f.read()
+    with tempfile.TemporaryFile() as output:
+        sys.stdout.flush()
+        saved_fd = os.dup(1)
+        os.dup2(output.fileno(), 1)
+        error = None
+        try:
+            if jobs is None:
+                compile_and_run(source, executor=executor)
+            else:
+                llvm_ir, errors = parallel.generate_ir(source, tokenize(InputStream(source)), jobs)
+                if errors:
+                    raise ValueError("\n".join(errors))
+                executor.execute_ir(llvm_ir)
+        except Exception:
+            error = traceback.format_exc()
+        finally:
+            _libc.fflush(None)  # C程序的printf缓冲区要在恢复标准输出之前写出
+            sys.stdout.flush()
+            os.dup2(saved_fd, 1)
+            os.close(saved_fd)
+        output.seek(0)
+        return output.read(), error
+
+
+def unit_test_file(filename, jobs=None):
     """
     单元测试filename代码的编译与执行
     :param filename:
-    :return: 是否正确编译与执行
+    :param jobs: 不为None时用jobs个进程并行地生成代码
+    :return: (是否正确编译与执行, 失败时要打印的信息)
     """
-    os.system("python test.py " + filename + " > " + "unit_test/temp.txt")
-    if filecmp.cmp(filename.split('.')[0]+".txt", "unit_test/temp.txt"):
-        return True
-    else:
-        with open("unit_test/temp.txt") as f:
-            print(f.read())
-        print("Fail to pass", filename)
-        return False
+    output, error = run_captured(filename, jobs)
+    with open(filename.split('.')[0]+".txt", "rb") as f:
+        expected = f.read()
+    if error is None and output == expected:
+        return True, ""
+    message = output.decode("utf-8", "replace")
+    if error is not None:
+        message += error
+    return False, message + "Fail to pass " + filename
+
+
+def _run_alone(filename, jobs=None):
+    """
+    在只有一个工作进程的进程池中运行一个单元测试，进程崩溃时只有这个测试失败
+    :return: 同unit_test_file
+    """
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        try:
+            return pool.submit(unit_test_file, filename, jobs).result()
+        except BrokenProcessPool:  # 测试程序使工作进程崩溃，例如段错误
+            return False, "Worker crashed. Fail to pass " + filename
+
+
+def _run_pooled(filenames, processes, jobs=None):
+    """
+    用进程池并行运行单元测试，按文件列表的顺序产生结果
+    一个工作进程崩溃后，进程池中所有未完成的测试都会得到BrokenProcessPool，无法知道是哪个测试导致的：
+    第一个未完成的测试单独重新运行，其余的测试放进新的进程池继续运行，只有真正使进程崩溃的测试失败
+    :return: 生成器，产生(文件名, 是否正确编译与执行, 失败时要打印的信息)
+    """
+    pending = list(filenames)
+    while pending:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = [pool.submit(unit_test_file, filename, jobs) for filename in pending]
+            for index, future in enumerate(futures):
+                try:
+                    result, message = future.result()
+                except BrokenProcessPool:
+                    break
+                yield pending[index], result, message
+            else:
+                return
+        yield (pending[index],) + _run_alone(pending[index], jobs)
+        pending = pending[index + 1:]
+
+
+def unit_test_files(filenames, processes=None, jobs=None):
+    """
+    用进程池并行运行单元测试，每个进程只导入一次antlr4和llvmlite，按文件列表的顺序打印结果
+    :param filenames:
+    :param processes: 进程数，默认为CPU核数
+    :param jobs: 不为None时每个文件再用jobs个进程按函数并行地生成代码
+    :return: None
+    """
+    success_numbers = 0
+    fail_numbers = 0
+    for filename, result, message in _run_pooled(filenames, processes or os.cpu_count(), jobs):
+        print("Test:", filename)
+        if result:
+            success_numbers += 1
+        else:
+            fail_numbers += 1
+            print(message)
+        print()
+    print("Test Results:", success_numbers, "success,", fail_numbers, "fails")
 
 
 if __name__ == '__main__':
     if len(sys.argv) == 2:
         if sys.argv[1] == "unit":  # 运行单元测试文件
-            test_files(filenames=unit_test.testcase.cases(), print_exception=False, is_unit=True)
+            unit_test_files(filenames=unit_test.testcase.cases())
+        elif sys.argv[1] == "parallel":  # 按函数并行地生成代码，运行单元测试
+            unit_test_files(filenames=unit_test.testcase.cases(), jobs=3)
         else:  # 运行某个特定的C文件进行测试
             test_file(filename=sys.argv[1], print_exception=True)
     else:  # 运行测试文件
-        test_files(filenames=test.testcase.cases(), print_exception=False, is_unit=False)
+        test_files(filenames=test.testcase.cases(), print_exception=False)
 
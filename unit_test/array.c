@@ -23,10 +23,37 @@ void char_array_test()
     printf("%c\n", c);
     char* s = "Hello world";
     printf("%s\n", s);
+    char word[6] = "abc";
+    word[3] = 'd';
+    printf("%s,%d,%s\n", word, word[5], "Hello world");
 }
+int row_sum(int row[], int n)
+{
+    int sum = 0;
+    for (int i = 0; i < n; i++) {
+        sum = sum + row[i];
+    }
+    row[0] = 100;
+    return sum;
+}
+
+void decay_test()
+{
+    int array[2][3] = {{1, 2, 3}, {4, 5, 6}};
+    int sum = row_sum(array[1], 3);
+    printf("decay=%d,%d,", sum, array[1][0]);
+    int *row = array[0];
+    row[2] = 30;
+    char text[] = "hi";
+    char *p = text;
+    p[1] = 'o';
+    printf("%d,%s\n", array[0][2], text);
+}
+
 int main()
 {
     array_test_1();
     char_array_test();
+    decay_test();
     return 0;
 }
\ No newline at end of file
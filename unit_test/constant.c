@@ -0,0 +1,76 @@
+int printf(const char *format,...);
+
+int width = 3 * 4 + 1;
+int mask = ~(1 << 4) & 255;
+int negative = -7 / 2 * 10 + -7 % 2;
+char wrapped = 120 + 10;
+double ratio = 1.5 * 4 - 0.5;
+int flags = 0 + (3 < 4) + 2 * (2 == 2) + !0 * 4 + 8 * (1 && 0) + 16 * (0 || 5);
+int table[2 * 3] = {1, 2, 3, 4, 5, 6 * 7};
+int *nothing = 0;
+int truth[(3 < 4)] = {7};
+enum {LESS = (1 < 2), MORE = (2 < 1)};
+
+void global_test()
+{
+    printf("global test:%d,%d,%d,%d,%.2f,%d,%d\n", width, mask, negative, wrapped, ratio, flags, table[5]);
+    printf("null and bool test:%d,%d,%d,%d\n", nothing == 0, truth[0], LESS, MORE);
+}
+
+void runtime_test()
+{
+    // the same expressions evaluated at runtime must agree with the folded ones
+    int three = 3;
+    int seven = 7;
+    char c = 120;
+    int one = 1;
+    int zero = 0;
+    printf("runtime test:%d,%d,", three * 4 + 1, ~(one << 4) & 255);
+    c = c + 10;
+    printf("%d,%d,", -seven / 2 * 10 + -seven % 2, c);
+    printf("%d\n", 0 + (three < 4) + 2 * (2 == three - 1) + !zero * 4 + 8 * (one && zero) + 16 * (zero || 5));
+}
+
+int classify(int x)
+{
+    switch (x) {
+    case 1 + 1:
+        return 20;
+    case 2 * 3 - 1:
+        return 50;
+    case -(4 >> 1):
+        return -20;
+    case 'a' + 1:
+        return 98;
+    case 1 < 2:
+        return 1;
+    default:
+        return 0;
+    }
+}
+
+void local_test()
+{
+    int grid[1 + 1][6 / 2];
+    int count = 0;
+    for (int i = 0; i < 2; i++) {
+        for (int j = 0; j < 3; j++) {
+            grid[i][j] = i * 3 + j;
+            count = count + grid[i][j];
+        }
+    }
+    printf("local test:%d,%d,%d,%d,%d,%d,%d\n", count, classify(2), classify(5), classify(-2), classify('b'),
+           classify(3), 1 ? 10 : 20);
+    printf("bool case test:%d\n", classify(1));
+    double less = count < 100;
+    double more = count > 100;
+    printf("bool to double test:%.1f,%.1f\n", less, more);
+}
+
+int main()
+{
+    global_test();
+    runtime_test();
+    local_test();
+    return 0;
+}
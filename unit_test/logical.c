@@ -0,0 +1,67 @@
+int printf(const char *format,...);
+
+int calls = 0;
+
+int touch(int value)
+{
+    calls = calls + 1;
+    return value;
+}
+
+int first(char *s)
+{
+    return s[0];
+}
+
+void short_circuit_test()
+{
+    printf("short circuit test:");
+    calls = 0;
+    printf("%d,", 0 && touch(1));
+    printf("%d,", 1 && touch(0));
+    printf("%d,", 1 || touch(1));
+    printf("%d,", 0 || touch(2));
+    printf("%d,", touch(0) || touch(0) || touch(3));
+    printf("%d\n", calls);
+}
+
+void conditional_test()
+{
+    printf("conditional test:");
+    calls = 0;
+    int a = 5;
+    int b = 7;
+    printf("%d,", a > b ? a : b);
+    printf("%d,", a < b ? touch(a) : touch(b));
+    printf("%d,", a == 5 ? b == 7 ? 1 : 2 : 3);
+    printf("%d,", a && b ? a - b : a + b);
+    printf("%d\n", calls);
+}
+
+void loop_test()
+{
+    // &&, || and ?: are evaluated, a local is declared and a string literal decays to a pointer
+    // on every iteration; the stack must not grow
+    printf("loop test:");
+    int count = 0;
+    int i = 0;
+    while (i < 3000000 && count >= 0) {
+        int odd = i % 2;
+        if (odd && i % 3 == 0 || i % 5 == 0) {
+            count = count + (odd ? 2 : 1);
+        }
+        if (first("x") != 120) {
+            count = -1;
+        }
+        i++;
+    }
+    printf("%d\n", count);
+}
+
+int main()
+{
+    short_circuit_test();
+    conditional_test();
+    loop_test();
+    return 0;
+}
@@ -61,9 +61,33 @@ void if_test_1()
 }
 
 
+int switch_func_2(char c) {
+	int b = 0;
+	switch (c) {
+	default:
+		b = 9;
+		break;
+	case 'a':
+		b = 1;
+		break;
+	case -1:
+		b = -1;
+	case 0:
+		b = b + 10;
+		break;
+	}
+	return b;
+}
+
+void switch_test_2()
+{
+    printf("switch test 2:%d,%d,%d,%d\n", switch_func_2('a'), switch_func_2(-1), switch_func_2(0), switch_func_2('z'));
+}
+
 int main()
 {
     switch_test_1();
+    switch_test_2();
     if_test_1();
     return 0;
 }
\ No newline at end of file
@@ -0,0 +1,59 @@
+int printf(const char *format,...);
+
+enum Color {RED, GREEN = 5, BLUE, LAST = BLUE * 2};
+enum {SIZE = 4};
+
+struct Pair {
+    char tag;
+    int value;
+    double weight;
+};
+
+int grid[SIZE * 2];
+int last = LAST + 1;
+int pair_size = sizeof(struct Pair);
+int flag = 1;
+int logic_size = sizeof(flag && 1);
+int choice_size = sizeof(flag ? 1 : 2);
+
+int name(enum Color color)
+{
+    switch (color) {
+    case RED:
+        return 1;
+    case GREEN:
+        return 2;
+    case BLUE:
+        return 3;
+    default:
+        return 0;
+    }
+}
+
+void enum_test()
+{
+    enum Color color = BLUE;
+    printf("enum test:%d,%d,%d,%d,%d,", RED, GREEN, BLUE, LAST, last);
+    printf("%d,%d,%d\n", name(RED), name(color), name(LAST));
+}
+
+void sizeof_test()
+{
+    int numbers[SIZE + 1];
+    char text[] = "hello";
+    struct Pair pair;
+    struct Pair *p = &pair;
+    int i = 0;
+    printf("sizeof test:%d,%d,%d,%d,%d,", sizeof(int), sizeof(char), sizeof(double), sizeof(char *), pair_size);
+    printf("%d,%d,%d,%d,%d,", sizeof numbers, sizeof(text), sizeof(grid), sizeof pair, sizeof(struct Pair *));
+    printf("%d,%d,%d\n", sizeof(*p), sizeof(numbers[i++]), i);
+    printf("expression test:%d,%d,%d,%d,", logic_size, choice_size, sizeof(i || flag), sizeof(i < flag));
+    printf("%d,%d,%d\n", sizeof(i ? pair.weight : 1), sizeof("abc"), sizeof "hello world");
+}
+
+int main()
+{
+    enum_test();
+    sizeof_test();
+    return 0;
+}
@@ -9,6 +9,9 @@ _cases = [
     "struct.c",  # 结构体和指针相关测试
     "array.c", #数组测试
     "unaryop.c", #一元运算符测试
+    "logical.c", #短路求值、条件表达式和循环中的栈空间测试
+    "constant.c", #常量折叠测试
+    "sizeof.c", #枚举常量和sizeof测试
 ]
 
 def cases():